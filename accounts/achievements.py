@@ -0,0 +1,218 @@
+"""Achievements engine.
+
+Each Rule declares which events can change its outcome. When an event happens
+for a user only those rules are evaluated, and the result is stored in
+UserAchievement (awarded, updated or revoked), so the profile just reads the
+stored rows. To add an achievement, add a Rule to RULES and run
+`manage.py evaluate_achievements --rule <code>` to award it to existing users.
+
+The signal receivers evaluate once the triggering transaction commits, so the
+voting transaction never waits on them. A vote only re-evaluates users moving
+onto, off or within a podium. Every other entry in an arena, including the one
+voted for, moves a place whenever a vote or a new entry passes it, so those
+users are re-evaluated in batches by
+`manage.py evaluate_achievements --ranks-changed-since <minutes>` (see
+users_with_rank_changes).
+"""
+from collections import namedtuple
+
+from django.db.models import Q
+
+from .models import Contestant, UserAchievement, VoteRollup
+from .rollups import hour_bucket
+from .stats import UserFacts
+
+# Events that can change a user's achievements
+ARENA_JOINED = 'arena_joined'  # An entry was submitted, deactivated or deleted
+RANK_CHANGED = 'rank_changed'  # One of the user's entries moved a place (votes only change ranks)
+ALL_EVENTS = {ARENA_JOINED, RANK_CHANGED}
+
+Award = namedtuple('Award', ['name', 'description', 'icon'])
+
+
+class Rule:
+    code = None
+    name = None
+    icon = None
+    triggers = set()
+    locked_description = None  # Shown while not earned; None hides the achievement
+
+    def evaluate(self, facts):
+        """Return an Award if the user currently holds this achievement, else None"""
+        raise NotImplementedError
+
+
+class TierRule(Rule):
+    code = 'tier'
+    triggers = {ARENA_JOINED}
+    tiers = {
+        'elite': Award('Elite Competitor', 'Reached Elite tier', '🏆'),
+        'champion': Award('Champion Competitor', 'Reached Champion tier', '🥇'),
+        'veteran': Award('Veteran Competitor', 'Reached Veteran tier', '🥈'),
+        'recruit': Award('Recruit Competitor', 'Reached Recruit tier', '🎖️'),
+    }
+
+    def evaluate(self, facts):
+        if facts.highest_tier_arena:
+            return self.tiers.get(facts.highest_tier_arena.tier)
+
+
+class TopPerformerRule(Rule):
+    code = 'top_performer'
+    name = 'Top Performer'
+    icon = '⭐'
+    triggers = {ARENA_JOINED, RANK_CHANGED}
+
+    def evaluate(self, facts):
+        if 0 < facts.avg_rank <= 10:
+            return Award(self.name, f'Placed in top 10 (Rank #{facts.avg_rank})', self.icon)
+
+
+class WinnerRule(Rule):
+    code = 'winner'
+    name = 'Winner'
+    icon = '👑'
+    triggers = {ARENA_JOINED, RANK_CHANGED}
+
+    def evaluate(self, facts):
+        if facts.wins > 0:
+            return Award(self.name, f'Won {facts.wins} competition(s)', self.icon)
+
+
+class FinaleRoyaleRule(Rule):
+    code = 'finale_royale'
+    name = 'Finale Royale'
+    icon = '👑'
+    triggers = {ARENA_JOINED, RANK_CHANGED}
+    locked_description = 'Enter year-end tournament'
+
+    def evaluate(self, facts):
+        # Eligible while in the top 3 of any arena
+        if facts.wins > 0:
+            return Award(self.name, 'Eligible for year-end tournament', self.icon)
+
+
+RULES = [TierRule(), TopPerformerRule(), WinnerRule(), FinaleRoyaleRule()]
+RULES_BY_CODE = {rule.code: rule for rule in RULES}
+
+
+def evaluate(user_id, events=ALL_EVENTS, rules=None):
+    """Re-evaluate the rules affected by events for one user and store the outcome.
+
+    Returns (awarded, revoked) counts.
+    """
+    rules = [rule for rule in (rules or RULES) if rule.triggers & set(events)]
+    if not rules:
+        return 0, 0
+
+    facts = UserFacts(user_id)
+    held = {a.code: a for a in UserAchievement.objects.filter(user_id=user_id, code__in=[rule.code for rule in rules])}
+    awarded = revoked = 0
+
+    for rule in rules:
+        award = rule.evaluate(facts)
+        current = held.get(rule.code)
+        if award is None:
+            if current:
+                current.delete()
+                revoked += 1
+        elif current is None:
+            UserAchievement.objects.create(user_id=user_id, code=rule.code, **award._asdict())
+            awarded += 1
+        elif (current.name, current.description, current.icon) != tuple(award):
+            UserAchievement.objects.filter(pk=current.pk).update(**award._asdict())
+
+    return awarded, revoked
+
+
+def users_with_rank_changes(since):
+    """Ids of users with active entries in arenas whose standings may have moved since `since`"""
+    # Votes are in the hourly rollups, so this can include up to an hour of older votes
+    voted = VoteRollup.objects.filter(hour__gte=hour_bucket(since)).values('arena_id')
+    entered_or_left = Contestant.objects.filter(Q(created_at__gte=since) | Q(deactivated_at__gte=since)).values('arena_id')
+    return (
+        Contestant.objects.filter(Q(arena_id__in=voted) | Q(arena_id__in=entered_or_left), is_active=True)
+        .order_by('user_id').values_list('user_id', flat=True).distinct()
+    )
+
+
+def achievements_for(user):
+    """Achievements to show on the profile, in rule order, including locked ones"""
+    held = {a.code: a for a in UserAchievement.objects.filter(user=user)}
+    shown = []
+    for rule in RULES:
+        achievement = held.get(rule.code)
+        if achievement:
+            shown.append({'name': achievement.name, 'description': achievement.description, 'earned': True, 'icon': achievement.icon})
+        elif rule.locked_description:
+            shown.append({'name': rule.name, 'description': rule.locked_description, 'earned': False, 'icon': rule.icon})
+    return shown
+
+
+def next_goal(highest_tier_arena, total_competitions, finale_eligible, elite_rank=0):
+    """The next goal for the profile, from already-loaded stats.
+
+    elite_rank is the user's current rank in their Elite arena (0 if not in one).
+    """
+    if total_competitions == 0:
+        # First goal: Make first submission
+        return {
+            'title': 'Make Your First Submission',
+            'description': 'Join an arena and submit your talent',
+            'progress': 0,
+            'target': 1,
+            'current': 0
+        }
+    if not highest_tier_arena:
+        # Goal: Join any arena
+        return {
+            'title': 'Join Your First Arena',
+            'description': 'Enter a competition to start competing',
+            'progress': 0,
+            'target': 1,
+            'current': 0
+        }
+
+    tier_goals = {
+        'recruit': ('Reach Veteran Tier', 'Join a Veteran tier arena to advance', 25),
+        'veteran': ('Reach Champion Tier', 'Join a Champion tier arena to advance', 50),
+        'champion': ('Reach Elite Tier', 'Join an Elite tier arena to unlock Finale Royale', 75),
+    }
+    if highest_tier_arena.tier in tier_goals:
+        title, description, progress = tier_goals[highest_tier_arena.tier]
+        return {'title': title, 'description': description, 'progress': progress, 'target': 1, 'current': 0}
+
+    # Elite: Reach Finale Royale (top 3 in Elite)
+    if finale_eligible:
+        return {
+            'title': 'Finale Royale Qualified!',
+            'description': 'You\'ve qualified for the year-end tournament',
+            'progress': 100,
+            'target': 1,
+            'current': 1
+        }
+    if not elite_rank:
+        return {
+            'title': 'Reach Finale Royale',
+            'description': 'Place in top 3 in Elite tier to qualify',
+            'progress': 0,
+            'target': 3,
+            'current': 0
+        }
+
+    # Progress: closer to top 3 = higher percentage
+    if elite_rank <= 3:
+        progress = 100
+    elif elite_rank <= 10:
+        # Progress from 50% (rank 10) to 99% (rank 4)
+        progress = 100 - ((elite_rank - 3) * 7)
+    else:
+        # Progress from 0% to 50% for ranks 11+
+        progress = max(0, 50 - ((elite_rank - 10) * 5))
+    return {
+        'title': 'Reach Finale Royale',
+        'description': f'Place in top 3 (Currently rank #{elite_rank})',
+        'progress': progress,
+        'target': 3,
+        'current': elite_rank
+    }
@@ -0,0 +1,167 @@
+"""Recent activity feed, written when events happen and read with one keyset query.
+
+Votes received are not one event each: the vote path counts them into one
+event per entry per hour (like accounts/rollups.py), so a popular entry adds
+at most one row an hour to its owner's feed.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+from django.utils.timesince import timesince
+
+from . import pagination, rollups
+from .models import ActivityEvent, Contestant
+
+ACTIVITY_ORDERING = ('-created_at', '-id')
+ACTIVITY_PAGE_SIZE = 5
+
+TIER_ICONS = {
+    'recruit': '🎖️',
+    'veteran': '🥈',
+    'champion': '🥇',
+    'elite': '🏆',
+}
+
+PLACEMENT_EVENTS = {
+    1: ('🏆', 'Won {arena} (1st place)'),
+    2: ('🥈', 'Placed 2nd in {arena}'),
+    3: ('🥉', 'Placed 3rd in {arena}'),
+}
+
+
+def submission_event(contestant):
+    submission_type = 'video' if contestant.video_url or contestant.video_file else 'image'
+    return ActivityEvent(
+        user_id=contestant.user_id,
+        event_type='submission',
+        icon='📹' if submission_type == 'video' else '🖼️',
+        message=f'Submitted {submission_type} to {contestant.arena.name}',
+        contestant=contestant,
+        created_at=contestant.created_at,
+    )
+
+
+def tier_event(contestant):
+    tier = contestant.arena.tier
+    return ActivityEvent(
+        user_id=contestant.user_id,
+        event_type='tier',
+        icon=TIER_ICONS.get(tier, '⭐'),
+        message=f'Reached {contestant.arena.get_tier_display()} tier',
+        contestant=contestant,
+        created_at=contestant.created_at,
+    )
+
+
+def vote_message(contestant, count):
+    if count == 1:
+        return f'Received a vote on "{contestant.title}"'
+    return f'Received {count} votes on "{contestant.title}"'
+
+
+def vote_event(contestant, created_at=None, count=1):
+    """The event for the votes an entry received in the hour starting at created_at's hour"""
+    created_at = created_at or timezone.now()
+    return ActivityEvent(
+        user_id=contestant.user_id,
+        event_type='vote',
+        icon='👍',
+        message=vote_message(contestant, count),
+        contestant=contestant,
+        created_at=created_at,
+        period=rollups.hour_bucket(created_at),
+        count=count,
+    )
+
+
+def purchase_event(payment):
+    return ActivityEvent(
+        user_id=payment.user_id,
+        event_type='purchase',
+        icon='🪙',
+        message=f'Purchased {payment.tokens} tokens',
+        created_at=payment.completed_at or payment.created_at,
+    )
+
+
+def placement_event(contestant, place, created_at=None):
+    icon, message = PLACEMENT_EVENTS[place]
+    return ActivityEvent(
+        user_id=contestant.user_id,
+        event_type='win',
+        icon=icon,
+        message=message.format(arena=contestant.arena.name),
+        contestant=contestant,
+        created_at=created_at or timezone.now(),
+    )
+
+
+def is_first_entry_in_tier(contestant):
+    return not Contestant.objects.filter(
+        user_id=contestant.user_id, arena__tier=contestant.arena.tier
+    ).exclude(pk=contestant.pk).exists()
+
+
+# Writers, called from signal receivers and the payment views
+
+def record_entry(contestant):
+    events = [submission_event(contestant)]
+    if is_first_entry_in_tier(contestant):
+        events.append(tier_event(contestant))
+    ActivityEvent.objects.bulk_create(events)
+
+
+def record_vote_received(contestant, when=None):
+    """Count one vote into the entry's event for the current hour. Call inside the voting transaction."""
+    when = when or timezone.now()
+    period = rollups.hour_bucket(when)
+    # After the increment the count is at least 2, so the message is the plural one
+    increments = {
+        'count': F('count') + 1,
+        'message': Concat(Value('Received '), Cast(F('count') + 1, CharField()), Value(f' votes on "{contestant.title}"')),
+    }
+    events = ActivityEvent.objects.filter(contestant_id=contestant.pk, event_type='vote', period=period)
+    if events.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            vote_event(contestant, when).save()
+    except IntegrityError:
+        # Another vote created this hour's event first
+        events.update(**increments)
+
+
+def record_purchase(payment):
+    purchase_event(payment).save()
+
+
+def record_podium_change(before, after):
+    """Add a placement event for every contestant that moved up into a podium place"""
+    previous_places = {contestant_id: place for place, (contestant_id, _) in enumerate(before, start=1)}
+    promoted = {
+        contestant_id: place
+        for place, (contestant_id, _) in enumerate(after, start=1)
+        if place < previous_places.get(contestant_id, len(before) + 2)
+    }
+    if not promoted:
+        return
+    contestants = Contestant.objects.filter(id__in=promoted).select_related('arena')
+    ActivityEvent.objects.bulk_create([placement_event(c, promoted[c.id]) for c in contestants])
+
+
+# Reading
+
+def activity_page(user, cursor=None, page_size=ACTIVITY_PAGE_SIZE):
+    """Return (events, next_cursor) for a user's feed, newest first"""
+    return pagination.paginate(ActivityEvent.objects.filter(user=user), ACTIVITY_ORDERING, cursor, page_size)
+
+
+def serialize_event(event):
+    return {
+        'type': event.event_type,
+        'icon': event.icon,
+        'message': event.message,
+        'date': event.created_at.isoformat(),
+        'timesince': timesince(event.created_at),
+    }
@@ -1,11 +1,165 @@
+from pathlib import Path
+
+from django import forms
+from django.conf import settings
 from django.contrib import admin
-from .models import CustomUser, EmailConfirmationToken, Arena, Contestant, Vote, TokenTransaction, Payment
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from . import arena_catalog, capacity, rollups
+from .models import CustomUser, EmailConfirmationToken, Arena, Contestant, Vote, TokenTransaction, Payment, RequestProfile, UserStats, UserAchievement, LeaderboardSnapshot, FinaleQualification, VoteRollup, PendingFileDeletion, StoredBlob, ImageFingerprint
 
 # Register your models here.
 admin.site.register(CustomUser)
 admin.site.register(EmailConfirmationToken)
-admin.site.register(Arena)
-admin.site.register(Contestant)
 admin.site.register(Vote)
 admin.site.register(TokenTransaction)
 admin.site.register(Payment)
+admin.site.register(UserStats)
+
+
+@admin.register(Arena)
+class ArenaAdmin(admin.ModelAdmin):
+    list_display = ['name', 'tier', 'token_cost', 'participant_count', 'max_participants', 'is_active']
+    # Kept up to date by accounts/capacity.py; fix drift with `manage.py repair_arena_counts`
+    readonly_fields = ['participant_count']
+
+
+class ContestantAdminForm(forms.ModelForm):
+    class Meta:
+        model = Contestant
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        arena = cleaned_data.get('arena')
+        if not (arena and cleaned_data.get('is_active')):
+            return cleaned_data
+        # Same check as the submit view; the seat itself is taken when the entry is saved
+        adding = self.instance._state.adding
+        if not adding and Contestant.objects.filter(pk=self.instance.pk, is_active=True, arena=arena).exists():
+            return cleaned_data
+        if not capacity.has_free_seat(arena):
+            reactivating = not adding and self.instance.arena_id == arena.pk
+            self.add_error('is_active' if reactivating else 'arena', f'{arena.name} is full.')
+        return cleaned_data
+
+
+@admin.register(Contestant)
+class ContestantAdmin(admin.ModelAdmin):
+    form = ContestantAdminForm
+
+
+@admin.register(UserAchievement)
+class UserAchievementAdmin(admin.ModelAdmin):
+    list_display = ['user', 'code', 'name', 'description', 'awarded_at']
+    list_filter = ['code']
+    search_fields = ['user__username']
+
+
+@admin.register(LeaderboardSnapshot)
+class LeaderboardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['month', 'arena', 'rank', 'contestant', 'votes', 'frozen_at']
+    list_filter = ['month', 'arena']
+    raw_id_fields = ['contestant']
+
+
+@admin.register(FinaleQualification)
+class FinaleQualificationAdmin(admin.ModelAdmin):
+    list_display = ['season', 'arena', 'place', 'user', 'votes', 'computed_at']
+    list_filter = ['season', 'arena']
+    raw_id_fields = ['contestant', 'user']
+
+
+@admin.register(VoteRollup)
+class VoteRollupAdmin(admin.ModelAdmin):
+    list_display = ['hour', 'contestant', 'arena', 'free_votes', 'paid_votes', 'tokens_spent']
+    list_filter = ['arena']
+    date_hierarchy = 'hour'
+    raw_id_fields = ['contestant']
+
+    def get_urls(self):
+        urls = [
+            path('chart/', self.admin_site.admin_view(self.chart_view), name='accounts_voterollup_chart'),
+        ]
+        return urls + super().get_urls()
+
+    def chart_view(self, request):
+        """Votes per hour in each arena over the last week"""
+        charts = []
+        for arena in arena_catalog.active_arenas():
+            series = rollups.arena_series(arena.id)
+            charts.append({
+                'arena': arena,
+                'free_votes': sum(free for _, free, _, _ in series),
+                'paid_votes': sum(paid for _, _, paid, _ in series),
+                'tokens_spent': sum(tokens for _, _, _, tokens in series),
+                'points': rollups.sparkline_points([free + paid for _, free, paid, _ in series], width=720, height=80),
+            })
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Votes per hour (last 7 days)',
+            'charts': charts,
+        }
+        return TemplateResponse(request, 'admin/accounts/voterollup/chart.html', context)
+
+
+@admin.register(PendingFileDeletion)
+class PendingFileDeletionAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'field', 'name', 'attempts', 'last_error']
+    list_filter = ['field']
+    search_fields = ['name']
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refcount', 'created_at']
+    search_fields = ['name', 'sha256']
+    readonly_fields = ['name', 'sha256', 'size', 'refcount', 'created_at']
+
+
+@admin.register(ImageFingerprint)
+class ImageFingerprintAdmin(admin.ModelAdmin):
+    list_display = ['contestant', 'user', 'source_name', 'created_at']
+    search_fields = ['source_name', 'user__username']
+    raw_id_fields = ['contestant', 'user']
+    readonly_fields = ['source_name', 'dhash', 'band0', 'band1', 'band2', 'band3', 'created_at']
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'query_count', 'user', 'download_link']
+    list_filter = ['view_name', 'method', 'status_code']
+    search_fields = ['path', 'view_name']
+    readonly_fields = ['user', 'method', 'path', 'query_string', 'view_name', 'status_code', 'duration_ms', 'query_count', 'profile_file', 'download_link', 'created_at', 'summary']
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('<int:profile_id>/download/', self.admin_site.admin_view(self.download_view), name='accounts_requestprofile_download'),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description='Profile')
+    def download_link(self, obj):
+        url = reverse('admin:accounts_requestprofile_download', args=[obj.id])
+        return format_html('<a href="{}">{}</a>', url, 'Download .prof')
+
+    def download_view(self, request, profile_id):
+        """Serve the raw cProfile dump (open with snakeviz, flameprof or pstats)"""
+        profile = get_object_or_404(RequestProfile, id=profile_id)
+        profile_root = Path(settings.REQUEST_PROFILE_ROOT).resolve()
+        profile_path = (profile_root / profile.profile_file).resolve()
+        if profile_root not in profile_path.parents or not profile_path.exists():
+            raise Http404('Profile file not found.')
+        return FileResponse(open(profile_path, 'rb'), as_attachment=True, filename=profile_path.name)
@@ -0,0 +1,88 @@
+"""Cached catalog of active arenas shared by views and templates.
+
+Arenas only change when an admin edits them or `setup_arenas` runs, so each
+worker process keeps the active arenas in memory as immutable ArenaRecords.
+Saving or deleting an Arena bumps a generation number in the Django cache; every
+process compares its copy against that number and reloads when it changed. With
+a per-process cache backend (the default locmem) other processes only notice
+after ARENA_CATALOG_MAX_AGE seconds, so use a shared CACHES backend in
+production.
+
+Records hold the fields the catalog pages show. Views that change an arena or
+need its live participant_count still load the Arena model.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Arena
+
+GENERATION_KEY = 'arena_catalog:generation'
+
+TIER_LABELS = dict(Arena.TIER_CHOICES)
+
+RECORD_FIELDS = ['id', 'name', 'tier', 'token_cost', 'description', 'max_participants']
+
+
+class ArenaRecord(namedtuple('ArenaRecord', RECORD_FIELDS)):
+    __slots__ = ()
+
+    def get_tier_display(self):
+        return TIER_LABELS.get(self.tier, self.tier)
+
+    def __str__(self):
+        return f"{self.name} ({self.tier})"
+
+
+class ArenaCatalog:
+    def __init__(self):
+        # (generation, loaded_at, records, records by id), replaced as a whole so readers never see half a reload
+        self.state = None
+
+    def active(self):
+        """Active arenas ordered by token cost, as a tuple of ArenaRecords"""
+        return self.current()[2]
+
+    def get(self, arena_id):
+        """The active arena with this id, or None"""
+        try:
+            arena_id = int(arena_id)
+        except (TypeError, ValueError):
+            return None
+        return self.current()[3].get(arena_id)
+
+    def current(self):
+        state = self.state
+        generation = cache.get(GENERATION_KEY, 0)
+        if state is None or state[0] != generation or time.monotonic() - state[1] > settings.ARENA_CATALOG_MAX_AGE:
+            state = self.state = self.load(generation)
+        return state
+
+    def load(self, generation):
+        records = tuple(
+            ArenaRecord(*row)
+            for row in Arena.objects.filter(is_active=True).order_by('token_cost', 'id').values_list(*RECORD_FIELDS)
+        )
+        return (generation, time.monotonic(), records, {record.id: record for record in records})
+
+    def invalidate(self):
+        """Drop this process's copy and tell the other processes to reload theirs"""
+        self.state = None
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            # No generation stored yet (or it was evicted); any new value differs from the one processes hold
+            cache.set(GENERATION_KEY, int(time.time()), timeout=None)
+
+
+catalog = ArenaCatalog()
+
+
+def active_arenas():
+    return catalog.active()
+
+
+def get_arena(arena_id):
+    return catalog.get(arena_id)
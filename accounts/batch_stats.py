@@ -0,0 +1,153 @@
+"""Whole-table recomputation of arena ranks and UserStats with NumPy.
+
+rebuild_user_stats recomputes one user at a time with a ranking query each,
+which is fine for repairing a few rows but far too slow for a full season.
+Here every active entry is loaded once as columns, ranks are computed for all
+arenas at once with a lexsort, the per-user totals are grouped sums over those
+arrays, and only the UserStats rows that changed are written back in batches.
+
+NumPy is only needed by `manage.py recompute_rankings`, not by the site itself.
+"""
+import array
+import datetime
+from itertools import islice
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Arena, Contestant, CustomUser, UserStats
+from .ranking import PODIUM_SIZE
+from .stats import TIER_ORDER
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+NO_ARENA = -1
+
+
+def load_entries(chunk_size=10000):
+    """Return the active entries as a dict of equally long int64 arrays"""
+    columns = {name: array.array('q') for name in ('id', 'arena', 'user', 'votes', 'created_at')}
+    rows = Contestant.objects.filter(is_active=True).order_by().values_list('id', 'arena_id', 'user_id', 'votes', 'created_at')
+    for contestant_id, arena_id, user_id, votes, created_at in rows.iterator(chunk_size=chunk_size):
+        columns['id'].append(contestant_id)
+        columns['arena'].append(arena_id)
+        columns['user'].append(user_id)
+        columns['votes'].append(votes)
+        columns['created_at'].append((created_at - EPOCH) // datetime.timedelta(microseconds=1))
+    return {name: np.frombuffer(column, dtype=np.int64) for name, column in columns.items()}
+
+
+def rank_entries(entries):
+    """Rank of every entry in its arena, in RANKING_ORDER (most votes, then newest, then highest id)"""
+    order = np.lexsort((-entries['id'], -entries['created_at'], -entries['votes'], entries['arena']))
+    arenas = entries['arena'][order]
+    group_starts = np.flatnonzero(np.r_[True, arenas[1:] != arenas[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(order)])
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - np.repeat(group_starts, group_sizes) + 1
+    return ranks
+
+
+def user_totals(entries, ranks):
+    """Per-user stats: (user_ids, total_votes, total_competitions, wins, highest_tier_arena_id)"""
+    user_ids, users = np.unique(entries['user'], return_inverse=True)
+    count = len(user_ids)
+    total_votes = np.zeros(count, dtype=np.int64)
+    np.add.at(total_votes, users, entries['votes'])
+    competitions = np.bincount(users, minlength=count)
+    wins = np.bincount(users, weights=(ranks <= PODIUM_SIZE).astype(np.int64), minlength=count).astype(np.int64)
+
+    # Highest tier arena: the user's entry in the highest tier, ties going to the
+    # entry listed first on the profile (most votes, then newest)
+    tiers = dict(Arena.objects.values_list('id', 'tier'))
+    tier_of_arena = np.zeros(max(tiers, default=0) + 1, dtype=np.int64)
+    for arena_id, tier in tiers.items():
+        tier_of_arena[arena_id] = TIER_ORDER.get(tier, 0)
+    tier = tier_of_arena[entries['arena']]
+    order = np.lexsort((-entries['id'], -entries['created_at'], -entries['votes'], -tier, users))
+    first = order[np.r_[True, users[order][1:] != users[order][:-1]]]
+    highest_tier_arena = entries['arena'][first]
+
+    return user_ids, total_votes, competitions, wins, highest_tier_arena
+
+
+def compute_all_stats(chunk_size=10000):
+    """Return (stats, entry_count, arena_count) where stats has one int64 column per UserStats field for every user"""
+    entries = load_entries(chunk_size)
+    ranks = rank_entries(entries)
+    user_ids, total_votes, competitions, wins, highest_tier_arena = user_totals(entries, ranks)
+
+    # Align with every user; users without active entries get zeros and no arena
+    all_users = np.fromiter(CustomUser.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size), dtype=np.int64)
+    index = np.clip(np.searchsorted(user_ids, all_users), 0, max(len(user_ids) - 1, 0))
+    has_entries = (user_ids[index] == all_users) if len(user_ids) else np.zeros(len(all_users), dtype=bool)
+
+    def aligned(values, missing=0):
+        return np.where(has_entries, values[index], missing) if len(user_ids) else np.full(len(all_users), missing, dtype=np.int64)
+
+    stats = {
+        'user': all_users,
+        'total_votes': aligned(total_votes),
+        'total_competitions': aligned(competitions),
+        'wins': aligned(wins),
+        'highest_tier_arena': aligned(highest_tier_arena, NO_ARENA),
+    }
+    return stats, len(ranks), len(np.unique(entries['arena']))
+
+
+def load_stored_stats(user_ids, chunk_size=10000):
+    """Stored UserStats aligned with user_ids, plus a mask of users that have a row"""
+    columns = {name: array.array('q') for name in ('user', 'total_votes', 'total_competitions', 'wins', 'highest_tier_arena')}
+    rows = UserStats.objects.order_by().values_list('user_id', 'total_votes', 'total_competitions', 'wins', 'highest_tier_arena_id')
+    for user_id, total_votes, competitions, wins, arena_id in rows.iterator(chunk_size=chunk_size):
+        columns['user'].append(user_id)
+        columns['total_votes'].append(total_votes)
+        columns['total_competitions'].append(competitions)
+        columns['wins'].append(wins)
+        columns['highest_tier_arena'].append(NO_ARENA if arena_id is None else arena_id)
+    columns = {name: np.frombuffer(column, dtype=np.int64) for name, column in columns.items()}
+
+    # Every UserStats row belongs to an existing user, so each one has a position in user_ids
+    positions = np.searchsorted(user_ids, columns.pop('user'))
+    exists = np.zeros(len(user_ids), dtype=bool)
+    exists[positions] = True
+    stored = {}
+    for name, values in columns.items():
+        stored[name] = np.zeros(len(user_ids), dtype=np.int64)
+        stored[name][positions] = values
+    return stored, exists
+
+
+def find_changes(stats, chunk_size=10000):
+    """Return (changed, missing) masks over stats['user']"""
+    stored, exists = load_stored_stats(stats['user'], chunk_size)
+    differs = np.zeros(len(stats['user']), dtype=bool)
+    for name, values in stored.items():
+        differs |= values != stats[name]
+    return differs & exists, ~exists
+
+
+def stats_rows(stats, mask, now):
+    for position in np.flatnonzero(mask):
+        arena_id = int(stats['highest_tier_arena'][position])
+        yield UserStats(
+            user_id=int(stats['user'][position]),
+            total_votes=int(stats['total_votes'][position]),
+            total_competitions=int(stats['total_competitions'][position]),
+            wins=int(stats['wins'][position]),
+            highest_tier_arena_id=None if arena_id == NO_ARENA else arena_id,
+            updated_at=now,
+        )
+
+
+def write_stats(stats, changed, missing, batch_size=1000):
+    """Update the changed rows and create the missing ones, batch_size rows per query"""
+    now = timezone.now()
+    fields = ['total_votes', 'total_competitions', 'wins', 'highest_tier_arena', 'updated_at']
+
+    rows = stats_rows(stats, changed, now)
+    while batch := list(islice(rows, batch_size)):
+        UserStats.objects.bulk_update(batch, fields)
+
+    rows = stats_rows(stats, missing, now)
+    while batch := list(islice(rows, batch_size)):
+        UserStats.objects.bulk_create(batch, ignore_conflicts=True)
@@ -0,0 +1,35 @@
+"""Deleting large numbers of rows without long-running statements.
+
+A single `queryset.delete()` over millions of rows holds locks and grows the
+transaction log for as long as it runs. delete_in_batches() instead deletes by
+primary key a batch at a time, each batch in its own short statement, and can
+pause between batches so replicas and other writers keep up.
+"""
+import time
+
+
+def delete_in_batches(queryset, batch_size=1000, pause=0):
+    """Delete every row of queryset, batch_size at a time.
+
+    Yields the number of rows of the queryset's model deleted by each batch
+    (cascaded deletes of related rows are not counted).
+    """
+    model = queryset.model
+    pk_name = model._meta.pk.name
+    while True:
+        keys = list(queryset.order_by(pk_name).values_list(pk_name, flat=True)[:batch_size])
+        if not keys:
+            return
+        _, deleted = model._base_manager.filter(pk__in=keys).delete()
+        yield deleted.get(model._meta.label, 0)
+        if len(keys) < batch_size:
+            return
+        if pause:
+            time.sleep(pause)
+
+
+def delete_all(queryset, batch_size=1000, pause=0):
+    """Run delete_in_batches() to the end; returns (rows deleted, seconds taken)"""
+    started = time.perf_counter()
+    total = sum(delete_in_batches(queryset, batch_size, pause))
+    return total, time.perf_counter() - started
@@ -0,0 +1,39 @@
+"""Arena capacity: Arena.participant_count is the number of active contestants.
+
+A seat is taken with one conditional UPDATE, so two users joining at the same
+time can never both get the last seat, and checking whether an arena is full
+needs no query. Seats are taken and given back from the Contestant signal
+receivers in accounts/signals.py.
+"""
+from django.db.models import Count, F, Q
+
+from .models import Arena
+
+
+class ArenaFull(Exception):
+    """Raised when a contestant would become active in an arena with no free seats"""
+
+
+def has_free_seat(arena):
+    return arena.participant_count < arena.max_participants
+
+
+def reserve_seat(arena_id):
+    """Take a seat in an arena or raise ArenaFull. Call inside the transaction that saves the contestant."""
+    reserved = Arena.objects.filter(
+        pk=arena_id, participant_count__lt=F('max_participants')
+    ).update(participant_count=F('participant_count') + 1)
+    if not reserved:
+        raise ArenaFull('This arena is full.')
+
+
+def release_seat(arena_id):
+    Arena.objects.filter(pk=arena_id, participant_count__gt=0).update(participant_count=F('participant_count') - 1)
+
+
+def find_drift(arenas=None):
+    """Return [(arena, stored, actual)] for arenas whose participant_count is wrong"""
+    arenas = (arenas if arenas is not None else Arena.objects.all()).annotate(
+        actual=Count('contestants', filter=Q(contestants__is_active=True))
+    )
+    return [(arena, arena.participant_count, arena.actual) for arena in arenas if arena.participant_count != arena.actual]
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import arena_catalog
+
+
+def arenas(request):
+    """Expose the active arenas to every template as `active_arenas` (loaded only if used)"""
+    return {'active_arenas': SimpleLazyObject(arena_catalog.active_arenas)}
@@ -0,0 +1,218 @@
+"""Streaming CSV/JSONL exports of votes, token transactions and payments.
+
+Rows are read with `.values_list().iterator(chunk_size=...)` and written out one
+line at a time, so exporting the full history uses the same memory as exporting
+a day. Used by the staff export endpoint and `manage.py export_data`.
+
+Under ASGI, Django reads a synchronous iterator into memory before sending any
+of it, so the view hands the server aiter_lines() instead, which pulls
+LINES_PER_HOP lines at a time from a worker thread.
+"""
+import csv
+import datetime
+import decimal
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Payment, TokenTransaction, Vote
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+LINES_PER_HOP = 500  # Lines rendered per thread switch when streaming under ASGI
+# Text cells starting with these are formulas to Excel and Sheets (usernames, titles, descriptions)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Export:
+    model = None
+    columns = ()  # (header, values_list lookup)
+
+    def arena_filter(self, arena_id):
+        raise ExportError(f'{self.name} exports cannot be filtered by arena')
+
+    def rows(self, start=None, end=None, arena_id=None, chunk_size=CHUNK_SIZE):
+        """Yield one tuple per row, oldest first"""
+        queryset = self.model.objects.all()
+        if start:
+            queryset = queryset.filter(created_at__gte=start)
+        if end:
+            queryset = queryset.filter(created_at__lt=end)
+        if arena_id:
+            queryset = queryset.filter(self.arena_filter(arena_id))
+        lookups = [lookup for _, lookup in self.columns]
+        return queryset.order_by('id').values_list(*lookups).iterator(chunk_size=chunk_size)
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+
+class VoteExport(Export):
+    name = 'votes'
+    model = Vote
+    columns = (
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('contestant_id', 'contestant_id'),
+        ('arena_id', 'contestant__arena_id'),
+        ('is_free_vote', 'is_free_vote'),
+        ('tokens_spent', 'tokens_spent'),
+    )
+
+    def arena_filter(self, arena_id):
+        return Q(contestant__arena_id=arena_id)
+
+
+class TransactionExport(Export):
+    name = 'transactions'
+    model = TokenTransaction
+    columns = (
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('transaction_type', 'transaction_type'),
+        ('amount', 'amount'),
+        ('contestant_id', 'related_contestant_id'),
+        ('arena_id', 'related_arena_id'),
+        ('payment_id', 'related_payment_id'),
+        ('description', 'description'),
+    )
+
+    def arena_filter(self, arena_id):
+        # Vote transactions only point at the contestant, entry fees at both
+        return Q(related_arena_id=arena_id) | Q(related_contestant__arena_id=arena_id)
+
+
+class PaymentExport(Export):
+    name = 'payments'
+    model = Payment
+    columns = (
+        ('id', 'id'),
+        ('created_at', 'created_at'),
+        ('completed_at', 'completed_at'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('status', 'status'),
+        ('amount', 'amount'),
+        ('tokens', 'tokens'),
+        ('stripe_session_id', 'stripe_session_id'),
+        ('stripe_payment_intent_id', 'stripe_payment_intent_id'),
+    )
+
+
+EXPORTS = {export.name: export for export in (VoteExport(), TransactionExport(), PaymentExport())}
+
+
+def get_export(name):
+    try:
+        return EXPORTS[name]
+    except KeyError:
+        raise ExportError(f'Unknown export "{name}", choose from {", ".join(EXPORTS)}')
+
+
+def parse_day(value, field):
+    """Parse a YYYY-MM-DD filter into the aware datetime at the start of that day"""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ExportError(f'{field} must be a date in YYYY-MM-DD format')
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def parse_filters(start=None, end=None, arena=None):
+    """Turn raw filter values into rows() arguments; end is inclusive"""
+    filters = {'start': parse_day(start, 'start'), 'end': parse_day(end, 'end'), 'arena_id': None}
+    if filters['end']:
+        filters['end'] += datetime.timedelta(days=1)
+    if arena:
+        try:
+            filters['arena_id'] = int(arena)
+        except (TypeError, ValueError):
+            raise ExportError('arena must be an arena id')
+    return filters
+
+
+def encode_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer in a generator"""
+
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    """A CSV cell; text a spreadsheet would read as a formula gets a leading quote"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return encode_value(value)
+
+
+def render_csv(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([csv_cell(value) for value in row])
+
+
+def render_jsonl(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, map(encode_value, row)))) + '\n'
+
+
+def render(export, rows, output_format):
+    """Yield the export as lines of text in output_format"""
+    if output_format == 'csv':
+        return render_csv(export.headers, rows)
+    if output_format == 'jsonl':
+        return render_jsonl(export.headers, rows)
+    raise ExportError(f'Unknown format "{output_format}", choose from {", ".join(FORMATS)}')
+
+
+async def aiter_lines(lines, batch_size=LINES_PER_HOP):
+    """Stream a line generator to an ASGI server without buffering it"""
+    lines = iter(lines)
+
+    def next_batch():
+        return ''.join(islice(lines, batch_size))
+
+    # thread_sensitive: every batch runs on the same thread, so on the same database connection
+    while batch := await sync_to_async(next_batch, thread_sensitive=True)():
+        yield batch
+
+
+def filename(export, output_format, filters):
+    parts = [export.name]
+    if filters['arena_id']:
+        parts.append(f"arena{filters['arena_id']}")
+    if filters['start']:
+        parts.append(f"from-{filters['start']:%Y%m%d}")
+    if filters['end']:
+        parts.append(f"to-{filters['end'] - datetime.timedelta(days=1):%Y%m%d}")
+    return f"{'-'.join(parts)}.{output_format}"
@@ -0,0 +1,72 @@
+"""Finale Royale qualification.
+
+The top 3 of every arena among the season's entries qualify for the year-end
+tournament. `manage.py compute_finale` computes them in one ordered pass over
+Contestant and stores the standings in FinaleQualification, which the Finale
+Royale page reads.
+"""
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import ranking
+from .models import Contestant, FinaleQualification
+
+QUALIFIERS_PER_ARENA = ranking.PODIUM_SIZE
+
+
+def season_bounds(season):
+    """Timezone-aware [start, end) datetimes of a season (calendar year)"""
+    start = timezone.make_aware(datetime.datetime(season, 1, 1))
+    return start, start.replace(year=season + 1)
+
+
+def compute_qualifiers(season):
+    """Yield (arena_id, place, contestant_id, user_id, votes) for the top entries of every arena.
+
+    Reads the season's active contestants once, ordered by arena and rank, and
+    keeps the first QUALIFIERS_PER_ARENA of each arena.
+    """
+    start, end = season_bounds(season)
+    contestants = (
+        Contestant.objects.filter(is_active=True, created_at__gte=start, created_at__lt=end)
+        .order_by('arena_id', *ranking.RANKING_ORDER)
+        .values_list('arena_id', 'id', 'user_id', 'votes')
+    )
+    current_arena, place = None, 0
+    for arena_id, contestant_id, user_id, votes in contestants.iterator(chunk_size=5000):
+        if arena_id != current_arena:
+            current_arena, place = arena_id, 0
+        place += 1
+        if place <= QUALIFIERS_PER_ARENA:
+            yield arena_id, place, contestant_id, user_id, votes
+
+
+def save_qualifiers(season):
+    """Replace the season's stored standings with freshly computed ones. Returns the qualifications."""
+    computed_at = timezone.now()
+    qualifications = [
+        FinaleQualification(
+            season=season, arena_id=arena_id, place=place, contestant_id=contestant_id,
+            user_id=user_id, votes=votes, computed_at=computed_at,
+        )
+        for arena_id, place, contestant_id, user_id, votes in compute_qualifiers(season)
+    ]
+    with transaction.atomic():
+        FinaleQualification.objects.filter(season=season).delete()
+        FinaleQualification.objects.bulk_create(qualifications)
+    return qualifications
+
+
+def latest_season():
+    return FinaleQualification.objects.order_by('-season').values_list('season', flat=True).first()
+
+
+def qualifier_board(season):
+    """The stored qualifiers of a season, grouped by arena in catalog order"""
+    return list(
+        FinaleQualification.objects.filter(season=season)
+        .select_related('arena', 'contestant', 'user')
+        .order_by('arena__token_cost', 'arena_id', 'place')
+    )
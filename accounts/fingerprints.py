@@ -0,0 +1,171 @@
+"""Perceptual fingerprints of entry media, to catch one picture entered by several accounts.
+
+Each image (or a video's poster frame) is reduced to a 64-bit difference hash
+(dHash): shrunk to 9x8 grey pixels, one bit per pair of neighbouring pixels
+telling whether brightness goes up or down. Re-encoding, resizing or small
+edits flip only a few bits, so near-duplicates are hashes within a small
+Hamming distance.
+
+Searching without a scan uses multi-index hashing: the hash is stored as four
+indexed 16-bit bands. Two hashes within distance d differ by at most d // 4
+bits in at least one band, so the candidates are the rows with a band equal
+to, or within d // 4 bits of, the query's band. For the default distance of 6
+that is 4 x 17 indexed lookups whatever the table size; the exact distance
+is then checked on the few candidates.
+
+Video poster frames need the ffmpeg binary (FFMPEG_BINARY); without it videos
+are not fingerprinted.
+"""
+import io
+import logging
+import shutil
+import subprocess
+import tempfile
+from itertools import combinations
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import ImageFingerprint
+
+logger = logging.getLogger(__name__)
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+CHUNK_SIZE = 64 * 1024
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image"""
+    from PIL import Image
+
+    pixels = list(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            left = pixels[row * 9 + column]
+            right = pixels[row * 9 + column + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def to_signed(value):
+    """Store the unsigned hash in a signed 64-bit column"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def bands(value):
+    return [(value >> (BAND_BITS * i)) & BAND_MASK for i in range(BANDS)]
+
+
+def distance(a, b):
+    return (to_unsigned(a) ^ to_unsigned(b)).bit_count()
+
+
+def neighbours(band, radius):
+    """Every band value within radius bits of band"""
+    values = [band]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), flips):
+            value = band
+            for bit in bits:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+
+def image_hash(f):
+    """dHash of an image file, or None if Pillow can't read it"""
+    from PIL import Image
+
+    try:
+        f.seek(0)
+        with Image.open(f) as image:
+            return dhash(image)
+    except Exception as e:
+        logger.warning(f"Could not fingerprint image: {str(e)}")
+        return None
+    finally:
+        f.seek(0)
+
+
+def poster_frame(f):
+    """A representative early frame of a video file as PNG bytes, or None without ffmpeg"""
+    ffmpeg = shutil.which(settings.FFMPEG_BINARY)
+    if ffmpeg is None:
+        return None
+    with tempfile.NamedTemporaryFile(suffix='.video') as copy:
+        if hasattr(f, 'temporary_file_path'):
+            path = f.temporary_file_path()
+        else:
+            # ffmpeg needs a seekable file: copy uploads held in memory and storage streams
+            chunks = f.chunks() if hasattr(f, 'chunks') else iter(lambda: f.read(CHUNK_SIZE), b'')
+            for chunk in chunks:
+                copy.write(chunk)
+            copy.flush()
+            path = copy.name
+        # thumbnail picks the most typical of the first frames (skipping black fade-ins)
+        command = [ffmpeg, '-v', 'error', '-i', path, '-vf', 'thumbnail=50', '-frames:v', '1', '-f', 'image2pipe', '-vcodec', 'png', '-']
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=60, check=True)
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.warning(f"Could not extract a poster frame: {str(e)}")
+            return None
+    return result.stdout or None
+
+
+def file_hash(f, video=False):
+    """dHash of an image, or of a video's poster frame; None if it can't be computed"""
+    if not video:
+        return image_hash(f)
+    frame = poster_frame(f)
+    return image_hash(io.BytesIO(frame)) if frame else None
+
+
+def contestant_source(contestant):
+    """The stored file an entry is fingerprinted from, as (field file, is video)"""
+    if contestant.submission_type == 'image' and contestant.image_file:
+        return contestant.image_file, False
+    if contestant.submission_type == 'video' and contestant.video_file:
+        return contestant.video_file, True
+    return None, False
+
+
+def find_near_duplicates(value, exclude_user_id=None, max_distance=None):
+    """[(distance, fingerprint)] of stored hashes within max_distance of value, closest first"""
+    if max_distance is None:
+        max_distance = settings.NEAR_DUPLICATE_MAX_DISTANCE
+    radius = max_distance // BANDS
+    query = Q()
+    for i, band in enumerate(bands(value)):
+        query |= Q(**{f'band{i}__in': neighbours(band, radius)})
+    candidates = ImageFingerprint.objects.filter(query)
+    if exclude_user_id is not None:
+        candidates = candidates.exclude(user_id=exclude_user_id)
+    matches = []
+    for fingerprint in candidates.select_related('contestant'):
+        d = distance(fingerprint.dhash, value)
+        if d <= max_distance:
+            matches.append((d, fingerprint))
+    matches.sort(key=lambda match: (match[0], match[1].id))
+    return matches
+
+
+def store(contestant, value):
+    """Save (or replace) the fingerprint of an entry's current file"""
+    source, _ = contestant_source(contestant)
+    band_values = bands(value)
+    ImageFingerprint.objects.update_or_create(
+        contestant=contestant,
+        defaults={
+            'user_id': contestant.user_id,
+            'source_name': source.name,
+            'dhash': to_signed(value),
+            **{f'band{i}': band_values[i] for i in range(BANDS)},
+        },
+    )
@@ -1,9 +1,55 @@
+import io
+
 from django import forms 
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 
+from . import fingerprints, uploads
 from .models import CustomUser, Contestant
 
 
+class DirectUploadMixin:
+    """Let file fields take a direct upload ticket (see accounts/uploads.py) instead of the file.
+
+    Adds a hidden `<field>_upload` field per entry of direct_uploads, which the
+    page's script fills in after uploading the file to storage.
+    """
+    direct_uploads = {}  # File field -> upload kind
+
+    def __init__(self, *args, upload_user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_user = upload_user
+        self.upload_tickets = {}
+        for field_name, kind in self.direct_uploads.items():
+            self.fields[f'{field_name}_upload'] = forms.CharField(required=False, widget=forms.HiddenInput)
+            if uploads.enabled():
+                self.fields[field_name].widget.attrs['data-direct-upload'] = kind
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field_name, kind in self.direct_uploads.items():
+            ticket = cleaned_data.get(f'{field_name}_upload')
+            if not ticket or not uploads.enabled():
+                continue
+            try:
+                data = uploads.verify(ticket, kind, self.upload_user)
+            except uploads.UploadError as e:
+                self.add_error(field_name, str(e))
+                continue
+            # Stands in for the file until save() adopts the upload
+            cleaned_data[field_name] = data['key']
+            self.upload_tickets[field_name] = ticket
+        return cleaned_data
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        for field_name, ticket in self.upload_tickets.items():
+            setattr(instance, field_name, uploads.adopt(ticket))
+        if commit:
+            instance.save()
+            self._save_m2m()
+        return instance
+
+
 class SignupForm(UserCreationForm):
     email = forms.EmailField(
         required=True,
@@ -103,7 +149,7 @@ class LoginForm(AuthenticationForm):
         })
     )
 
-class UserSettingsForm(forms.ModelForm):
+class UserSettingsForm(DirectUploadMixin, forms.ModelForm):
     username = forms.CharField(
         widget=forms.TextInput(attrs={
             'class': 'form-input',
@@ -120,6 +166,8 @@ class UserSettingsForm(forms.ModelForm):
         })
     )
 
+    direct_uploads = {'profile_photo': 'profile_photo'}
+
     class Meta:
         model = CustomUser
         fields = ['username', 'bio', 'profile_photo']
@@ -311,7 +359,7 @@ class ResetPasswordForm(forms.Form):
                 raise forms.ValidationError("Password must be at least 8 characters long.")
         return cleaned_data
 
-class ContestantSubmissionForm(forms.ModelForm):
+class ContestantSubmissionForm(DirectUploadMixin, forms.ModelForm):
     submission_type = forms.ChoiceField(
         choices=Contestant.SUBMISSION_TYPES,
         widget=forms.RadioSelect(attrs={'class': 'submission-type-radio'}),
@@ -359,6 +407,9 @@ class ContestantSubmissionForm(forms.ModelForm):
         })
     )
 
+    direct_uploads = {'video_file': 'contestant_video', 'image_file': 'contestant_image'}
+    fingerprint = None  # dHash of the submitted media, stored by the view once the entry is saved
+
     class Meta:
         model = Contestant
         fields = ['submission_type', 'title', 'description', 'video_url', 'video_file', 'image_file']
@@ -379,4 +430,21 @@ class ContestantSubmissionForm(forms.ModelForm):
             if not image_file:
                 raise forms.ValidationError("Please upload an image file.")
         
+        media_field = {'video': 'video_file', 'image': 'image_file'}.get(submission_type)
+        if media_field and not self.errors:
+            self.fingerprint = self.media_fingerprint(media_field)
+            owner_id = self.upload_user.pk if self.upload_user else None
+            if self.fingerprint is not None and fingerprints.find_near_duplicates(self.fingerprint, exclude_user_id=owner_id):
+                self.add_error(media_field, "This looks like a copy of an entry that is already in the contest.")
+        
         return cleaned_data
+    
+    def media_fingerprint(self, field_name):
+        """dHash of the uploaded file or direct upload, None if there is none or it can't be computed"""
+        video = field_name == 'video_file'
+        if field_name in self.upload_tickets:
+            with uploads.get_backend().open(self.cleaned_data[field_name]) as f:
+                # Storage streams may not seek, which Pillow needs
+                return fingerprints.file_hash(f if video else io.BytesIO(f.read()), video=video)
+        f = self.cleaned_data.get(field_name)
+        return fingerprints.file_hash(f, video=video) if f else None
@@ -0,0 +1,100 @@
+"""Garbage collection of expired and obsolete rows, run by `manage.py gc`.
+
+Each Collector picks the rows it may remove and removes them batch_size at a
+time, one short statement per batch, so a run never holds locks on the hot
+tables for long. Every batch re-selects what is left, which makes runs safe to
+repeat, to interrupt and to overlap: a row handled by one run simply isn't
+found by the next.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import media
+from .batching import delete_in_batches
+from .models import Contestant, EmailConfirmationToken, ImageFingerprint, Payment
+
+
+class Collector:
+    name = None
+    description = None
+
+    def queryset(self, now):
+        """The rows to collect"""
+        raise NotImplementedError
+
+    def collect(self, queryset, batch_size, pause):
+        """Remove the rows batch by batch, yielding the count handled by each batch"""
+        return delete_in_batches(queryset, batch_size, pause)
+
+
+class EmailTokenCollector(Collector):
+    name = 'email_tokens'
+    description = 'used or expired email confirmation tokens'
+
+    def queryset(self, now):
+        return EmailConfirmationToken.objects.filter(Q(used=True) | Q(created_at__lt=now - EmailConfirmationToken.MAX_AGE))
+
+
+class PaymentCollector(Collector):
+    name = 'payments'
+    description = 'failed and abandoned payments'
+
+    def queryset(self, now):
+        # Checkout sessions expire within a day, so an old pending payment will never complete.
+        # Failed and pending payments never granted tokens, so no transaction points at them.
+        cutoff = now - timedelta(days=settings.GC_PAYMENT_RETENTION_DAYS)
+        return Payment.objects.filter(status__in=['failed', 'pending'], created_at__lt=cutoff)
+
+
+class ContestantMediaCollector(Collector):
+    name = 'contestant_media'
+    description = 'deactivated entries with media'
+
+    def queryset(self, now):
+        # The entry rows stay (votes and transactions point at them); only their files go.
+        # Entries deactivated before deactivated_at existed are left to collect() to date.
+        cutoff = now - timedelta(days=settings.GC_INACTIVE_MEDIA_DAYS)
+        has_media = (Q(video_file__isnull=False) & ~Q(video_file='')) | (Q(image_file__isnull=False) & ~Q(image_file=''))
+        return Contestant.objects.filter(has_media, is_active=False, deactivated_at__lt=cutoff)
+
+    def stamp_undated(self, batch_size):
+        """Date inactive entries without deactivated_at from now, so they keep their media for the full period.
+
+        Their age says nothing about when they were deactivated: an old entry may have been switched off yesterday.
+        """
+        now = timezone.now()
+        while True:
+            pks = list(Contestant.objects.filter(is_active=False, deactivated_at__isnull=True).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            # update() skips the Contestant signals, which only care about is_active
+            Contestant.objects.filter(pk__in=pks).update(deactivated_at=now)
+
+    def collect(self, queryset, batch_size, pause):
+        self.stamp_undated(batch_size)
+        while True:
+            rows = list(queryset.order_by('pk').values_list('pk', 'video_file', 'image_file')[:batch_size])
+            if not rows:
+                return
+            # Clear the fields and queue the files in one transaction; the
+            # delete_pending_files worker removes them from storage.
+            # update() skips the Contestant signals, which only care about is_active.
+            with transaction.atomic():
+                pks = [pk for pk, _, _ in rows]
+                Contestant.objects.filter(pk__in=pks).update(video_file='', image_file='')
+                ImageFingerprint.objects.filter(contestant__in=pks).delete()
+                media.enqueue_names(Contestant, 'video_file', [video_file for _, video_file, _ in rows])
+                media.enqueue_names(Contestant, 'image_file', [image_file for _, _, image_file in rows])
+            yield len(rows)
+            if len(rows) < batch_size:
+                return
+            if pause:
+                time.sleep(pause)
+
+
+COLLECTORS = {collector.name: collector for collector in (EmailTokenCollector(), PaymentCollector(), ContestantMediaCollector())}
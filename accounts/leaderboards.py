@@ -0,0 +1,116 @@
+"""Monthly leaderboards.
+
+`period=YYYY-MM` on the rankings page ranks the contestants who entered in that
+month. Once a month is over, `manage.py snapshot_leaderboards` freezes each
+arena's ranking for it into LeaderboardSnapshot, and closed months are served
+from those rows instead of re-sorting contestants by their current votes.
+Closed months that have not been snapshotted yet fall back to the live ranking.
+
+The months that have snapshots are cached (SNAPSHOT_MONTHS_KEY) for the month
+picker on every rankings page. build_snapshot() clears the entry when it
+commits; with a per-process cache other processes notice after
+SNAPSHOT_MONTHS_TIMEOUT and meanwhile serve the live ranking.
+"""
+import calendar
+import datetime
+from itertools import groupby
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import ranking
+from .models import Contestant, LeaderboardSnapshot
+
+# Same order as ranking.RANKING_ORDER, on the frozen values
+SNAPSHOT_ORDER = ('-votes', '-created_at', '-contestant')
+
+SNAPSHOT_MONTHS_KEY = 'leaderboards:snapshot_months'
+SNAPSHOT_MONTHS_TIMEOUT = 60 * 10  # Seconds
+
+
+def parse_period(period):
+    """Return the first day of the month for 'YYYY-MM', or None"""
+    if not period or len(period) != 7 or period[4] != '-':
+        return None
+    try:
+        year, month = map(int, period.split('-'))
+        return datetime.date(year, month, 1)
+    except (ValueError, TypeError):
+        return None
+
+
+def next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def month_bounds(month):
+    """Timezone-aware [start, end) datetimes of a month"""
+    start = timezone.now().replace(year=month.year, month=month.month, day=1, hour=0, minute=0, second=0, microsecond=0)
+    end_month = next_month(month)
+    return start, start.replace(year=end_month.year, month=end_month.month)
+
+
+def current_month():
+    return timezone.now().date().replace(day=1)
+
+
+def is_closed(month):
+    return month < current_month()
+
+
+def has_snapshot(month):
+    return month in snapshot_months()
+
+
+def snapshot_months():
+    """Months with a frozen ranking, oldest first"""
+    months = cache.get(SNAPSHOT_MONTHS_KEY)
+    if months is None:
+        months = list(LeaderboardSnapshot.objects.dates('month', 'month'))
+        cache.set(SNAPSHOT_MONTHS_KEY, months, SNAPSHOT_MONTHS_TIMEOUT)
+    return months
+
+
+def build_snapshot(month):
+    """Freeze the per-arena ranking of contestants who entered in month. Returns the number of rows."""
+    start, end = month_bounds(month)
+    contestants = (
+        Contestant.objects.filter(is_active=True, created_at__gte=start, created_at__lt=end)
+        .order_by('arena_id', *ranking.RANKING_ORDER)
+        .values_list('id', 'arena_id', 'votes', 'created_at')
+    )
+    rows = []
+    for arena_id, entries in groupby(contestants.iterator(chunk_size=2000), key=lambda entry: entry[1]):
+        for rank, (contestant_id, _, votes, created_at) in enumerate(entries, start=1):
+            rows.append(LeaderboardSnapshot(
+                month=month, arena_id=arena_id, contestant_id=contestant_id,
+                rank=rank, votes=votes, created_at=created_at,
+            ))
+
+    with transaction.atomic():
+        LeaderboardSnapshot.objects.filter(month=month).delete()
+        LeaderboardSnapshot.objects.bulk_create(rows, batch_size=2000)
+        transaction.on_commit(lambda: cache.delete(SNAPSHOT_MONTHS_KEY))
+    return len(rows)
+
+
+def frozen_contestant(snapshot):
+    """The snapshot's contestant showing the vote count it had when the month was frozen (display only)"""
+    contestant = snapshot.contestant
+    contestant.votes = snapshot.votes
+    return contestant
+
+
+def month_options(months):
+    """Dropdown options for the given months, oldest first"""
+    this_month = current_month()
+    options = []
+    for month in sorted(set(months)):
+        label = calendar.month_name[month.month]
+        if month.year != this_month.year:
+            label = f"{label} {month.year}"
+        if month == this_month:
+            label = f"This Month ({label})"
+        options.append({'value': f"{month:%Y-%m}", 'label': label, 'year': month.year, 'month': month.month})
+    return options
@@ -0,0 +1,206 @@
+"""Live vote counts and ranks pushed to browsers over Server-Sent Events.
+
+Each open page subscribes to a channel: an arena id, or ALL for the rankings
+across every arena. Votes don't push anything themselves; they only mark their
+arena as changed in the backend. A broker in each ASGI worker wakes up every
+LIVE_UPDATES_INTERVAL seconds, asks the backend which of its watched channels
+changed, loads those channels' standings once and sends the entries whose votes
+or rank moved to every subscriber. A thousand watchers of an arena cost one
+query per tick, not a thousand page reloads.
+
+Backends (LIVE_UPDATES_BACKEND):
+
+- CacheBackend bumps a per-channel version in the Django cache on every vote.
+  With a shared cache (Redis, Memcached) votes in any process reach watchers in
+  every process; with the default locmem cache only the voting process sees them.
+- DatabaseBackend writes nothing on the vote path and instead polls each arena's
+  vote total, one grouped query per tick per worker. It needs no shared cache.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils.module_loading import import_string
+
+from .models import Contestant
+from .ranking import RANKING_ORDER
+
+logger = logging.getLogger(__name__)
+
+ALL = 'all'
+
+
+def parse_channel(value):
+    """The channel for a URL value ('all' or an arena id), or None"""
+    if value == ALL:
+        return ALL
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheBackend:
+    key_prefix = 'live:version:'
+
+    def publish(self, arena_id):
+        for channel in (arena_id, ALL):
+            key = f'{self.key_prefix}{channel}'
+            # add() is a no-op if the key exists; incr() then bumps it atomically
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, 1, timeout=None)
+
+    def versions(self, channels):
+        keys = {f'{self.key_prefix}{channel}': channel for channel in channels}
+        return {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+
+
+class DatabaseBackend:
+    def publish(self, arena_id):
+        # The vote is already visible in Contestant.votes
+        pass
+
+    def versions(self, channels):
+        totals = {
+            row['arena_id']: (row['votes'], row['entries'])
+            for row in Contestant.objects.filter(is_active=True).order_by().values('arena_id').annotate(votes=Sum('votes'), entries=Count('id'))
+        }
+        versions = {channel: totals.get(channel) for channel in channels if channel != ALL}
+        if ALL in channels:
+            versions[ALL] = tuple(sorted(totals.items()))
+        return versions
+
+
+def get_backend():
+    return import_string(settings.LIVE_UPDATES_BACKEND)()
+
+
+def publish(arena_id):
+    """Mark an arena's standings as changed. Call after the vote is committed."""
+    get_backend().publish(arena_id)
+
+
+def standings(channel):
+    """{contestant id: (votes, rank)} for the top LIVE_UPDATES_MAX_ROWS entries of a channel"""
+    contestants = Contestant.objects.filter(is_active=True)
+    if channel != ALL:
+        contestants = contestants.filter(arena_id=channel)
+    rows = contestants.order_by(*RANKING_ORDER).values_list('id', 'votes')[:settings.LIVE_UPDATES_MAX_ROWS]
+    return {contestant_id: (votes, rank) for rank, (contestant_id, votes) in enumerate(rows, start=1)}
+
+
+def event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def standings_event(rows, full=False):
+    """A standings message: [id, votes, rank] per entry, with null votes and rank for
+    entries that left the standings; a full message lists every entry still in them"""
+    return event('standings', {'full': full, 'changes': [[contestant_id, votes, rank] for contestant_id, (votes, rank) in rows.items()]})
+
+
+class Broker:
+    """Per-process fan-out of standings changes to SSE subscribers"""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.subscribers = {}  # channel -> set of queues
+        self.versions = {}  # channel -> backend version the standings were loaded at
+        self.standings = {}  # channel -> last standings sent
+        self.joining = {}  # channel -> queues that haven't been sent the standings yet
+        self.task = None
+
+    def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=settings.LIVE_UPDATES_QUEUE_SIZE)
+        self.subscribers.setdefault(channel, set()).add(queue)
+        self.joining.setdefault(channel, set()).add(queue)
+        if self.task is None or self.task.done() or self.task.get_loop() is not asyncio.get_running_loop():
+            self.task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        queues = self.subscribers.get(channel)
+        if queues is None:
+            return
+        queues.discard(queue)
+        self.joining.get(channel, set()).discard(queue)
+        if not queues:
+            # Nobody is watching; load from scratch if someone subscribes again
+            del self.subscribers[channel]
+            self.joining.pop(channel, None)
+            self.versions.pop(channel, None)
+            self.standings.pop(channel, None)
+
+    async def run(self):
+        backend = self.backend or get_backend()
+        while self.subscribers:
+            await asyncio.sleep(settings.LIVE_UPDATES_INTERVAL)
+            try:
+                await self.tick(backend)
+            except Exception as e:
+                # Keep serving the open streams; the next tick retries
+                logger.error(f"Live standings tick failed: {str(e)}", exc_info=True)
+
+    async def tick(self, backend):
+        channels = list(self.subscribers)
+        versions = await sync_to_async(backend.versions)(channels)
+        for channel in channels:
+            version = versions.get(channel)
+            # New streams get the full standings first: votes cast between the page
+            # render and this tick would otherwise never reach them
+            joining = self.joining.pop(channel, set())
+            if channel in self.versions and self.versions[channel] == version:
+                if joining:
+                    self.send(joining, standings_event(self.standings[channel], full=True), self.standings[channel])
+                continue
+            previous = self.standings.get(channel)
+            current = await sync_to_async(standings)(channel)
+            self.versions[channel] = version
+            self.standings[channel] = current
+            if joining:
+                self.send(joining, standings_event(current, full=True), current)
+            if previous is None:
+                continue
+            changes = {contestant_id: row for contestant_id, row in current.items() if previous.get(contestant_id) != row}
+            # Entries that were deactivated or fell out of the top rows
+            changes.update((contestant_id, (None, None)) for contestant_id in previous.keys() - current.keys())
+            if changes:
+                self.send(self.subscribers.get(channel, set()) - joining, standings_event(changes), current)
+
+    def send(self, queues, message, current):
+        full_message = None
+        for queue in queues:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A slow client missed updates: replace its backlog with the full standings
+                full_message = full_message or standings_event(current, full=True)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(full_message)
+
+
+broker = Broker()
+
+
+async def stream(channel):
+    """Yield SSE messages for a channel until the client disconnects"""
+    queue = broker.subscribe(channel)
+    try:
+        yield f'retry: {settings.LIVE_UPDATES_RETRY_MS}\n\n'
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=settings.LIVE_UPDATES_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Comment line so proxies don't close an idle connection
+                yield ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(channel, queue)
@@ -0,0 +1,96 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncHour
+from accounts import activity, ranking
+from accounts.models import ActivityEvent, Arena, Contestant, CustomUser, Payment, TokenTransaction, Vote
+
+class Command(BaseCommand):
+    help = 'Builds the recent activity feed from existing submissions, votes, payments and placements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only backfill this username')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Events inserted per query')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            deleted, _ = ActivityEvent.objects.filter(user__in=users).delete()
+            created = 0
+
+            contestants = Contestant.objects.filter(user__in=users, is_active=True).select_related('arena').order_by('created_at')
+            events = []
+            tiers_seen = set()
+            for contestant in contestants.iterator(chunk_size=batch_size):
+                events.append(activity.submission_event(contestant))
+                if (contestant.user_id, contestant.arena.tier) not in tiers_seen:
+                    tiers_seen.add((contestant.user_id, contestant.arena.tier))
+                    events.append(activity.tier_event(contestant))
+            created += self.insert(events, batch_size)
+
+            # One event per entry per hour, dated by the hour's first vote, free or paid
+            hours = self.vote_hours(users)
+            voted_contestants = Contestant.objects.in_bulk({contestant_id for contestant_id, _ in hours})
+            created += self.insert(
+                (activity.vote_event(voted_contestants[contestant_id], first, count) for (contestant_id, _), (count, first) in hours.items()),
+                batch_size,
+            )
+
+            payments = Payment.objects.filter(user__in=users, status='completed')
+            created += self.insert(
+                (activity.purchase_event(payment) for payment in payments.iterator(chunk_size=batch_size)),
+                batch_size,
+            )
+
+            # Current podium places, dated by the contestant's latest vote
+            placements = []
+            user_ids = set(users.values_list('id', flat=True))
+            for arena in Arena.objects.filter(is_active=True):
+                for place, (contestant_id, user_id) in enumerate(ranking.arena_podium(arena.id), start=1):
+                    if user_id not in user_ids:
+                        continue
+                    contestant = Contestant.objects.select_related('arena').get(id=contestant_id)
+                    latest_vote = Vote.objects.filter(contestant=contestant).order_by('-created_at').first()
+                    placements.append(activity.placement_event(contestant, place, latest_vote.created_at if latest_vote else contestant.created_at))
+            created += self.insert(placements, batch_size)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Backfilled activity: {created} events created, {deleted} old events replaced')
+        )
+
+    def vote_hours(self, users):
+        """{(contestant_id, hour): (votes, first vote)} for the users' active entries, counted like the vote path does"""
+        free_votes = Vote.objects.filter(contestant__user__in=users, contestant__is_active=True)
+        # Paid votes are only recorded as token transactions
+        paid_votes = TokenTransaction.objects.filter(transaction_type='vote', related_contestant__user__in=users, related_contestant__is_active=True)
+
+        hours = {}
+        for votes, contestant_field in ((free_votes, 'contestant_id'), (paid_votes, 'related_contestant_id')):
+            rows = (
+                votes.annotate(hour=TruncHour('created_at', tzinfo=datetime.timezone.utc))
+                .values_list(contestant_field, 'hour').annotate(count=Count('id'), first=Min('created_at')).order_by()
+            )
+            for contestant_id, hour, count, first in rows:
+                total, earliest = hours.get((contestant_id, hour), (0, first))
+                hours[(contestant_id, hour)] = (total + count, min(earliest, first))
+        return hours
+
+    def insert(self, events, batch_size):
+        count = 0
+        batch = []
+        for event in events:
+            batch.append(event)
+            if len(batch) >= batch_size:
+                ActivityEvent.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            ActivityEvent.objects.bulk_create(batch)
+            count += len(batch)
+        return count
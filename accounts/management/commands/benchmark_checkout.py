@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import stripe
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.runner import DiscoverRunner
+from accounts.models import CustomUser
+
+CHECKOUT_URL = '/api/create-checkout-session/'
+
+
+def fake_stripe(latency):
+    """A local server answering Stripe's Checkout API after `latency` seconds"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            body = json.dumps({'id': f'cs_bench_{uuid.uuid4().hex}', 'object': 'checkout.session'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summary(mode, latencies, elapsed):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return f'{mode:<8} {len(latencies) / elapsed:>8.1f} req/s   p50 {statistics.median(latencies) * 1000:>6.0f} ms   p99 {p99 * 1000:>6.0f} ms'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares Django's sync (WSGI) and async (ASGI) request handling for checkout requests against a fake Stripe "
+        "with fixed latency, using in-process test clients (not gunicorn or uvicorn) and a throwaway test database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--threads', type=int, default=8, help='Threads of the sync worker (like gunicorn --threads)')
+        parser.add_argument('--latency', type=int, default=200, help='Milliseconds the fake Stripe takes to answer')
+
+    def handle(self, *args, **options):
+        # Users and payments go to a test database (test_<NAME>, like `manage.py test`), dropped however the run ends
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        database = connection.settings_dict
+        if connection.vendor == 'sqlite' and not database['TEST']['NAME']:
+            # The default in-memory test database locks up under concurrent writers
+            database['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), f'benchmark-{os.getpid()}.sqlite3')
+        databases = runner.setup_databases()
+        server = fake_stripe(options['latency'] / 1000)
+        api_base, api_key = stripe.api_base, stripe.api_key
+        stripe.api_base = f'http://127.0.0.1:{server.server_port}'
+        stripe.api_key = 'sk_test_benchmark'
+        try:
+            user = CustomUser.objects.create_user(username='benchmark', email='benchmark@example.com')
+            with override_settings(ALLOWED_HOSTS=['testserver'], STRIPE_SECRET_KEY=stripe.api_key):
+                self.stdout.write(f"{options['requests']} requests, {options['concurrency']} in flight, Stripe answering in {options['latency']} ms")
+                self.stdout.write(summary(f"sync/{options['threads']}", *self.run_sync(user, options)))
+                self.stdout.write(summary('async', *asyncio.run(self.run_async(user, options))))
+        finally:
+            stripe.api_base, stripe.api_key = api_base, api_key
+            server.shutdown()
+            runner.teardown_databases(databases)
+
+    def run_sync(self, user, options):
+        """Requests wait for one of a fixed number of threads, like a threaded WSGI worker"""
+        local = threading.local()
+
+        def handle():
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.force_login(user)
+            response = local.client.post(CHECKOUT_URL, {'tokens': 50}, content_type='application/json')
+            assert response.status_code == 200, response.content
+
+        worker = ThreadPoolExecutor(max_workers=options['threads'])
+        clients = ThreadPoolExecutor(max_workers=options['concurrency'])
+
+        def post():
+            started = time.perf_counter()
+            worker.submit(handle).result()
+            return time.perf_counter() - started
+
+        try:
+            started = time.perf_counter()
+            latencies = list(clients.map(lambda _: post(), range(options['requests'])))
+            return latencies, time.perf_counter() - started
+        finally:
+            # On Ctrl-C, drop the queued requests instead of waiting for all of them
+            worker.shutdown(wait=False, cancel_futures=True)
+            clients.shutdown(cancel_futures=True)
+            worker.shutdown()
+
+    async def run_async(self, user, options):
+        """All requests share one event loop, like an ASGI worker"""
+        client = AsyncClient()
+        await client.aforce_login(user)
+        in_flight = asyncio.Semaphore(options['concurrency'])
+
+        async def post():
+            async with in_flight:
+                started = time.perf_counter()
+                response = await client.post(CHECKOUT_URL, {'tokens': 50}, content_type='application/json')
+                assert response.status_code == 200, response.content
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(post() for _ in range(options['requests'])))
+        return latencies, time.perf_counter() - started
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts import finale
+
+class Command(BaseCommand):
+    help = 'Computes the Finale Royale qualifiers (top 3 of every arena) for a season and stores the standings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, help='Tournament year (defaults to the current year)')
+
+    def handle(self, *args, **options):
+        season = options['season'] or timezone.now().year
+        qualifications = finale.save_qualifiers(season)
+        arenas = len({q.arena_id for q in qualifications})
+        self.stdout.write(self.style.SUCCESS(f'Season {season}: {len(qualifications)} qualifiers from {arenas} arenas'))
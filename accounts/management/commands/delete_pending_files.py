@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts import media
+from accounts.models import PendingFileDeletion
+
+class Command(BaseCommand):
+    help = 'Removes the files of deleted users and entries from storage in batches (see accounts/media.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only count queued files; delete nothing')
+        parser.add_argument('--batch-size', type=int, default=500, help='Files handled per batch')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Give up on a file after this many failed deletes')
+        parser.add_argument('--interval', type=float, default=None, help='Keep running, going through the queue every this many seconds')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            queued = PendingFileDeletion.objects.filter(attempts__lt=options['max_attempts']).count()
+            given_up = PendingFileDeletion.objects.filter(attempts__gte=options['max_attempts']).count()
+            self.stdout.write(self.style.SUCCESS(f'Found {queued} queued files ({given_up} given up after {options["max_attempts"]} attempts)'))
+            return
+
+        while True:
+            self.run_once(options['batch_size'], options['max_attempts'])
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def run_once(self, batch_size, max_attempts):
+        started = time.perf_counter()
+        last_id = 0
+        deleted = kept = failed = 0
+        while True:
+            last_id, batch_deleted, batch_kept, batch_failed = media.process_batch(last_id, batch_size, max_attempts)
+            if last_id is None:
+                break
+            deleted += batch_deleted
+            kept += batch_kept
+            failed += batch_failed
+
+        if not (deleted or kept or failed):
+            return
+        seconds = time.perf_counter() - started
+        rate = deleted / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} files in {seconds:.1f}s ({rate:.0f}/s), kept {kept} still in use'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Failed to delete {failed} files (see Pending file deletions in the admin)'))
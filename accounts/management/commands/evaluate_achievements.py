@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from accounts.achievements import RULES, RULES_BY_CODE, ALL_EVENTS, RANK_CHANGED, evaluate, users_with_rank_changes
+from accounts.models import CustomUser
+
+class Command(BaseCommand):
+    help = 'Evaluates achievement rules for existing users (run after adding or changing a rule)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rule', action='append', dest='rules', help='Only evaluate this rule code (can be repeated)')
+        parser.add_argument('--user', help='Only evaluate achievements for this username')
+        parser.add_argument('--ranks-changed-since', type=float, metavar='MINUTES', help='Only evaluate rank-based rules, for users in arenas with votes or entries in the last MINUTES (run from cron)')
+
+    def handle(self, *args, **options):
+        rules = RULES
+        if options['rules']:
+            unknown = [code for code in options['rules'] if code not in RULES_BY_CODE]
+            if unknown:
+                raise CommandError(f"Unknown rule(s): {', '.join(unknown)}. Available: {', '.join(RULES_BY_CODE)}")
+            rules = [RULES_BY_CODE[code] for code in options['rules']]
+
+        users = CustomUser.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+        user_ids = users.values_list('id', flat=True)
+        events = ALL_EVENTS
+        if options['ranks_changed_since'] is not None:
+            since = timezone.now() - timedelta(minutes=options['ranks_changed_since'])
+            user_ids = user_ids.filter(id__in=users_with_rank_changes(since))
+            events = {RANK_CHANGED}
+            rules = [rule for rule in rules if RANK_CHANGED in rule.triggers]
+
+        checked = total_awarded = total_revoked = 0
+        for user_id in user_ids.iterator(chunk_size=500):
+            awarded, revoked = evaluate(user_id, events, rules)
+            checked += 1
+            total_awarded += awarded
+            total_revoked += revoked
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Evaluated {len(rules)} rule(s) for {checked} users: {total_awarded} awarded, {total_revoked} revoked')
+        )
@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from accounts import exports
+
+class Command(BaseCommand):
+    help = 'Streams votes, token transactions or payments as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=list(exports.EXPORTS), help='What to export')
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--arena', help='Only rows for this arena id')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        export = exports.get_export(options['name'])
+        try:
+            filters = exports.parse_filters(options['start'], options['end'], options['arena'])
+            rows = export.rows(**filters, chunk_size=options['chunk_size'])
+            lines = exports.render(export, rows, options['format'])
+        except exports.ExportError as e:
+            raise CommandError(str(e))
+
+        if not options['output']:
+            sys.stdout.writelines(lines)
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(lines)
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['name']} to {options['output']}"))
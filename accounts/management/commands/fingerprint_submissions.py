@@ -0,0 +1,72 @@
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from accounts import fingerprints
+from accounts.models import Contestant, ImageFingerprint
+
+class Command(BaseCommand):
+    help = 'Computes the perceptual fingerprints of entries that have none or whose file changed, and reports near-duplicates between users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only count entries missing an up-to-date fingerprint; change nothing')
+        parser.add_argument('--batch-size', type=int, default=200, help='Entries loaded per query')
+        parser.add_argument('--report', action='store_true', help='Afterwards, list entries within NEAR_DUPLICATE_MAX_DISTANCE of another user\'s entry')
+
+    def handle(self, *args, **options):
+        image = Q(submission_type='image', image_file__isnull=False) & ~Q(image_file='') & ~Q(fingerprint__source_name=F('image_file'))
+        video = Q(submission_type='video', video_file__isnull=False) & ~Q(video_file='') & ~Q(fingerprint__source_name=F('video_file'))
+        if shutil.which(settings.FFMPEG_BINARY) is None:
+            self.stdout.write(self.style.WARNING(f'{settings.FFMPEG_BINARY} not found; videos are skipped'))
+            video = Q(pk__in=[])
+        pending = Contestant.objects.filter(image | video)
+
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS(f'{pending.count()} entries to fingerprint'))
+        else:
+            self.fingerprint(pending, options['batch_size'])
+
+        if options['report']:
+            self.report()
+
+    def fingerprint(self, pending, batch_size):
+        started = time.perf_counter()
+        stored = failed = 0
+        after = 0
+        while True:
+            # Keyset pages: entries that can't be read stay pending without being retried here
+            batch = list(pending.filter(pk__gt=after).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            for contestant in batch:
+                source, video = fingerprints.contestant_source(contestant)
+                try:
+                    with source.open('rb') as f:
+                        value = fingerprints.file_hash(f, video=video)
+                except OSError as e:
+                    self.stdout.write(self.style.WARNING(f'Entry {contestant.pk}: {source.name}: {str(e)}'))
+                    value = None
+                if value is None:
+                    # A fingerprint of the entry's previous file would no longer be true
+                    ImageFingerprint.objects.filter(contestant=contestant).delete()
+                    failed += 1
+                    continue
+                fingerprints.store(contestant, value)
+                stored += 1
+            after = batch[-1].pk
+
+        seconds = time.perf_counter() - started
+        rate = (stored + failed) / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(f'Fingerprinted {stored} entries in {seconds:.1f}s ({rate:.0f}/s), {failed} could not be read'))
+
+    def report(self):
+        pairs = set()
+        for fingerprint in ImageFingerprint.objects.order_by('pk').iterator(chunk_size=2000):
+            for distance, match in fingerprints.find_near_duplicates(fingerprint.dhash, exclude_user_id=fingerprint.user_id):
+                pair = tuple(sorted((fingerprint.contestant_id, match.contestant_id)))
+                if pair not in pairs:
+                    pairs.add(pair)
+                    self.stdout.write(f'Entries {pair[0]} and {pair[1]}: {distance} bits apart')
+        self.stdout.write(self.style.SUCCESS(f'Found {len(pairs)} near-duplicate pairs between users'))
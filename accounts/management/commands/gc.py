@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.gc import COLLECTORS
+
+class Command(BaseCommand):
+    help = 'Deletes expired tokens, failed/abandoned payments and the media of long-deactivated entries in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be collected; change nothing')
+        parser.add_argument('--only', action='append', choices=list(COLLECTORS), help='Run only this collector (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows handled per statement')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between batches')
+        parser.add_argument('--max-seconds', type=float, default=None, help='Stop starting new batches after this long; the next run continues')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        collectors = [COLLECTORS[name] for name in options['only'] or COLLECTORS]
+        started = time.perf_counter()
+        total = 0
+
+        for collector in collectors:
+            queryset = collector.queryset(now)
+            if options['dry_run']:
+                self.stdout.write(f'{collector.name}: {queryset.count()} {collector.description} to collect')
+                continue
+
+            collected = 0
+            collector_started = time.perf_counter()
+            out_of_time = False
+            for count in collector.collect(queryset, options['batch_size'], options['pause']):
+                collected += count
+                if options['max_seconds'] is not None and time.perf_counter() - started >= options['max_seconds']:
+                    out_of_time = True
+                    break
+            seconds = time.perf_counter() - collector_started
+            rate = collected / seconds if seconds else 0
+            self.stdout.write(f'{collector.name}: collected {collected} {collector.description} in {seconds:.1f}s ({rate:.0f}/s)')
+            total += collected
+            if out_of_time:
+                self.stdout.write(self.style.WARNING(f'Stopped after {options["max_seconds"]:g}s; the next run continues'))
+                break
+
+        if not options['dry_run']:
+            seconds = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f'Collected {total} rows in {seconds:.1f}s'))
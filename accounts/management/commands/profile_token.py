@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.middleware import make_profile_token, PROFILE_QUERY_PARAM
+from accounts.models import CustomUser
+
+class Command(BaseCommand):
+    help = 'Issues a signed token that lets a staff user profile individual requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Staff user the token is issued to')
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options['username'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        if not user.is_staff:
+            raise CommandError(f'{user.username} is not a staff user')
+
+        token = make_profile_token(user)
+        self.stdout.write(self.style.SUCCESS(f'Profile token for {user.username}:'))
+        self.stdout.write(token)
+        self.stdout.write(
+            f'\nWhile logged in as {user.username}, add ?{PROFILE_QUERY_PARAM}=<token> to a URL '
+            f'or send it in the X-Profile-Token header. Profiles are listed under Request profiles in the admin.'
+        )
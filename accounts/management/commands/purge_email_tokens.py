@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.batching import delete_all
+from accounts.gc import COLLECTORS
+from accounts.models import EmailConfirmationToken
+
+class Command(BaseCommand):
+    help = 'Deletes used and expired EmailConfirmationToken rows in batches (new links are signed and store nothing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only count the rows; delete nothing')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        stale = COLLECTORS['email_tokens'].queryset(timezone.now())
+
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS(f'Found {stale.count()} used or expired tokens ({EmailConfirmationToken.objects.count()} in total)'))
+            return
+
+        deleted, seconds = delete_all(stale, options['batch_size'], options['pause'])
+        rate = deleted / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} used or expired tokens in {seconds:.1f}s ({rate:.0f}/s)'))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.batching import delete_all
+
+class Command(BaseCommand):
+    help = 'Deletes expired database sessions in batches (a batched clearsessions)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only count expired sessions; delete nothing')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        expired = Session.objects.filter(expire_date__lt=timezone.now())
+
+        if settings.SESSION_MODE == 'signed_cookies':
+            self.stdout.write(self.style.WARNING('SESSION_MODE is signed_cookies: new sessions are not stored, only leftover rows are purged'))
+
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS(f'Found {expired.count()} expired sessions'))
+            return
+
+        deleted, seconds = delete_all(expired, options['batch_size'], options['pause'])
+        rate = deleted / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions in {seconds:.1f}s ({rate:.0f}/s)'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.models import Contestant
+from accounts.trending import compute_scores
+
+class Command(BaseCommand):
+    help = 'Recomputes every contestant trending score from the vote history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Contestants updated per query')
+
+    def handle(self, *args, **options):
+        scores = compute_scores()
+        batch_size = options['batch_size']
+        updated = 0
+
+        with transaction.atomic():
+            batch = []
+            for contestant in Contestant.objects.only('id', 'trending_score').iterator(chunk_size=batch_size):
+                score = scores.get(contestant.id, 0.0)
+                if contestant.trending_score != score:
+                    contestant.trending_score = score
+                    batch.append(contestant)
+                if len(batch) >= batch_size:
+                    updated += Contestant.objects.bulk_update(batch, ['trending_score'])
+                    batch = []
+            if batch:
+                updated += Contestant.objects.bulk_update(batch, ['trending_score'])
+
+        self.stdout.write(self.style.SUCCESS(f'Updated trending scores for {updated} contestants'))
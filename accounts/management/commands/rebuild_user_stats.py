@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from accounts.models import CustomUser, UserStats
+from accounts.stats import compute_user_stats, find_drift
+
+class Command(BaseCommand):
+    help = 'Rebuilds per-user competition stats from Contestant data and reports drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report users whose stored stats have drifted; change nothing')
+        parser.add_argument('--user', help='Only rebuild stats for this username')
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        existing = {s.user_id: s for s in UserStats.objects.filter(user__in=users)}
+        checked = drifted = created = 0
+
+        for user in users.iterator(chunk_size=500):
+            checked += 1
+            user_stats = existing.get(user.id)
+
+            if user_stats is None:
+                created += 1
+                if not options['check']:
+                    UserStats.objects.update_or_create(user=user, defaults=compute_user_stats(user.id))
+                continue
+
+            drift = find_drift(user_stats)
+            if not drift:
+                continue
+
+            drifted += 1
+            details = ', '.join(f'{field}: {stored} -> {actual}' for field, (stored, actual) in drift.items())
+            self.stdout.write(self.style.WARNING(f'{user.username}: {details}'))
+            if not options['check']:
+                UserStats.objects.update_or_create(user=user, defaults=compute_user_stats(user.id))
+
+        action = 'Found' if options['check'] else 'Fixed'
+        missing = 'missing' if options['check'] else 'created'
+        self.stdout.write(
+            self.style.SUCCESS(f'\nChecked {checked} users: {action} {drifted} with drift, {created} {missing}')
+        )
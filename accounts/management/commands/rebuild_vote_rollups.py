@@ -0,0 +1,21 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts import rollups
+
+class Command(BaseCommand):
+    help = 'Rebuilds the hourly vote rollups from Vote and token vote transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Only rebuild the last N days (default: everything)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows inserted per query')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.now() - datetime.timedelta(days=options['days'])
+
+        count = rollups.rebuild(since, options['batch_size'])
+        scope = f"the last {options['days']} days" if since else 'all time'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} hourly rollups for {scope}'))
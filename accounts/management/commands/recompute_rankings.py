@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = 'Recomputes arena ranks and every user\'s stats in one vectorized pass (requires numpy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report how many stored stats have drifted; change nothing')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows fetched per database round trip while loading')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per query')
+
+    def handle(self, *args, **options):
+        try:
+            from accounts import batch_stats
+        except ImportError:
+            raise CommandError('recompute_rankings needs numpy: pip install numpy')
+
+        started = time.perf_counter()
+        stats, entry_count, arena_count = batch_stats.compute_all_stats(options['chunk_size'])
+        computed = time.perf_counter()
+        changed, missing = batch_stats.find_changes(stats, options['chunk_size'])
+        drifted, created = int(changed.sum()), int(missing.sum())
+
+        if not options['check']:
+            batch_stats.write_stats(stats, changed, missing, options['batch_size'])
+
+        action = 'Found' if options['check'] else 'Fixed'
+        missing_label = 'missing' if options['check'] else 'created'
+        self.stdout.write(
+            f'Ranked {entry_count} entries in {arena_count} arenas in {computed - started:.2f}s, '
+            f'total {time.perf_counter() - started:.2f}s'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'\nChecked {len(stats["user"])} users: {action} {drifted} with drift, {created} {missing_label}')
+        )
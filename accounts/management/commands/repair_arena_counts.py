@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from accounts.capacity import find_drift
+from accounts.models import Arena
+
+class Command(BaseCommand):
+    help = 'Recounts active contestants per arena and fixes drifted participant counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report arenas whose count has drifted; change nothing')
+
+    def handle(self, *args, **options):
+        drifted = find_drift()
+        for arena, stored, actual in drifted:
+            self.stdout.write(self.style.WARNING(f'{arena.name}: participant_count {stored} -> {actual}'))
+            if not options['check']:
+                Arena.objects.filter(pk=arena.pk).update(participant_count=actual)
+
+        action = 'Found' if options['check'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'\nChecked {Arena.objects.count()} arenas: {action} {len(drifted)} with drift'))
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounts.models import StoredBlob
+from accounts.storage import delete_orphan, find_drift, find_orphans, repair_blob
+
+class Command(BaseCommand):
+    help = 'Recounts the rows using each content-addressed blob, fixes drifted counts and removes unused blobs and orphaned files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drifted counts and orphaned files; change nothing')
+        parser.add_argument('--min-age', type=int, default=60, help='Skip blobs referenced, and files written, in the last MINUTES (default 60)')
+
+    def handle(self, *args, **options):
+        if not getattr(default_storage, 'refcounted', False):
+            self.stdout.write(self.style.WARNING('MEDIA_STORAGE is not content_addressed; only existing blobs are checked'))
+
+        # Uploads in flight may have counted a reference whose row isn't written yet
+        cutoff = timezone.now() - timedelta(minutes=options['min_age'])
+
+        drifted = find_drift(cutoff)
+        fixed = removed = 0
+        for blob, stored, actual in drifted:
+            self.stdout.write(self.style.WARNING(f'{blob.name}: refcount {stored} -> {actual}'))
+            if options['check']:
+                continue
+            recounted = repair_blob(default_storage, blob, cutoff)
+            if recounted is None:
+                self.stdout.write(f'{blob.name}: referenced again, skipped')
+                continue
+            fixed += 1
+            if not recounted:
+                removed += 1
+
+        orphans = find_orphans(default_storage, cutoff)
+        deleted = 0
+        for name in orphans:
+            self.stdout.write(self.style.WARNING(f'{name}: no StoredBlob row'))
+            if not options['check'] and delete_orphan(default_storage, name):
+                deleted += 1
+
+        if options['check']:
+            summary = f'Found {len(drifted)} with drift and {len(orphans)} orphaned files'
+        else:
+            summary = f'Fixed {fixed} with drift, removed {removed} unused, deleted {deleted} orphaned files'
+        self.stdout.write(self.style.SUCCESS(f'\nChecked {StoredBlob.objects.count()} blobs: {summary}'))
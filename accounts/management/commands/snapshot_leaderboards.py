@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts import leaderboards
+from accounts.models import Contestant
+
+class Command(BaseCommand):
+    help = 'Freezes the per-arena rankings of closed months (backfills every closed month without a snapshot by default)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', action='append', dest='months', help='Snapshot this month (YYYY-MM), replacing an existing snapshot; can be repeated')
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild the snapshots of every closed month')
+
+    def handle(self, *args, **options):
+        if options['months']:
+            months = []
+            for period in options['months']:
+                month = leaderboards.parse_period(period)
+                if month is None:
+                    raise CommandError(f'Invalid month "{period}", expected YYYY-MM')
+                if not leaderboards.is_closed(month):
+                    raise CommandError(f'{period} is not over yet; only closed months can be frozen')
+                months.append(month)
+        else:
+            months = [
+                month for month in Contestant.objects.dates('created_at', 'month')
+                if leaderboards.is_closed(month)
+            ]
+            if not options['rebuild']:
+                done = set(leaderboards.snapshot_months())
+                months = [month for month in months if month not in done]
+
+        if not months:
+            self.stdout.write(self.style.SUCCESS('All closed months are already snapshotted'))
+            return
+
+        for month in months:
+            count = leaderboards.build_snapshot(month)
+            self.stdout.write(f'{month:%Y-%m}: {count} contestants')
+
+        self.stdout.write(self.style.SUCCESS(f'\nSnapshotted {len(months)} month(s)'))
@@ -0,0 +1,106 @@
+"""Deferred deletion of uploaded files.
+
+Deleting a row that owns files doesn't touch storage. The pre_delete signals
+call enqueue(), which records each file in PendingFileDeletion inside the same
+transaction as the delete: if the transaction rolls back the queue rows vanish
+with it and the files stay, and a long cascade (a user with many entries, a
+bulk admin delete) only inserts rows. `manage.py delete_pending_files` then
+removes the files in batches outside any transaction.
+
+A file is only removed while no row of its field still refers to the name, so
+a name that was reused in the meantime is kept. Reference-counted storages
+(accounts/storage.py) are always asked to delete and release one reference.
+"""
+import logging
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+
+from .models import PendingFileDeletion
+
+logger = logging.getLogger(__name__)
+
+
+def field_label(model, field_name):
+    return f'{model._meta.label}.{field_name}'
+
+
+def get_field(label):
+    model_label, _, field_name = label.rpartition('.')
+    return apps.get_model(model_label)._meta.get_field(field_name)
+
+
+def enqueue(instance, *field_names):
+    """Queue the files held by instance's file fields; call inside the transaction that deletes or clears them"""
+    pending = []
+    for field_name in field_names:
+        name = getattr(instance, field_name).name
+        if name:
+            pending.append(PendingFileDeletion(field=field_label(type(instance), field_name), name=name))
+    if pending:
+        PendingFileDeletion.objects.bulk_create(pending)
+    return len(pending)
+
+
+def enqueue_names(model, field_name, names):
+    """Queue files by name, e.g. after clearing a field with update()"""
+    label = field_label(model, field_name)
+    PendingFileDeletion.objects.bulk_create([PendingFileDeletion(field=label, name=name) for name in names if name])
+
+
+def still_referenced(label, names):
+    """The names that a row of the field still points at"""
+    field = get_field(label)
+    return set(field.model._base_manager.filter(**{f'{field.name}__in': names}).values_list(field.name, flat=True))
+
+
+def process_batch(after=0, batch_size=500, max_attempts=5):
+    """Delete up to batch_size queued files with an id above after.
+
+    Returns (last id, deleted, kept, failed), last id being None once the queue
+    is exhausted. Kept files are referenced again and were only dropped from the
+    queue; failed ones stay queued for the next run.
+    """
+    batch = list(PendingFileDeletion.objects.filter(id__gt=after, attempts__lt=max_attempts).order_by('id')[:batch_size])
+    if not batch:
+        return None, 0, 0, 0
+    by_field = {}
+    for pending in batch:
+        by_field.setdefault(pending.field, []).append(pending)
+
+    done, failed = [], []
+    deleted = kept = 0
+    for label, pendings in by_field.items():
+        try:
+            storage = get_field(label).storage
+            if getattr(storage, 'refcounted', False):
+                # Shared names are expected; the storage only removes the last reference
+                referenced = set()
+            else:
+                referenced = still_referenced(label, [pending.name for pending in pendings])
+        except (LookupError, FieldDoesNotExist) as e:
+            # The model or field is gone; nothing can resolve the storage any more
+            for pending in pendings:
+                pending.attempts, pending.last_error = max_attempts, str(e)
+            failed.extend(pendings)
+            continue
+        for pending in pendings:
+            if pending.name in referenced:
+                kept += 1
+                done.append(pending.pk)
+                continue
+            try:
+                storage.delete(pending.name)
+            except Exception as e:
+                logger.error(f"Error deleting {pending.name} ({label}): {str(e)}")
+                pending.attempts += 1
+                pending.last_error = str(e)
+                failed.append(pending)
+                continue
+            deleted += 1
+            done.append(pending.pk)
+
+    PendingFileDeletion.objects.filter(pk__in=done).delete()
+    if failed:
+        PendingFileDeletion.objects.bulk_update(failed, ['attempts', 'last_error'])
+    return batch[-1].pk, deleted, kept, len(failed)
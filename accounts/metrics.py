@@ -0,0 +1,339 @@
+"""In-process metrics with a Prometheus text-format exporter.
+
+Each worker process keeps its own counters and histograms in memory. When
+METRICS_DIR is set, every process periodically writes a snapshot of its values
+to a file named after its pid in that directory, and the /metrics endpoint sums
+the snapshots of all processes. Snapshots of processes that have exited are
+folded into exited.json, so counters never go backwards and the directory
+doesn't grow with every worker restart. Clear METRICS_DIR when the server is
+(re)started.
+
+A process forked after the import (gunicorn --preload) starts with empty
+values and its own snapshot file: what the parent counted is in the parent's.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshots of exited processes are kept as they are
+    fcntl = None
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXITED_SNAPSHOT = 'exited.json'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        registry.register(self)
+
+    def label_values(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_values(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+    def empty(self):
+        return 0
+
+    @staticmethod
+    def merge(total, value):
+        return total + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self.label_values(labels)
+        with self.registry.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = self.empty()
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+            state['count'] += 1
+            state['sum'] += value
+        self.registry.changed()
+
+    def empty(self):
+        return {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+
+    @staticmethod
+    def merge(total, value):
+        return {
+            'buckets': [a + b for a, b in zip(total['buckets'], value['buckets'])],
+            'count': total['count'] + value['count'],
+            'sum': total['sum'] + value['sum'],
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.flusher = None
+        self.snapshot_name = new_snapshot_name()
+        registries.add(self)
+
+    def after_fork(self):
+        """Start over in a forked child: the parent's values and flusher thread stay the parent's"""
+        self.lock = threading.Lock()
+        for metric in self.metrics.values():
+            metric.values = {}
+        self.dirty = False
+        self.flusher = None
+        self.snapshot_name = new_snapshot_name()
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(self, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, documentation, labelnames, buckets)
+
+    # Multi-process snapshots
+
+    def metrics_dir(self):
+        metrics_dir = getattr(settings, 'METRICS_DIR', '')
+        return Path(metrics_dir) if metrics_dir else None
+
+    def changed(self):
+        self.dirty = True
+        if self.flusher is None and self.metrics_dir():
+            self.start_flusher()
+
+    def start_flusher(self):
+        with self.lock:
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(target=self.flush_forever, name='metrics-flusher', daemon=True)
+            self.flusher.start()
+        atexit.register(self.flush)
+
+    def flush_forever(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self.dirty:
+                self.flush()
+
+    def local_snapshot(self):
+        # Round-trip through JSON so callers get a copy that later updates can't mutate
+        return json.loads(self.local_snapshot_json())
+
+    def local_snapshot_json(self):
+        with self.lock:
+            self.dirty = False
+            return json.dumps({
+                name: [[list(key), value] for key, value in metric.values.items()]
+                for name, metric in self.metrics.items()
+            })
+
+    def flush(self):
+        """Write this process's values to METRICS_DIR (atomically replacing the previous snapshot)"""
+        metrics_dir = self.metrics_dir()
+        if not metrics_dir:
+            return
+        try:
+            metrics_dir.mkdir(parents=True, exist_ok=True)
+            path = metrics_dir / self.snapshot_name
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_text(self.local_snapshot_json())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Could not write metrics snapshot: {str(e)}")
+
+    def collect(self):
+        """Return {metric name: {label values: value}} summed over every process"""
+        metrics_dir = self.metrics_dir()
+        if metrics_dir:
+            self.flush()
+            self.fold_exited(metrics_dir)
+            snapshots = [snapshot for _, snapshot in read_snapshots(metrics_dir.glob('*.json'))]
+        else:
+            snapshots = [self.local_snapshot()]
+        return self.merge(snapshots)
+
+    def merge(self, snapshots):
+        totals = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            for name, series in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                for key, value in series:
+                    key = tuple(key)
+                    totals[name][key] = metric.merge(totals[name].get(key, metric.empty()), value)
+        return totals
+
+    def fold_exited(self, metrics_dir):
+        """Add the snapshots of processes that have exited to exited.json and remove them"""
+        if fcntl is None:
+            return
+        try:
+            with locked(metrics_dir / '.lock'):
+                exited = [path for path in metrics_dir.glob('*.json') if snapshot_exited(path)]
+                if not exited:
+                    return
+                exited_path = metrics_dir / EXITED_SNAPSHOT
+                snapshots = read_snapshots([exited_path, *exited] if exited_path.exists() else exited)
+                totals = self.merge([snapshot for _, snapshot in snapshots])
+                tmp_path = exited_path.with_suffix('.tmp')
+                tmp_path.write_text(json.dumps({
+                    name: [[list(key), value] for key, value in series.items()] for name, series in totals.items()
+                }))
+                os.replace(tmp_path, exited_path)
+                # Only the snapshots that were read are in the new total; unreadable ones are kept
+                for path, _ in snapshots:
+                    if path != exited_path:
+                        path.unlink()
+        except OSError as e:
+            logger.error(f"Could not fold exited metrics snapshots: {str(e)}")
+
+    # Exposition
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format (version 0.0.4)"""
+        totals = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(totals[name].items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == 'counter':
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                    continue
+                # Bucket counts are already cumulative (observe() bumps every bucket >= value)
+                for bound, count in zip(metric.buckets, value['buckets']):
+                    lines.append(f"{name}_bucket{format_labels(labels + [('le', format_value(bound))])} {count}")
+                lines.append(f"{name}_bucket{format_labels(labels + [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(value['sum'])}")
+                lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def new_snapshot_name():
+    return f"{os.getpid()}-{int(time.time() * 1000)}.json"
+
+
+def snapshot_exited(path):
+    """Whether the process that wrote a snapshot is gone"""
+    pid, _, _ = path.stem.partition('-')
+    if not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        # Exists, but belongs to another user
+        return False
+    return False
+
+
+def read_snapshots(paths):
+    snapshots = []
+    for path in paths:
+        try:
+            snapshots.append((path, json.loads(path.read_text())))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable metrics snapshot {path.name}: {str(e)}")
+    return snapshots
+
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive lock on path, so one process at a time folds snapshots"""
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+
+registries = weakref.WeakSet()
+
+
+def reset_after_fork():
+    for registry in list(registries):
+        registry.after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+
+registry = MetricsRegistry()
+
+votes_cast = registry.counter(
+    'talentsroyale_votes_total', 'Votes cast, by free or token-paid vote.', ['kind'])
+arena_entries = registry.counter(
+    'talentsroyale_arena_entries_total', 'Entries submitted to an arena.', ['tier'])
+checkout_sessions = registry.counter(
+    'talentsroyale_checkout_sessions_total', 'Stripe checkout sessions requested, by outcome.', ['status'])
+payments_completed = registry.counter(
+    'talentsroyale_payments_completed_total', 'Payments marked completed, by the path that completed them.', ['source'])
+stripe_webhook_events = registry.counter(
+    'talentsroyale_stripe_webhook_events_total', 'Stripe webhook deliveries, by event type and outcome.', ['type', 'status'])
+emails_sent = registry.counter(
+    'talentsroyale_emails_total', 'Transactional emails, by kind and delivery outcome.', ['kind', 'status'])
+request_latency = registry.histogram(
+    'talentsroyale_http_request_duration_seconds', 'Time spent handling requests, by view.', ['view', 'method', 'status'])
@@ -0,0 +1,173 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connection
+from django.utils import timezone
+
+from . import metrics
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_SALT = 'accounts.profiling'
+PROFILE_QUERY_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+
+def make_profile_token(user):
+    """Create a signed token that lets a staff user profile their own requests"""
+    return signing.dumps({'user_id': user.pk}, salt=PROFILE_TOKEN_SALT)
+
+
+def check_profile_token(token, user):
+    """Return True if the token is valid, unexpired and was issued to this staff user"""
+    if not token or not user.is_authenticated or not user.is_staff:
+        return False
+    try:
+        data = signing.loads(token, salt=PROFILE_TOKEN_SALT, max_age=settings.REQUEST_PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return data.get('user_id') == user.pk
+
+
+class RequestMetricsMiddleware:
+    """Record how long each request takes in the request latency histogram"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def observe(self, request, response, started):
+        resolver_match = getattr(request, 'resolver_match', None)
+        metrics.request_latency.observe(
+            time.perf_counter() - started,
+            view=resolver_match.view_name if resolver_match else 'unmatched',
+            method=request.method,
+            status=f"{response.status_code // 100}xx",
+        )
+
+
+class RequestProfilerMiddleware:
+    """Run a single request under cProfile when a staff user asks for it.
+
+    The request must carry a token from `manage.py profile_token` either as the
+    `_profile` query parameter or the `X-Profile-Token` header. The raw profile is
+    written to REQUEST_PROFILE_ROOT and a RequestProfile row is stored so recent
+    profiles can be browsed in the admin.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REQUEST_PROFILING_ENABLED:
+            return self.get_response(request)
+
+        token = request.GET.get(PROFILE_QUERY_PARAM) or request.META.get(PROFILE_HEADER)
+        if not token or not check_profile_token(token, request.user):
+            return self.get_response(request)
+
+        return self.profile_request(request)
+
+    async def __acall__(self, request):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            return await self.get_response(request)
+
+        token = request.GET.get(PROFILE_QUERY_PARAM) or request.META.get(PROFILE_HEADER)
+        if not token or not check_profile_token(token, await request.auser()):
+            return await self.get_response(request)
+
+        # Profile in a worker thread; the view runs through async_to_sync from there,
+        # so its ORM calls land on this thread and are counted (time spent awaiting
+        # other I/O on the event loop shows up as waiting in the profile)
+        return await sync_to_async(self.profile_request)(request)
+
+    def profile_request(self, request):
+        get_response = async_to_sync(self.get_response) if iscoroutinefunction(self.get_response) else self.get_response
+        query_count = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, context)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        try:
+            profile = self.save_profile(request, response, profiler, duration_ms, query_count)
+            response['X-Profile-Id'] = str(profile.id)
+        except Exception as e:
+            # Never fail the real request because the profile could not be stored
+            logger.error(f"Could not store request profile for {request.path}: {str(e)}", exc_info=True)
+
+        return response
+
+    def save_profile(self, request, response, profiler, duration_ms, query_count):
+        profile_root = Path(settings.REQUEST_PROFILE_ROOT)
+        profile_root.mkdir(parents=True, exist_ok=True)
+
+        slug = request.path.strip('/').replace('/', '_') or 'root'
+        filename = f"{timezone.now():%Y%m%d-%H%M%S-%f}-{slug[:80]}.prof"
+        profiler.dump_stats(str(profile_root / filename))
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).strip_dirs().sort_stats('cumulative').print_stats(settings.REQUEST_PROFILE_SUMMARY_LINES)
+
+        # Don't store the token itself with the request metadata
+        query = request.GET.copy()
+        query.pop(PROFILE_QUERY_PARAM, None)
+        resolver_match = getattr(request, 'resolver_match', None)
+
+        profile = RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.path[:500],
+            query_string=query.urlencode(),
+            view_name=resolver_match.view_name if resolver_match else '',
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            query_count=query_count,
+            profile_file=filename,
+            summary=summary.getvalue(),
+        )
+        logger.info(f"Profiled {request.method} {request.path} in {duration_ms:.1f}ms ({query_count} queries) -> {filename}")
+        return profile
@@ -28,9 +28,11 @@ class EmailConfirmationToken(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     used = models.BooleanField(default=False)
     
+    MAX_AGE = timedelta(hours=24)
+    
     def is_expired(self):
         # Token expires after 24 hours
-        return timezone.now() > self.created_at + timedelta(hours=24)
+        return timezone.now() > self.created_at + self.MAX_AGE
     
     def __str__(self):
         return f"Email confirmation for {self.user.username} ({self.token_type})"
@@ -48,12 +50,20 @@ class Arena(models.Model):
     token_cost = models.IntegerField()  # Tokens required to join
     description = models.TextField()
     max_participants = models.IntegerField(default=100)
+    participant_count = models.IntegerField(default=0)  # Active contestants, maintained by accounts/capacity.py
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.name} ({self.tier})"
     
+    def save(self, *args, **kwargs):
+        # participant_count only changes through the F() updates in accounts/capacity.py;
+        # saving an instance loaded earlier must not write its old count back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'participant_count']
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['token_cost']
 
@@ -72,8 +82,10 @@ class Contestant(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     votes = models.IntegerField(default=0)
+    trending_score = models.FloatField(default=0)  # Recency-weighted votes, see accounts/trending.py
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    deactivated_at = models.DateTimeField(null=True, blank=True)  # Set by the pre_save signal; `manage.py gc` deletes the media of long-inactive entries
     
     def __str__(self):
         return f"{self.user.username} - {self.arena.name}"
@@ -81,6 +93,13 @@ class Contestant(models.Model):
     class Meta:
         ordering = ['-votes', '-created_at']
         unique_together = ['user', 'arena']  # One submission per user per arena
+        indexes = [
+            # Rankings and keyset pagination (accounts/ranking.py RANKING_ORDER)
+            models.Index(fields=['arena', 'is_active', '-votes', '-created_at', '-id'], name='contestant_arena_rank_idx'),
+            models.Index(fields=['is_active', '-votes', '-created_at', '-id'], name='contestant_rank_idx'),
+            models.Index(fields=['arena', 'is_active', '-trending_score', '-created_at', '-id'], name='contestant_arena_trending_idx'),
+            models.Index(fields=['is_active', '-trending_score', '-created_at', '-id'], name='contestant_trending_idx'),
+        ]
 
 class Vote(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='votes')
@@ -91,6 +110,10 @@ class Vote(models.Model):
     
     class Meta:
         unique_together = ['user', 'contestant']  # One vote per user per contestant
+        indexes = [
+            # Voting history, newest first (keyset-paginated)
+            models.Index(fields=['user', '-created_at', '-id'], name='vote_user_history_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} voted for {self.contestant.user.username}"
@@ -140,4 +163,193 @@ class Payment(models.Model):
         return f"{self.user.username} - ${self.amount} - {self.tokens} tokens - {self.status}"
     
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class RequestProfile(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='request_profiles')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    query_string = models.TextField(blank=True)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.IntegerField(null=True, blank=True)
+    duration_ms = models.FloatField()
+    query_count = models.IntegerField(default=0)
+    profile_file = models.CharField(max_length=255)  # Relative to REQUEST_PROFILE_ROOT
+    summary = models.TextField(blank=True)  # Top functions by cumulative time
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.method} {self.path} - {self.duration_ms:.0f}ms"
+    
+    class Meta:
+        ordering = ['-created_at']
+
+class UserStats(models.Model):
+    """Competition stats shown on the profile, kept up to date as votes and entries change"""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    total_votes = models.IntegerField(default=0)  # Votes received across active submissions
+    total_competitions = models.IntegerField(default=0)  # Active submissions
+    wins = models.IntegerField(default=0)  # Active submissions currently in their arena's top 3
+    highest_tier_arena = models.ForeignKey(Arena, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+    
+    class Meta:
+        verbose_name_plural = 'user stats'
+
+class ActivityEvent(models.Model):
+    """An entry in a user's recent activity feed, written when the event happens"""
+    EVENT_TYPES = [
+        ('submission', 'Submission'),
+        ('vote', 'Vote Received'),
+        ('purchase', 'Token Purchase'),
+        ('win', 'Top Placement'),
+        ('tier', 'Tier Reached'),
+    ]
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='activity_events')
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    icon = models.CharField(max_length=10)
+    message = models.CharField(max_length=255)
+    contestant = models.ForeignKey(Contestant, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    # Votes received are one event per entry per hour: the hour and the votes in it
+    period = models.DateTimeField(null=True, blank=True)
+    count = models.IntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.message}"
+    
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='activity_user_created_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['contestant', 'period'], condition=models.Q(event_type='vote'), name='activity_vote_period_uniq'),
+        ]
+
+class UserAchievement(models.Model):
+    """An achievement currently held by a user, awarded by the rules in accounts/achievements.py"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='achievements')
+    code = models.CharField(max_length=50)  # Rule code
+    name = models.CharField(max_length=100)
+    description = models.CharField(max_length=255)
+    icon = models.CharField(max_length=10)
+    awarded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.name}"
+    
+    class Meta:
+        unique_together = ['user', 'code']
+
+class LeaderboardSnapshot(models.Model):
+    """A contestant's frozen place in an arena's ranking for a closed month"""
+    month = models.DateField()  # First day of the month the contestants entered in
+    arena = models.ForeignKey(Arena, on_delete=models.CASCADE, related_name='+')
+    contestant = models.ForeignKey(Contestant, on_delete=models.CASCADE, related_name='leaderboard_snapshots')
+    rank = models.PositiveIntegerField()  # Place within the arena for that month
+    votes = models.IntegerField()  # Votes when the month was frozen
+    created_at = models.DateTimeField()  # The contestant's created_at (ranking tie-break)
+    frozen_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} #{self.rank} in arena {self.arena_id}"
+    
+    class Meta:
+        ordering = ['month', 'arena', 'rank']
+        unique_together = ['month', 'contestant']
+        indexes = [
+            models.Index(fields=['month', 'arena', 'rank'], name='leaderboard_arena_rank_idx'),
+            models.Index(fields=['month', '-votes', '-created_at', '-contestant'], name='leaderboard_month_rank_idx'),
+        ]
+
+class FinaleQualification(models.Model):
+    """A contestant qualified for a season's Finale Royale (top 3 of an arena), written by `compute_finale`"""
+    season = models.PositiveIntegerField()  # Year of the tournament
+    arena = models.ForeignKey(Arena, on_delete=models.CASCADE, related_name='+')
+    place = models.PositiveSmallIntegerField()  # 1-3 within the arena
+    contestant = models.ForeignKey(Contestant, on_delete=models.CASCADE, related_name='finale_qualifications')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='finale_qualifications')
+    votes = models.IntegerField()  # Votes when the standings were computed
+    computed_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.season} finale: #{self.place} in arena {self.arena_id} ({self.user_id})"
+    
+    class Meta:
+        ordering = ['season', 'arena', 'place']
+        unique_together = ['season', 'arena', 'place']
+
+class VoteRollup(models.Model):
+    """Votes a contestant received during one hour, kept up to date by the vote path (see accounts/rollups.py)"""
+    contestant = models.ForeignKey(Contestant, on_delete=models.CASCADE, related_name='vote_rollups')
+    arena = models.ForeignKey(Arena, on_delete=models.CASCADE, related_name='+')
+    hour = models.DateTimeField()  # Start of the hour (UTC)
+    free_votes = models.IntegerField(default=0)
+    paid_votes = models.IntegerField(default=0)
+    tokens_spent = models.IntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.contestant_id} @ {self.hour:%Y-%m-%d %H:00}: {self.free_votes} free, {self.paid_votes} paid"
+    
+    class Meta:
+        ordering = ['hour']
+        unique_together = ['contestant', 'hour']
+        indexes = [
+            models.Index(fields=['arena', 'hour'], name='rollup_arena_hour_idx'),
+        ]
+
+class PendingFileDeletion(models.Model):
+    """A stored file whose row was deleted, removed from storage later by `manage.py delete_pending_files` (see accounts/media.py)"""
+    field = models.CharField(max_length=100)  # "app_label.Model.field", whose storage holds the file
+    name = models.CharField(max_length=255)  # Name within that storage
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"{self.field}: {self.name}"
+    
+    class Meta:
+        ordering = ['id']
+
+class StoredBlob(models.Model):
+    """A file in the content-addressed media storage and how many rows refer to it (see accounts/storage.py)"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    refcount = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    referenced_at = models.DateTimeField(default=timezone.now)  # When a save last added a reference
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+class ImageFingerprint(models.Model):
+    """Perceptual hash of an entry's image or video poster frame (see accounts/fingerprints.py)"""
+    contestant = models.OneToOneField(Contestant, on_delete=models.CASCADE, related_name='fingerprint')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    source_name = models.CharField(max_length=255)  # The file that was hashed
+    dhash = models.BigIntegerField()  # 64-bit dHash, stored signed
+    # The dHash as four 16-bit bands, each indexed for near-duplicate lookups
+    band0 = models.IntegerField()
+    band1 = models.IntegerField()
+    band2 = models.IntegerField()
+    band3 = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.contestant_id}: {self.dhash & ((1 << 64) - 1):016x}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['band0'], name='fingerprint_band0_idx'),
+            models.Index(fields=['band1'], name='fingerprint_band1_idx'),
+            models.Index(fields=['band2'], name='fingerprint_band2_idx'),
+            models.Index(fields=['band3'], name='fingerprint_band3_idx'),
+        ]
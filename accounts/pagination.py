@@ -0,0 +1,84 @@
+"""Keyset (cursor) pagination.
+
+Pages are fetched with a WHERE clause on the sort key of the last row seen
+instead of an OFFSET, so page 1000 costs the same as page 1 when the ordering
+is backed by an index. The ordering must end with a unique field (usually id).
+
+A cursor holds the sort key of a row, not a position in a snapshot: rows
+whose sort key changes between requests (a contestant's votes) can move to
+the other side of the cursor and be skipped or returned twice.
+"""
+import base64
+import datetime
+import decimal
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_value(value):
+    # Keep full microsecond precision; rows are compared for equality on these values
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    data = json.dumps([encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Turn a cursor back into typed field values for the given ordering"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Malformed cursor.')
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor('Cursor does not match this listing.')
+
+    typed = []
+    for field_name, value in zip(ordering, values):
+        field = model._meta.get_field(field_name.lstrip('-'))
+        try:
+            typed.append(field.to_python(value))
+        except Exception:
+            raise InvalidCursor(f'Bad value for {field.name} in cursor.')
+    return typed
+
+
+def after_filter(ordering, values):
+    """Build the filter selecting rows that sort after the given key"""
+    condition = Q()
+    for i, field_name in enumerate(ordering):
+        name = field_name.lstrip('-')
+        lookup = 'lt' if field_name.startswith('-') else 'gt'
+        equal = {ordering[j].lstrip('-'): values[j] for j in range(i)}
+        condition |= Q(**equal, **{f'{name}__{lookup}': values[i]})
+    return condition
+
+
+def paginate(queryset, ordering, cursor=None, page_size=20):
+    """Return (rows, next_cursor) for the page after cursor (first page if cursor is empty).
+
+    next_cursor is None on the last page. Raises InvalidCursor for cursors that
+    can't be decoded.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(after_filter(ordering, decode_cursor(cursor, queryset.model, ordering)))
+
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    fields = [queryset.model._meta.get_field(field_name.lstrip('-')) for field_name in ordering]
+    return rows, encode_cursor([getattr(rows[-1], field.attname) for field in fields])
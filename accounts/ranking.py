@@ -0,0 +1,55 @@
+"""Arena rankings shared by the leaderboards, profile stats and vote handling."""
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import signals, trending
+from .models import Arena, Contestant
+
+# Order used everywhere a contestant's place in an arena is shown. The id breaks
+# ties between entries created at the same instant so ranks are deterministic.
+RANKING_ORDER = ('-votes', '-created_at', '-id')
+PODIUM_SIZE = 3
+
+
+def ranked_contestants(arena_id):
+    """Active contestants of an arena, best first"""
+    return Contestant.objects.filter(arena_id=arena_id, is_active=True).order_by(*RANKING_ORDER)
+
+
+def arena_podium(arena_id):
+    """Return [(contestant_id, user_id), ...] for the current top 3 of an arena"""
+    return list(ranked_contestants(arena_id).values_list('id', 'user_id')[:PODIUM_SIZE])
+
+
+def with_rank(queryset):
+    """Annotate each contestant with its current rank in its arena, in a single query"""
+    ahead = Contestant.objects.filter(
+        Q(votes__gt=OuterRef('votes'))
+        | Q(votes=OuterRef('votes'), created_at__gt=OuterRef('created_at'))
+        | Q(votes=OuterRef('votes'), created_at=OuterRef('created_at'), id__gt=OuterRef('id')),
+        arena=OuterRef('arena'),
+        is_active=True,
+    ).order_by().values('arena').annotate(count=Count('id')).values('count')
+    return queryset.annotate(rank=Coalesce(Subquery(ahead), Value(0)) + 1)
+
+
+def record_vote(contestant, voter, is_free_vote, tokens_spent=0):
+    """Add one vote to a contestant and notify listeners.
+
+    Must be called inside the transaction that records the vote. The vote
+    count and the trending score are updated in one statement, and
+    contestant.votes and trending_score in place with the committed values.
+    """
+    podium_before = arena_podium(contestant.arena_id)
+    Contestant.objects.filter(pk=contestant.pk).update(votes=F('votes') + 1, trending_score=trending.score_with_vote())
+    contestant.refresh_from_db(fields=['votes', 'trending_score'])
+
+    signals.vote_cast.send(sender=Contestant, contestant=contestant, voter=voter, is_free_vote=is_free_vote, tokens_spent=tokens_spent)
+    announce_podium_change(contestant.arena_id, podium_before)
+
+
+def announce_podium_change(arena_id, podium_before):
+    """Send podium_changed if the arena's top 3 differs from podium_before"""
+    podium_after = arena_podium(arena_id)
+    if podium_after != podium_before:
+        signals.podium_changed.send(sender=Arena, arena_id=arena_id, before=podium_before, after=podium_after)
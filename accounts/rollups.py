@@ -0,0 +1,126 @@
+"""Hourly vote rollups for charts.
+
+VoteRollup holds one row per contestant per hour with that hour's free votes,
+paid votes and tokens spent. The vote path adds to the current hour's row, so a
+chart over any period is a single indexed range query instead of a scan of Vote.
+`manage.py rebuild_vote_rollups` recomputes the rows from Vote (free votes) and
+TokenTransaction (paid votes).
+"""
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Contestant, TokenTransaction, Vote, VoteRollup
+
+SPARKLINE_HOURS = 48
+
+
+def hour_bucket(when):
+    return when.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def record_vote(contestant, is_free_vote, tokens_spent=0, when=None):
+    """Add one vote to the contestant's rollup for the current hour. Call inside the voting transaction."""
+    hour = hour_bucket(when or timezone.now())
+    increments = {
+        'free_votes': F('free_votes') + (1 if is_free_vote else 0),
+        'paid_votes': F('paid_votes') + (0 if is_free_vote else 1),
+        'tokens_spent': F('tokens_spent') + tokens_spent,
+    }
+    if VoteRollup.objects.filter(contestant_id=contestant.pk, hour=hour).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            VoteRollup.objects.create(
+                contestant_id=contestant.pk, arena_id=contestant.arena_id, hour=hour,
+                free_votes=1 if is_free_vote else 0, paid_votes=0 if is_free_vote else 1, tokens_spent=tokens_spent,
+            )
+    except IntegrityError:
+        # Another vote created this hour's row first
+        VoteRollup.objects.filter(contestant_id=contestant.pk, hour=hour).update(**increments)
+
+
+def compute_rollups(since=None):
+    """Return {(contestant_id, hour): [free, paid, tokens]} from the raw vote records"""
+    rollups = {}
+    free_votes = Vote.objects.filter(is_free_vote=True)
+    paid_votes = TokenTransaction.objects.filter(transaction_type='vote', related_contestant__isnull=False)
+    if since:
+        free_votes = free_votes.filter(created_at__gte=since)
+        paid_votes = paid_votes.filter(created_at__gte=since)
+
+    free_votes = free_votes.annotate(hour=TruncHour('created_at', tzinfo=datetime.timezone.utc)).values('contestant_id', 'hour').annotate(count=Count('id'))
+    for row in free_votes.order_by():
+        rollups.setdefault((row['contestant_id'], row['hour']), [0, 0, 0])[0] += row['count']
+
+    paid_votes = paid_votes.annotate(hour=TruncHour('created_at', tzinfo=datetime.timezone.utc)).values('related_contestant_id', 'hour').annotate(count=Count('id'), tokens=-Sum('amount'))
+    for row in paid_votes.order_by():
+        totals = rollups.setdefault((row['related_contestant_id'], row['hour']), [0, 0, 0])
+        totals[1] += row['count']
+        totals[2] += row['tokens']
+    return rollups
+
+
+def rebuild(since=None, batch_size=1000):
+    """Replace the rollups (from the hour containing `since` onwards) with ones computed from raw data"""
+    if since:
+        since = hour_bucket(since)
+    rollups = compute_rollups(since)
+    arena_ids = dict(Contestant.objects.filter(id__in={contestant_id for contestant_id, _ in rollups}).values_list('id', 'arena_id'))
+    rows = [
+        VoteRollup(contestant_id=contestant_id, arena_id=arena_ids[contestant_id], hour=hour, free_votes=free, paid_votes=paid, tokens_spent=tokens)
+        for (contestant_id, hour), (free, paid, tokens) in rollups.items()
+        if contestant_id in arena_ids
+    ]
+    with transaction.atomic():
+        existing = VoteRollup.objects.all()
+        if since:
+            existing = existing.filter(hour__gte=since)
+        existing.delete()
+        VoteRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def hourly_series(rollups, start, hours):
+    """Fill in missing hours: [(hour, free, paid, tokens)] for `hours` hours from start"""
+    by_hour = {}
+    for hour, free, paid, tokens in rollups:
+        totals = by_hour.setdefault(hour, [0, 0, 0])
+        totals[0] += free
+        totals[1] += paid
+        totals[2] += tokens or 0
+    series = []
+    for i in range(hours):
+        hour = start + datetime.timedelta(hours=i)
+        series.append((hour, *by_hour.get(hour, (0, 0, 0))))
+    return series
+
+
+def contestant_series(contestant_id, hours=SPARKLINE_HOURS):
+    """Votes per hour for the last `hours` hours of a contestant, oldest first"""
+    start = hour_bucket(timezone.now()) - datetime.timedelta(hours=hours - 1)
+    rows = VoteRollup.objects.filter(contestant_id=contestant_id, hour__gte=start).values_list('hour', 'free_votes', 'paid_votes', 'tokens_spent')
+    return hourly_series(rows, start, hours)
+
+
+def arena_series(arena_id, hours=24 * 7):
+    """Votes per hour across an arena for the last `hours` hours, oldest first"""
+    start = hour_bucket(timezone.now()) - datetime.timedelta(hours=hours - 1)
+    rows = (
+        VoteRollup.objects.filter(arena_id=arena_id, hour__gte=start)
+        .values('hour').annotate(free=Sum('free_votes'), paid=Sum('paid_votes'), tokens=Sum('tokens_spent'))
+        .order_by().values_list('hour', 'free', 'paid', 'tokens')
+    )
+    return hourly_series(rows, start, hours)
+
+
+def sparkline_points(values, width=240, height=40):
+    """SVG polyline points for values scaled to width x height"""
+    if not values:
+        return ''
+    peak = max(values) or 1
+    step = width / max(len(values) - 1, 1)
+    return ' '.join(f'{i * step:.1f},{height - value / peak * height:.1f}' for i, value in enumerate(values))
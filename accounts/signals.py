@@ -1,46 +1,196 @@
-from django.db.models.signals import pre_delete
-from django.dispatch import receiver
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
+from django.dispatch import receiver, Signal
+from django.db import transaction
+from django.utils import timezone
 import logging
 
-from .models import CustomUser, Contestant
+from .models import CustomUser, Arena, Contestant
 
 logger = logging.getLogger(__name__)
 
+# Sent inside the voting transaction after a contestant's vote count went up.
+# Arguments: contestant, voter, is_free_vote, tokens_spent
+vote_cast = Signal()
+
+# Sent when the ordered top 3 of an arena changed.
+# Arguments: arena_id, before, after (lists of (contestant_id, user_id), best first)
+podium_changed = Signal()
+
+# Sent when a contestant entered or left the competition: created active,
+# activated, deactivated or deleted while active.
+# Arguments: contestant, active, created, deleted
+entry_status_changed = Signal()
+
+from . import achievements, activity, arena_catalog, capacity, live, media, ranking, rollups, stats, voted  # noqa: E402  (they import the signals defined above)
+
 
 @receiver(pre_delete, sender=CustomUser)
 def delete_user_media(sender, instance, **kwargs):
-    """Delete user's profile photo when user is deleted.
+    """Queue the user's profile photo for deletion once the delete commits.
     
-    Note: Contestant submissions (videos/images) will be automatically deleted
-    via CASCADE relationship, which will trigger the Contestant pre_delete signal.
+    Note: Contestant submissions (videos/images) are deleted via CASCADE,
+    which triggers the Contestant pre_delete signal for each of them.
     """
-    # Delete profile photo
-    if instance.profile_photo:
-        try:
-            # Use storage.delete() which works with any storage backend
-            instance.profile_photo.delete(save=False)
-            logger.info(f"Deleted profile photo for user {instance.username}")
-        except Exception as e:
-            # Log error but don't prevent deletion
-            logger.error(f"Error deleting profile photo for user {instance.username}: {str(e)}")
+    media.enqueue(instance, 'profile_photo')
 
 
 @receiver(pre_delete, sender=Contestant)
 def delete_contestant_media(sender, instance, **kwargs):
-    """Delete contestant's video/image files when contestant is deleted"""
-    # Delete video file if it exists
-    if instance.video_file:
-        try:
-            instance.video_file.delete(save=False)
-            logger.info(f"Deleted video file for contestant {instance.id}")
-        except Exception as e:
-            logger.error(f"Error deleting video file for contestant {instance.id}: {str(e)}")
-    
-    # Delete image file if it exists
-    if instance.image_file:
-        try:
-            instance.image_file.delete(save=False)
-            logger.info(f"Deleted image file for contestant {instance.id}")
-        except Exception as e:
-            logger.error(f"Error deleting image file for contestant {instance.id}: {str(e)}")
+    """Queue the contestant's video/image files for deletion once the delete commits"""
+    media.enqueue(instance, 'video_file', 'image_file')
+
+
+@receiver(pre_save, sender=Contestant)
+def remember_contestant_status(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Remember whether a contestant was active so post_save can tell if it entered or left"""
+    if raw:
+        # loaddata: fixtures bring their own counts (fix them with `manage.py repair_arena_counts`)
+        return
+    if update_fields is not None and not {'is_active', 'arena'} & set(update_fields):
+        # Neither field is written, so the entry stays where it was
+        instance._was_active, instance._was_arena_id = instance.is_active, instance.arena_id
+        return
+    
+    previous = None
+    if not instance._state.adding:
+        previous = Contestant.objects.filter(pk=instance.pk).values_list('is_active', 'arena_id').first()
+    instance._was_active, instance._was_arena_id = previous or (False, None)
+    
+    if instance._was_active != instance.is_active:
+        instance._podium_before = ranking.arena_podium(instance.arena_id)
+    
+    if instance.is_active:
+        instance.deactivated_at = None
+    elif instance._was_active or instance._state.adding:
+        instance.deactivated_at = timezone.now()
+    
+    # Take a seat before the row is written, so a full arena stops the save
+    if instance.is_active and not (instance._was_active and instance._was_arena_id == instance.arena_id):
+        capacity.reserve_seat(instance.arena_id)
+
+
+@receiver(post_save, sender=Contestant)
+def contestant_status_saved(sender, instance, created, raw=False, **kwargs):
+    """Announce entries that were submitted, activated or deactivated"""
+    if raw:
+        return
+    
+    # Give back the seat in the arena the entry left
+    was_active = getattr(instance, '_was_active', False)
+    if was_active and not (instance.is_active and instance._was_arena_id == instance.arena_id):
+        capacity.release_seat(instance._was_arena_id)
+    
+    if getattr(instance, '_was_active', instance.is_active) == instance.is_active:
+        return
+    
+    entry_status_changed.send(sender=Contestant, contestant=instance, active=instance.is_active, created=created, deleted=False)
+    ranking.announce_podium_change(instance.arena_id, instance._podium_before)
+
+
+@receiver(pre_delete, sender=Contestant)
+def remember_podium_before_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        instance._podium_before = ranking.arena_podium(instance.arena_id)
+
+
+@receiver(post_delete, sender=Contestant)
+def contestant_deleted(sender, instance, **kwargs):
+    """Announce active entries that were deleted"""
+    if not instance.is_active:
+        return
+    
+    capacity.release_seat(instance.arena_id)
+    entry_status_changed.send(sender=Contestant, contestant=instance, active=False, created=False, deleted=True)
+    ranking.announce_podium_change(instance.arena_id, instance._podium_before)
+
+
+@receiver(post_save, sender=Arena)
+@receiver(post_delete, sender=Arena)
+def invalidate_arena_catalog(sender, **kwargs):
+    """Reload the cached arena catalog in every process once the change is committed"""
+    transaction.on_commit(arena_catalog.catalog.invalidate)
+
+
+# User stats
+
+@receiver(vote_cast)
+def update_stats_for_vote(sender, contestant, **kwargs):
+    stats.add_votes_received(contestant.user_id)
+
+
+@receiver(entry_status_changed)
+def update_stats_for_entry(sender, contestant, **kwargs):
+    stats.refresh_user_stats(contestant.user_id)
+
+
+@receiver(podium_changed)
+def update_stats_for_podium(sender, before, after, **kwargs):
+    # Only users who moved onto or off the podium have a different win count
+    for user_id in {user_id for _, user_id in before} ^ {user_id for _, user_id in after}:
+        stats.refresh_user_stats(user_id)
+
+
+# Hourly vote rollups
+
+@receiver(vote_cast)
+def add_vote_to_rollup(sender, contestant, is_free_vote, tokens_spent, **kwargs):
+    rollups.record_vote(contestant, is_free_vote, tokens_spent)
+
+
+# Voted sets
+
+@receiver(vote_cast)
+def invalidate_voted_set(sender, voter, **kwargs):
+    transaction.on_commit(lambda: voted.forget_votes(voter.pk))
+
+
+# Live standings
+
+@receiver(vote_cast)
+def publish_vote_to_live(sender, contestant, **kwargs):
+    transaction.on_commit(lambda: live.publish(contestant.arena_id))
+
+
+@receiver(entry_status_changed)
+def publish_entry_to_live(sender, contestant, **kwargs):
+    transaction.on_commit(lambda: live.publish(contestant.arena_id))
+
+
+# Activity feed
+
+@receiver(vote_cast)
+def add_vote_activity(sender, contestant, **kwargs):
+    activity.record_vote_received(contestant)
+
+
+@receiver(entry_status_changed)
+def add_entry_activity(sender, contestant, created, **kwargs):
+    if created:
+        activity.record_entry(contestant)
+
+
+@receiver(podium_changed)
+def add_placement_activity(sender, before, after, **kwargs):
+    activity.record_podium_change(before, after)
+
+
+# Achievements
+
+# Evaluated after the commit, outside the locks the voting transaction holds.
+# The entries a vote moved (including the one voted for) are re-evaluated by
+# `manage.py evaluate_achievements --ranks-changed-since`; only podium changes are here.
+
+@receiver(entry_status_changed)
+def evaluate_achievements_for_entry(sender, contestant, **kwargs):
+    transaction.on_commit(lambda: achievements.evaluate(contestant.user_id, {achievements.ARENA_JOINED}))
+
+
+@receiver(podium_changed)
+def evaluate_achievements_for_podium(sender, before, after, **kwargs):
+    user_ids = {user_id for _, user_id in before} | {user_id for _, user_id in after}
+
+    def evaluate():
+        for user_id in user_ids:
+            achievements.evaluate(user_id, {achievements.RANK_CHANGED})
 
+    transaction.on_commit(evaluate)
@@ -0,0 +1,93 @@
+"""Per-user competition stats (UserStats), maintained incrementally on write.
+
+Vote counts are adjusted with a single UPDATE when a vote is cast. Anything
+that can move a contestant on or off an arena's podium (entries being submitted,
+deactivated or deleted, or a vote that reshuffles the top 3) rebuilds the stats
+of the users involved from the Contestant table. Rows are only ever updated by
+these hooks; a missing row is built from source data the first time it is read.
+"""
+from functools import cached_property
+
+from django.db.models import F
+
+from . import ranking
+from .models import Contestant, UserStats
+
+TIER_ORDER = {'recruit': 1, 'veteran': 2, 'champion': 3, 'elite': 4}
+
+
+class UserFacts:
+    """A user's active entries with their current ranks, loaded with one query on first use"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    @cached_property
+    def ranked_entries(self):
+        return list(ranking.with_rank(
+            Contestant.objects.filter(user_id=self.user_id, is_active=True).select_related('arena')
+        ))
+
+    @cached_property
+    def total_votes(self):
+        return sum(entry.votes for entry in self.ranked_entries)
+
+    @cached_property
+    def wins(self):
+        return sum(1 for entry in self.ranked_entries if entry.rank <= ranking.PODIUM_SIZE)
+
+    @cached_property
+    def avg_rank(self):
+        if not self.ranked_entries:
+            return 0
+        return int(sum(entry.rank for entry in self.ranked_entries) / len(self.ranked_entries))
+
+    @cached_property
+    def highest_tier_arena(self):
+        highest = None
+        for entry in self.ranked_entries:
+            if highest is None or TIER_ORDER.get(entry.arena.tier, 0) > TIER_ORDER.get(highest.tier, 0):
+                highest = entry.arena
+        return highest
+
+
+def compute_user_stats(user_id):
+    """Compute a user's stats from their active Contestant rows"""
+    facts = UserFacts(user_id)
+    return {
+        'total_votes': facts.total_votes,
+        'total_competitions': len(facts.ranked_entries),
+        'wins': facts.wins,
+        'highest_tier_arena': facts.highest_tier_arena,
+    }
+
+
+def get_user_stats(user):
+    """Return the user's UserStats, building it from source data if it doesn't exist yet"""
+    try:
+        return UserStats.objects.select_related('highest_tier_arena').get(user=user)
+    except UserStats.DoesNotExist:
+        user_stats, created = UserStats.objects.update_or_create(user=user, defaults=compute_user_stats(user.id))
+        return user_stats
+
+
+def refresh_user_stats(user_id):
+    """Recompute an existing stats row from source data"""
+    UserStats.objects.filter(user_id=user_id).update(**compute_user_stats(user_id))
+
+
+def add_votes_received(user_id, count=1):
+    UserStats.objects.filter(user_id=user_id).update(total_votes=F('total_votes') + count)
+
+
+def find_drift(user_stats):
+    """Return {field: (stored, actual)} for every field that disagrees with source data"""
+    actual = compute_user_stats(user_stats.user_id)
+    actual['highest_tier_arena'] = actual['highest_tier_arena'].id if actual['highest_tier_arena'] else None
+    stored = {
+        'total_votes': user_stats.total_votes,
+        'total_competitions': user_stats.total_competitions,
+        'wins': user_stats.wins,
+        'highest_tier_arena': user_stats.highest_tier_arena_id,
+    }
+    return {field: (stored[field], actual[field]) for field in stored if stored[field] != actual[field]}
@@ -0,0 +1,245 @@
+"""Content-addressed media storage (MEDIA_STORAGE = 'content_addressed').
+
+Every uploaded file is stored once under the SHA-256 of its bytes, as
+blobs/ab/cd/abcd....ext, whatever field it was uploaded to. Saving bytes that
+are already stored writes nothing and returns the existing name, so the same
+clip submitted to five arenas takes the space of one.
+
+StoredBlob counts the references to each blob: save() adds one and delete()
+drops one, removing the file only when the last reference goes. Deleted rows
+release their references through the PendingFileDeletion queue (see
+accounts/media.py).
+
+save() counts its reference in the caller's transaction, so a rollback takes
+the count back too; but if the bytes were new, their file stays on disk with no
+StoredBlob row. A save whose row is never written without a rollback (a
+discarded save=False, a replaced profile photo) leaves a count too high, which
+only keeps a file longer than needed. `manage.py repair_blob_refcounts` recounts
+from the rows and deletes the orphaned files.
+
+The upload handlers hash files while Django receives them, so saving an upload
+needs no second pass over its bytes.
+"""
+import hashlib
+import os
+from collections import Counter
+from itertools import islice
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+BLOB_ROOT = 'blobs'
+
+
+def blob_name(digest, extension):
+    return f'{BLOB_ROOT}/{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}'
+
+
+def content_digest(content):
+    """SHA-256 of a File, from the upload handler if it already hashed it"""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    refcounted = True  # delete() releases a reference; see accounts/media.py
+
+    def get_available_name(self, name, max_length=None):
+        # Names come from the content: the same name is the same bytes
+        return name
+
+    def _save(self, name, content):
+        # Imported here: the default storage can be loaded before the app registry is ready
+        from .models import StoredBlob
+
+        digest = content_digest(content)
+        name = blob_name(digest, os.path.splitext(name)[1])
+        with transaction.atomic():
+            blob = self.add_reference(StoredBlob, name, digest, content.size)
+            if not self.exists(name):
+                # First copy of these bytes (or the file went missing): write it under the row lock
+                super()._save(name, content)
+        return name
+
+    def add_reference(self, model, name, digest, size):
+        """Lock the blob's row and count one more reference, creating it if needed"""
+        while True:
+            blob = model.objects.select_for_update().filter(name=name).first()
+            if blob is not None:
+                model.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1, referenced_at=timezone.now())
+                blob.refcount += 1
+                return blob
+            try:
+                with transaction.atomic():
+                    return model.objects.create(name=name, sha256=digest, size=size, refcount=1)
+            except IntegrityError:
+                # Another upload of the same bytes created it first
+                continue
+
+    def delete(self, name):
+        """Release one reference; the file goes with the last one"""
+        from .models import StoredBlob
+
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                # Not counted (stored before this backend, or already released)
+                super().delete(name)
+                return
+            if blob.refcount > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            blob.delete()
+            super().delete(name)
+
+
+def refcounted_fields():
+    """Every FileField stored in a reference-counted storage, as (model, field)"""
+    from django.apps import apps
+    from django.db.models import FileField
+
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, FileField) and getattr(field.storage, 'refcounted', False)
+    ]
+
+
+def count_references(names=None):
+    """{blob name: rows referring to it}, counting queued deletions that haven't released theirs yet.
+
+    names limits the count to those blobs.
+    """
+    from .media import field_label
+    from .models import PendingFileDeletion
+
+    counts = Counter()
+    labels = []
+    for model, field in refcounted_fields():
+        labels.append(field_label(model, field.name))
+        rows = model._base_manager.filter(**{f'{field.name}__startswith': f'{BLOB_ROOT}/'})
+        if names is not None:
+            rows = rows.filter(**{f'{field.name}__in': names})
+        counts.update(rows.values_list(field.name, flat=True).iterator(chunk_size=10000))
+    pending = PendingFileDeletion.objects.filter(field__in=labels, name__startswith=f'{BLOB_ROOT}/')
+    if names is not None:
+        pending = pending.filter(name__in=names)
+    counts.update(pending.values_list('name', flat=True).iterator(chunk_size=10000))
+    return counts
+
+
+def find_drift(referenced_before):
+    """[(blob, stored refcount, counted references)] for every blob whose count looks wrong.
+
+    Only blobs last referenced before referenced_before are checked: a save
+    counts its reference before the row that uses it is written, so a newer
+    reference may not be countable yet.
+    """
+    from .models import StoredBlob
+
+    counts = count_references()
+    drifted = []
+    for blob in StoredBlob.objects.filter(referenced_at__lt=referenced_before).order_by('id').iterator(chunk_size=10000):
+        actual = counts.get(blob.name, 0)
+        if blob.refcount != actual:
+            drifted.append((blob, blob.refcount, actual))
+    return drifted
+
+
+def repair_blob(storage, blob, referenced_before):
+    """Recount one blob under its row lock and store the count, deleting the blob if nothing uses it.
+
+    Returns the new count, or None if a save referenced the blob since referenced_before.
+    """
+    from .models import StoredBlob
+
+    with transaction.atomic():
+        # Waits for uploads still holding the lock; their rows are counted once they commit
+        blob = StoredBlob.objects.select_for_update().filter(pk=blob.pk, referenced_at__lt=referenced_before).first()
+        if blob is None:
+            return None
+        actual = count_references([blob.name]).get(blob.name, 0)
+        if actual:
+            StoredBlob.objects.filter(pk=blob.pk).update(refcount=actual)
+        else:
+            blob.delete()
+            storage.delete(blob.name)
+        return actual
+
+
+def blob_files(storage, path=BLOB_ROOT):
+    """Names of every file under blobs/"""
+    if not storage.exists(path):
+        return
+    directories, files = storage.listdir(path)
+    for file in files:
+        yield f'{path}/{file}'
+    for directory in directories:
+        yield from blob_files(storage, f'{path}/{directory}')
+
+
+def find_orphans(storage, modified_before):
+    """Names of blob files with no StoredBlob row, last written before modified_before"""
+    from .models import StoredBlob
+
+    orphans = []
+    files = blob_files(storage)
+    while batch := list(islice(files, 1000)):
+        counted = set(StoredBlob.objects.filter(name__in=batch).values_list('name', flat=True))
+        orphans.extend(name for name in batch if name not in counted and storage.get_modified_time(name) < modified_before)
+    return orphans
+
+
+def delete_orphan(storage, name):
+    """Delete a blob file that has no StoredBlob row. Returns False if an upload counted it meanwhile."""
+    from .models import StoredBlob
+
+    try:
+        with transaction.atomic():
+            # Holding a row for the name makes an upload of the same bytes wait
+            # (in add_reference) until the file is gone, and then write it again
+            placeholder = StoredBlob.objects.create(name=name, sha256=os.path.splitext(os.path.basename(name))[0], size=0, refcount=0)
+            placeholder.delete()
+            storage.delete(name)
+    except IntegrityError:
+        return False
+    return True
+
+
+class HashingUploadMixin:
+    """Hash each uploaded file as its chunks arrive and set file.sha256"""
+
+    def new_file(self, *args, **kwargs):
+        # Before super(): the memory handler ends new_file() with StopFutureHandlers
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if getattr(self, 'activated', True):
+            self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
@@ -1,3 +1,1479 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import stripe
+from PIL import Image
+from django.conf import settings
+from django.core import serializers
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import achievements, activity, arena_catalog, batching, capacity, email_tokens, exports, finale, fingerprints, gc, leaderboards, live, media, metrics, pagination, ranking, rollups, stats, storage, trending, uploads, voted
+from .admin import ContestantAdminForm
+from .forms import ContestantSubmissionForm, UserSettingsForm
+from .middleware import PROFILE_HEADER, make_profile_token
+from .models import ActivityEvent, Arena, Contestant, CustomUser, EmailConfirmationToken, FinaleQualification, ImageFingerprint, LeaderboardSnapshot, Payment, PendingFileDeletion, RequestProfile, StoredBlob, TokenTransaction, UserAchievement, UserStats, VoteRollup
+from .views import cast_vote, contestant_listing, vote_history_page
+
+try:
+    from . import batch_stats
+except ImportError:  # numpy is only needed by recompute_rankings
+    batch_stats = None
+
+
+def make_user(username, **fields):
+    fields.setdefault('email_confirmed', True)
+    fields.setdefault('tokens', 500)
+    return CustomUser.objects.create_user(username, f'{username}@example.com', **fields)
+
+
+def make_arena(tier='recruit', **fields):
+    fields.setdefault('name', f'{tier.title()} Arena')
+    fields.setdefault('token_cost', 15)
+    return Arena.objects.create(tier=tier, description='', **fields)
+
+
+def make_entry(user, arena, **fields):
+    fields.setdefault('title', f'{user.username} in {arena.name}')
+    fields.setdefault('video_url', 'https://youtube.com/watch?v=x')
+    return Contestant.objects.create(user=user, arena=arena, **fields)
+
+
+def png_bytes(color='red', size=(16, 16)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+def pattern_image(seed, size=(180, 160)):
+    """A smooth random pattern, so that re-encoding it keeps its dHash"""
+    rng = random.Random(seed)
+    return Image.frombytes('L', (9, 8), bytes(rng.randrange(256) for _ in range(72))).resize(size, Image.Resampling.BICUBIC)
+
+
+def vote(user, contestant, use_tokens=False):
+    result = cast_vote(user, contestant, use_tokens)
+    assert result['success'], result['message']
+    return result
+
+
+class RequestProfilerTests(TestCase):
+    def setUp(self):
+        self.profile_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_root.cleanup)
+        override = override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILE_ROOT=self.profile_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.staff = make_user('staff', is_staff=True)
+
+    def test_staff_token_profiles_the_request(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/arenas', {'_profile': make_profile_token(self.staff), 'page': '2'})
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(profile.id))
+        self.assertEqual(profile.path, '/arenas')
+        self.assertEqual(profile.query_string, 'page=2')  # The token isn't stored
+        self.assertEqual(profile.status_code, 200)
+        self.assertGreater(profile.query_count, 0)
+
+    def test_token_in_header(self):
+        self.client.force_login(self.staff)
+        self.client.get('/arenas', **{PROFILE_HEADER: make_profile_token(self.staff)})
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_token_of_another_user_is_ignored(self):
+        other = make_user('other', is_staff=True)
+        self.client.force_login(self.staff)
+        response = self.client.get('/arenas', {'_profile': make_profile_token(other)})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_non_staff_users_are_not_profiled(self):
+        user = make_user('player')
+        self.client.force_login(user)
+        self.client.get('/arenas', {'_profile': make_profile_token(user)})
+        self.assertFalse(RequestProfile.objects.exists())
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def test_counter_and_histogram_exposition(self):
+        registry = metrics.MetricsRegistry()
+        votes = registry.counter('votes_total', 'Votes.', ['kind'])
+        latency = registry.histogram('latency_seconds', 'Latency.', ['view'], buckets=(0.1, 1.0))
+        votes.inc(kind='free')
+        votes.inc(2, kind='free')
+        latency.observe(0.05, view='home')
+        latency.observe(0.5, view='home')
+
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE votes_total counter', lines)
+        self.assertIn('votes_total{kind="free"} 3', lines)
+        # Buckets are cumulative
+        self.assertIn('latency_seconds_bucket{view="home",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{view="home",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{view="home",le="+Inf"} 2', lines)
+        self.assertIn('latency_seconds_sum{view="home"} 0.55', lines)
+        self.assertIn('latency_seconds_count{view="home"} 2', lines)
+
+    def test_labels_must_match(self):
+        registry = metrics.MetricsRegistry()
+        votes = registry.counter('votes_total', 'Votes.', ['kind'])
+        with self.assertRaises(ValueError):
+            votes.inc(tier='elite')
+
+    def test_label_values_are_escaped(self):
+        self.assertEqual(metrics.format_labels([('path', 'a"b\\c\n')]), '{path="a\\"b\\\\c\\n"}')
+
+    def test_snapshots_of_all_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            workers = []
+            for i in range(2):
+                registry = metrics.MetricsRegistry()
+                registry.snapshot_name = f'worker-{i}.json'
+                registry.counter('votes_total', 'Votes.', ['kind']).inc(i + 1, kind='paid')
+                registry.flush()
+                workers.append(registry)
+            self.assertEqual(workers[0].collect()['votes_total'], {('paid',): 3})
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork()')
+    def test_forked_workers_write_their_own_snapshots(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, override_settings(METRICS_DIR=metrics_dir):
+            # Like gunicorn --preload: the registry exists before the workers are forked
+            registry = metrics.MetricsRegistry()
+            votes = registry.counter('votes_total', 'Votes.', ['kind'])
+            votes.inc(kind='free')
+            for _ in range(3):
+                pid = os.fork()
+                if pid == 0:
+                    try:
+                        votes.inc(kind='paid')
+                        registry.flush()
+                    finally:
+                        os._exit(0)
+                os.waitpid(pid, 0)
+
+            self.assertEqual(registry.collect()['votes_total'], {('free',): 1, ('paid',): 3})
+            # The exited workers' snapshots were folded into one file
+            self.assertCountEqual(os.listdir(metrics_dir), [registry.snapshot_name, metrics.EXITED_SNAPSHOT, '.lock'])
+            self.assertIn('votes_total{kind="paid"} 3', registry.render().splitlines())
+
+
+class MetricsEndpointTests(TestCase):
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(make_user('player'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE talentsroyale_votes_total counter', response.content)
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.arena = make_arena()
+        self.users = [make_user(f'user{i}') for i in range(5)]
+        # Created oldest first, so with no votes the last entry ranks first
+        self.entries = [make_entry(user, self.arena) for user in self.users[:4]]
+
+    def stats_of(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_missing_row_is_built_from_entries(self):
+        user_stats = stats.get_user_stats(self.users[3])
+        self.assertEqual((user_stats.total_competitions, user_stats.wins, user_stats.highest_tier_arena), (1, 1, self.arena))
+
+    def test_votes_and_podium_changes_are_applied_on_write(self):
+        for user in self.users[:4]:
+            stats.get_user_stats(user)
+        self.assertEqual(self.stats_of(self.users[0]).wins, 0)
+
+        vote(self.users[4], self.entries[0])
+
+        self.assertEqual(self.stats_of(self.users[0]).total_votes, 1)
+        # The first entry moved onto the podium and pushed the second one off it
+        self.assertEqual(self.stats_of(self.users[0]).wins, 1)
+        self.assertEqual(self.stats_of(self.users[1]).wins, 0)
+        self.assertEqual(stats.find_drift(self.stats_of(self.users[1])), {})
+
+    def test_deactivating_an_entry_refreshes_its_owner(self):
+        stats.get_user_stats(self.users[3])
+        self.entries[3].is_active = False
+        self.entries[3].save()
+        self.assertEqual((self.stats_of(self.users[3]).total_competitions, self.stats_of(self.users[3]).wins), (0, 0))
+
+    def test_find_drift(self):
+        user_stats = stats.get_user_stats(self.users[3])
+        UserStats.objects.filter(pk=user_stats.pk).update(total_votes=7)
+        user_stats.refresh_from_db()
+        self.assertEqual(stats.find_drift(user_stats), {'total_votes': (7, 0)})
+
+
+class ActivityFeedTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner')
+        self.entry = make_entry(self.owner, make_arena())
+
+    def vote_events(self):
+        return list(ActivityEvent.objects.filter(user=self.owner, event_type='vote').order_by('period'))
+
+    def test_entry_events(self):
+        events = ActivityEvent.objects.filter(user=self.owner).values_list('event_type', flat=True)
+        # The only entry in its arena is also in first place
+        self.assertCountEqual(events, ['submission', 'tier', 'win'])
+
+        # A second entry in the same tier is not a new tier
+        make_entry(self.owner, make_arena(name='Second Recruit Arena'))
+        self.assertEqual(ActivityEvent.objects.filter(user=self.owner, event_type='tier').count(), 1)
+
+    def test_votes_are_counted_into_one_event_per_hour(self):
+        for voter in [make_user('a'), make_user('b')]:
+            vote(voter, self.entry)
+        [event] = self.vote_events()
+        self.assertEqual(event.count, 2)
+        self.assertEqual(event.message, f'Received 2 votes on "{self.entry.title}"')
+
+        activity.record_vote_received(self.entry, timezone.now() + datetime.timedelta(hours=1))
+        self.assertEqual([event.count for event in self.vote_events()], [2, 1])
+
+    def test_backfill_counts_free_and_paid_votes(self):
+        voters = [make_user('a'), make_user('b')]
+        for voter in voters:
+            vote(voter, self.entry)
+        vote(voters[0], self.entry, use_tokens=True)
+        live = [(event.count, event.message) for event in self.vote_events()]
+        self.assertEqual(live, [(3, f'Received 3 votes on "{self.entry.title}"')])
+
+        call_command('backfill_activity', stdout=io.StringIO())
+        self.assertEqual([(event.count, event.message) for event in self.vote_events()], live)
+
+    def test_feed_pages(self):
+        ActivityEvent.objects.bulk_create([
+            activity.purchase_event(Payment(user=self.owner, tokens=tokens, amount=1, created_at=timezone.now() - datetime.timedelta(minutes=tokens)))
+            for tokens in range(1, 8)
+        ])
+        self.client.force_login(self.owner)
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            data = self.client.get('/api/activity/', {'cursor': cursor}).json()
+            seen.extend(event['message'] for event in data['activities'])
+            cursor = data['next_cursor']
+        self.assertEqual(len(seen), 10)  # The entry's 3 events, then 7 purchases newest first
+        self.assertEqual(seen[3:], [f'Purchased {tokens} tokens' for tokens in range(1, 8)])
+        self.assertEqual(self.client.get('/api/activity/', {'cursor': 'nonsense'}).status_code, 400)
+
+
+class AchievementTests(TestCase):
+    def setUp(self):
+        self.arena = make_arena('elite', token_cost=100)
+        self.users = [make_user(f'user{i}') for i in range(7)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries = [make_entry(user, self.arena) for user in self.users[:6]]
+
+    def held(self, user):
+        return dict(UserAchievement.objects.filter(user=user).values_list('code', 'description'))
+
+    def set_votes(self, *votes):
+        for entry, count in zip(self.entries, votes):
+            Contestant.objects.filter(pk=entry.pk).update(votes=count)
+            entry.votes = count
+        for user in self.users[:6]:
+            achievements.evaluate(user.id)
+
+    def test_entry_is_awarded_on_submission(self):
+        # The newest entry ranks first while nobody has votes
+        self.assertEqual(self.held(self.users[5]), {
+            'tier': 'Reached Elite tier',
+            'top_performer': 'Placed in top 10 (Rank #1)',
+            'winner': 'Won 1 competition(s)',
+            'finale_royale': 'Eligible for year-end tournament',
+        })
+
+    def test_podium_changes_revoke_and_award(self):
+        self.set_votes(0, 0, 0, 1, 1, 1)
+        self.assertNotIn('winner', self.held(self.users[2]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vote(self.users[6], self.entries[2])
+            vote(self.users[6], self.entries[2], use_tokens=True)
+            # Nothing is evaluated inside the voting transaction
+            self.assertNotIn('winner', self.held(self.users[2]))
+
+        self.assertIn('winner', self.held(self.users[2]))
+        # Pushed from 3rd to 4th
+        self.assertNotIn('winner', self.held(self.users[3]))
+
+    def test_ranks_below_the_podium_are_evaluated_by_the_command(self):
+        self.set_votes(1, 1, 3, 8, 9, 10)
+        self.assertEqual(self.held(self.users[1])['top_performer'], 'Placed in top 10 (Rank #5)')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            vote(self.users[6], self.entries[0])
+        # Not on the vote path: the entries only moved between 5th and 6th
+        self.assertEqual(self.held(self.users[1])['top_performer'], 'Placed in top 10 (Rank #5)')
+        self.assertEqual(self.held(self.users[0])['top_performer'], 'Placed in top 10 (Rank #6)')
+
+        self.assertIn(self.users[1].id, achievements.users_with_rank_changes(timezone.now() - datetime.timedelta(minutes=5)))
+        call_command('evaluate_achievements', '--ranks-changed-since', '5', stdout=io.StringIO())
+        self.assertEqual(self.held(self.users[1])['top_performer'], 'Placed in top 10 (Rank #6)')
+        self.assertEqual(self.held(self.users[0])['top_performer'], 'Placed in top 10 (Rank #5)')
+
+    def test_profile_shows_locked_achievements(self):
+        user = self.users[6]
+        self.assertEqual(achievements.achievements_for(user), [
+            {'name': 'Finale Royale', 'description': 'Enter year-end tournament', 'earned': False, 'icon': '👑'},
+        ])
+
+
+class ArenaCapacityTests(TestCase):
+    def setUp(self):
+        self.arena = make_arena(max_participants=2)
+        self.users = [make_user(f'user{i}') for i in range(3)]
+
+    def participant_count(self, arena=None):
+        return Arena.objects.get(pk=(arena or self.arena).pk).participant_count
+
+    def test_full_arena_rejects_entries(self):
+        make_entry(self.users[0], self.arena)
+        make_entry(self.users[1], self.arena)
+        with self.assertRaises(capacity.ArenaFull):
+            make_entry(self.users[2], self.arena)
+        self.assertFalse(Contestant.objects.filter(user=self.users[2]).exists())
+        self.assertEqual(self.participant_count(), 2)
+
+    def test_seats_follow_entry_status(self):
+        entry = make_entry(self.users[0], self.arena)
+        inactive = make_entry(self.users[1], self.arena, is_active=False)
+        self.assertEqual(self.participant_count(), 1)
+
+        entry.is_active = False
+        entry.save()
+        self.assertEqual(self.participant_count(), 0)
+
+        inactive.is_active = True
+        inactive.save()
+        other = make_arena('veteran')
+        inactive.arena = other
+        inactive.save()
+        self.assertEqual((self.participant_count(), self.participant_count(other)), (0, 1))
+
+        inactive.delete()
+        self.assertEqual(self.participant_count(other), 0)
+
+    def test_saving_a_stale_arena_keeps_the_count(self):
+        stale = Arena.objects.get(pk=self.arena.pk)
+        make_entry(self.users[0], self.arena)
+        stale.name = 'Renamed'
+        stale.save()
+        arena = Arena.objects.get(pk=self.arena.pk)
+        self.assertEqual((arena.name, arena.participant_count), ('Renamed', 1))
+
+    def test_admin_form_rejects_full_arenas(self):
+        make_entry(self.users[0], self.arena)
+        inactive = make_entry(self.users[1], self.arena, is_active=False)
+        make_entry(self.users[2], self.arena)
+
+        def admin_form(instance, **changes):
+            data = {**model_to_dict(instance, exclude=['video_file', 'image_file', 'deactivated_at']), **changes}
+            return ContestantAdminForm({key: value for key, value in data.items() if value is not None}, instance=instance)
+
+        form = admin_form(inactive, is_active=True)
+        self.assertEqual(form.errors['is_active'], [f'{self.arena.name} is full.'])
+        form = admin_form(Contestant(user=make_user('late'), arena=self.arena, title='New', video_url='https://youtube.com/watch?v=y'))
+        self.assertEqual(form.errors['arena'], [f'{self.arena.name} is full.'])
+        # Editing an active entry doesn't need another seat, and other arenas have room
+        active = Contestant.objects.get(user=self.users[0])
+        self.assertTrue(admin_form(active, title='Renamed').is_valid())
+        self.assertTrue(admin_form(inactive, is_active=True, arena=make_arena('veteran').pk).is_valid())
+
+    def test_loaddata_and_other_fields_skip_the_seat_bookkeeping(self):
+        entry = make_entry(self.users[0], self.arena)
+        with self.assertNumQueries(1):
+            entry.title = 'Renamed'
+            entry.save(update_fields=['title'])
+
+        Contestant.objects.filter(pk=entry.pk).delete()
+        Arena.objects.filter(pk=self.arena.pk).update(participant_count=2)
+        fixture = serializers.serialize('json', [entry])
+        for obj in serializers.deserialize('json', fixture):
+            # What loaddata does: no seat is taken and no queries are run for it
+            with self.assertNumQueries(2):
+                obj.save()
+        self.assertEqual(self.participant_count(), 2)
+
+    def test_find_drift(self):
+        make_entry(self.users[0], self.arena)
+        Arena.objects.filter(pk=self.arena.pk).update(participant_count=2)
+        self.assertEqual([(arena.pk, stored, actual) for arena, stored, actual in capacity.find_drift()], [(self.arena.pk, 2, 1)])
+
+
+class ArenaCatalogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.catalog = arena_catalog.ArenaCatalog()
+        self.elite = make_arena('elite', token_cost=100)
+        self.recruit = make_arena('recruit', token_cost=15)
+        make_arena('veteran', token_cost=25, is_active=False)
+
+    def test_active_arenas_by_cost(self):
+        self.assertEqual([record.tier for record in self.catalog.active()], ['recruit', 'elite'])
+        self.assertEqual(self.catalog.get(str(self.elite.id)).get_tier_display(), 'Elite')
+        self.assertIsNone(self.catalog.get('nope'))
+
+    def test_served_from_memory_until_an_arena_changes(self):
+        self.catalog.active()
+        with self.assertNumQueries(0):
+            self.catalog.active()
+
+        # Another process's catalog sees the new generation once the save commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recruit.name = 'Rookie Arena'
+            self.recruit.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.catalog.get(self.recruit.id).name, 'Rookie Arena')
+
+    def test_deactivated_arena_leaves_the_catalog(self):
+        self.catalog.active()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.elite.is_active = False
+            self.elite.save()
+        self.assertIsNone(self.catalog.get(self.elite.id))
+
+
+class VotedSetTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        # Voted sets are only cached in a cache every worker shares
+        override = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': self.cache_dir.name}},
+            VOTED_SET_MIN_VOTES=2,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        arena = make_arena()
+        self.entries = [make_entry(make_user(f'owner{i}'), arena) for i in range(4)]
+        self.voter = make_user('voter')
+
+    def vote(self, entry):
+        with self.captureOnCommitCallbacks(execute=True):
+            vote(self.voter, entry)
+
+    def test_packed_ids(self):
+        voted_set = voted.VotedSet([9, 3])
+        voted_set.add(5)
+        voted_set.add(3)
+        self.assertEqual(list(voted.VotedSet.frombytes(voted_set.tobytes()).ids), [3, 5, 9])
+        self.assertIn(5, voted_set)
+        self.assertNotIn(4, voted_set)
+
+    def test_cached_set_is_rebuilt_after_a_vote(self):
+        ids = [entry.id for entry in self.entries]
+        self.vote(self.entries[0])
+        self.vote(self.entries[1])
+        self.assertEqual(voted.voted_contestant_ids(self.voter, ids), set(ids[:2]))
+        with self.assertNumQueries(0):
+            self.assertEqual(voted.voted_contestant_ids(self.voter, ids), set(ids[:2]))
+
+        self.vote(self.entries[2])
+        self.assertEqual(voted.voted_contestant_ids(self.voter, ids), set(ids[:3]))
+
+    def test_users_with_few_votes_query_the_page(self):
+        self.vote(self.entries[0])
+        self.assertIsNone(voted.cached_voted_set(self.voter.id))
+        with self.assertNumQueries(1):
+            self.assertEqual(voted.voted_contestant_ids(self.voter, [self.entries[0].id, self.entries[1].id]), {self.entries[0].id})
+
+    def test_disabled_with_a_per_process_cache(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertFalse(voted.enabled())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.arena = make_arena()
+        self.entries = [make_entry(make_user(f'user{i}'), self.arena) for i in range(7)]
+        # Ties on votes (and possibly created_at) are broken by id
+        for entry, votes in zip(self.entries, [3, 1, 3, 0, 1, 3, 2]):
+            Contestant.objects.filter(pk=entry.pk).update(votes=votes)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        queryset = Contestant.objects.filter(arena=self.arena)
+        seen = []
+        rows, cursor = pagination.paginate(queryset, ranking.RANKING_ORDER, page_size=3)
+        seen.extend(rows)
+        while cursor:
+            rows, cursor = pagination.paginate(queryset, ranking.RANKING_ORDER, cursor, page_size=3)
+            seen.extend(rows)
+        self.assertEqual([entry.id for entry in seen], list(queryset.order_by(*ranking.RANKING_ORDER).values_list('id', flat=True)))
+
+    def test_last_full_page_has_no_cursor(self):
+        rows, cursor = pagination.paginate(Contestant.objects.all(), ranking.RANKING_ORDER, page_size=7)
+        self.assertEqual((len(rows), cursor), (7, None))
+
+    def test_bad_cursors(self):
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.paginate(Contestant.objects.all(), ranking.RANKING_ORDER, 'not a cursor')
+        other_ordering = pagination.encode_cursor([1, 2])
+        with self.assertRaises(pagination.InvalidCursor):
+            pagination.paginate(Contestant.objects.all(), ranking.RANKING_ORDER, other_ordering)
+
+    def test_feed_continues_after_the_cursor(self):
+        ranked = list(ranking.ranked_contestants(self.arena.id).values_list('id', flat=True))
+        # The page shows the podium, then the list starting with the 4th and 5th entries
+        others = Contestant.objects.filter(arena=self.arena).exclude(id__in=ranked[:3])
+        _, cursor = pagination.paginate(others, ranking.RANKING_ORDER, page_size=2)
+
+        data = self.client.get('/api/contestants/', {'arena': self.arena.id, 'cursor': cursor}).json()
+        self.assertEqual([entry['id'] for entry in data['contestants']], ranked[5:])
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(self.client.get('/api/contestants/', {'cursor': '!!'}).status_code, 400)
+
+
+class LeaderboardSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.arena = make_arena()
+        self.last_month = leaderboards.current_month() - datetime.timedelta(days=1)
+        self.month = self.last_month.replace(day=1)
+        entered = timezone.now().replace(year=self.month.year, month=self.month.month, day=2)
+        self.entries = [make_entry(make_user(f'user{i}'), self.arena) for i in range(3)]
+        Contestant.objects.filter(pk__in=[entry.pk for entry in self.entries]).update(created_at=entered)
+        for entry, votes in zip(self.entries, [1, 5, 3]):
+            Contestant.objects.filter(pk=entry.pk).update(votes=votes)
+        # Entered this month, so not part of last month's ranking
+        make_entry(make_user('late'), self.arena)
+
+    def test_parse_period(self):
+        self.assertEqual(leaderboards.parse_period('2025-02'), datetime.date(2025, 2, 1))
+        for period in ['', 'all', '2025-13', '2025-2', '25-02-1']:
+            self.assertIsNone(leaderboards.parse_period(period))
+
+    def test_snapshot_freezes_the_ranking(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(leaderboards.build_snapshot(self.month), 3)
+        self.assertEqual(
+            list(LeaderboardSnapshot.objects.filter(month=self.month).values_list('contestant_id', 'rank', 'votes')),
+            [(self.entries[1].id, 1, 5), (self.entries[2].id, 2, 3), (self.entries[0].id, 3, 1)],
+        )
+
+        Contestant.objects.filter(pk=self.entries[0].pk).update(votes=50)
+        top, others, _ = contestant_listing(self.arena, f'{self.month:%Y-%m}')
+        self.assertEqual([(entry.id, entry.votes) for entry in top], [(self.entries[1].id, 5), (self.entries[2].id, 3), (self.entries[0].id, 1)])
+        self.assertIs(others.model, LeaderboardSnapshot)
+
+    def test_snapshot_months_are_cached_until_a_snapshot_is_built(self):
+        self.assertEqual(leaderboards.snapshot_months(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            leaderboards.build_snapshot(self.month)
+        with self.assertNumQueries(1):
+            self.assertTrue(leaderboards.has_snapshot(self.month))
+            self.assertTrue(leaderboards.has_snapshot(self.month))
+
+    def test_command_backfills_closed_months_once(self):
+        output = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('snapshot_leaderboards', stdout=output)
+        self.assertIn(f'{self.month:%Y-%m}: 3 contestants', output.getvalue())
+        call_command('snapshot_leaderboards', stdout=output)
+        self.assertIn('All closed months are already snapshotted', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('snapshot_leaderboards', '--month', f'{leaderboards.current_month():%Y-%m}')
+
+
+class FinaleQualificationTests(TestCase):
+    def setUp(self):
+        self.season = timezone.now().year
+        self.recruit = make_arena('recruit', token_cost=15)
+        self.elite = make_arena('elite', token_cost=100)
+        self.recruits = [make_entry(make_user(f'recruit{i}'), self.recruit) for i in range(5)]
+        self.elites = [make_entry(make_user(f'elite{i}'), self.elite) for i in range(2)]
+        for entry, votes in zip(self.recruits, [4, 9, 1, 7, 4]):
+            Contestant.objects.filter(pk=entry.pk).update(votes=votes)
+
+    def test_top_three_of_every_arena_qualify(self):
+        qualifiers = [(arena_id, place, contestant_id) for arena_id, place, contestant_id, _, _ in finale.compute_qualifiers(self.season)]
+        # Equal votes: the newer entry ranks first
+        self.assertEqual(qualifiers, sorted([
+            (self.recruit.id, 1, self.recruits[1].id),
+            (self.recruit.id, 2, self.recruits[3].id),
+            (self.recruit.id, 3, self.recruits[4].id),
+            (self.elite.id, 1, self.elites[1].id),
+            (self.elite.id, 2, self.elites[0].id),
+        ], key=lambda row: (row[0], row[1])))
+
+    def test_entries_of_other_seasons_and_inactive_entries_are_left_out(self):
+        Contestant.objects.filter(pk=self.recruits[1].pk).update(is_active=False)
+        Contestant.objects.filter(pk=self.recruits[3].pk).update(created_at=timezone.now().replace(year=self.season - 1))
+        places = [contestant_id for arena_id, _, contestant_id, _, _ in finale.compute_qualifiers(self.season) if arena_id == self.recruit.id]
+        self.assertEqual(places, [self.recruits[4].id, self.recruits[0].id, self.recruits[2].id])
+
+    def test_command_replaces_the_stored_standings(self):
+        call_command('compute_finale', stdout=io.StringIO())
+        Contestant.objects.filter(pk=self.recruits[2].pk).update(votes=20)
+        output = io.StringIO()
+        call_command('compute_finale', '--season', str(self.season), stdout=output)
+
+        self.assertIn(f'Season {self.season}: 5 qualifiers from 2 arenas', output.getvalue())
+        board = finale.qualifier_board(finale.latest_season())
+        self.assertEqual([(q.arena_id, q.place, q.contestant_id, q.votes) for q in board][:3], [
+            (self.recruit.id, 1, self.recruits[2].id, 20),
+            (self.recruit.id, 2, self.recruits[1].id, 9),
+            (self.recruit.id, 3, self.recruits[3].id, 7),
+        ])
+        self.assertEqual(FinaleQualification.objects.count(), 5)
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=24)
+class TrendingScoreTests(TestCase):
+    def setUp(self):
+        arena = make_arena()
+        self.old, self.new = [make_entry(make_user(f'owner{i}'), arena) for i in range(2)]
+
+    def score(self, entry):
+        return Contestant.objects.get(pk=entry.pk).trending_score
+
+    def add_vote(self, entry, when):
+        Contestant.objects.filter(pk=entry.pk).update(trending_score=trending.score_with_vote(when))
+
+    def test_heat_halves_every_half_life(self):
+        now = timezone.now()
+        self.add_vote(self.old, now)
+        self.add_vote(self.old, now)
+        self.assertAlmostEqual(trending.heat(self.score(self.old), now), 2.0)
+        self.assertAlmostEqual(trending.heat(self.score(self.old), now + datetime.timedelta(hours=24)), 1.0)
+        self.assertEqual(trending.heat(0.0), 0.0)
+
+    def test_recent_votes_outrank_older_ones(self):
+        now = timezone.now()
+        for _ in range(3):
+            self.add_vote(self.old, now - datetime.timedelta(hours=48))
+        self.add_vote(self.new, now)
+        # 3 votes two half-lives ago weigh 0.75 now
+        self.assertAlmostEqual(trending.heat(self.score(self.old), now), 0.75)
+        ranked = Contestant.objects.order_by(*trending.TRENDING_ORDER).values_list('id', flat=True)
+        self.assertEqual(list(ranked), [self.new.id, self.old.id])
+
+    def test_rebuild_matches_the_incremental_scores(self):
+        voters = [make_user(f'voter{i}') for i in range(3)]
+        for voter in voters:
+            vote(voter, self.old)
+        vote(voters[0], self.old, use_tokens=True)
+        vote(voters[1], self.new)
+        scores = {entry.id: self.score(entry) for entry in (self.old, self.new)}
+        self.assertAlmostEqual(trending.heat(scores[self.old.id]), 4.0, places=3)
+
+        Contestant.objects.update(trending_score=0)
+        call_command('rebuild_trending', stdout=io.StringIO())
+        for entry in (self.old, self.new):
+            self.assertAlmostEqual(self.score(entry), scores[entry.id], places=4)
+
+
+class VoteRollupTests(TestCase):
+    def setUp(self):
+        self.arena = make_arena()
+        self.entry = make_entry(make_user('owner'), self.arena)
+        self.voters = [make_user(f'voter{i}') for i in range(2)]
+
+    def test_votes_are_added_to_the_hour(self):
+        vote(self.voters[0], self.entry)
+        vote(self.voters[1], self.entry)
+        vote(self.voters[1], self.entry, use_tokens=True)
+        rollup = VoteRollup.objects.get()
+        self.assertEqual((rollup.hour, rollup.free_votes, rollup.paid_votes, rollup.tokens_spent), (rollups.hour_bucket(timezone.now()), 2, 1, 5))
+
+    def test_series_fills_in_empty_hours(self):
+        now = timezone.now()
+        rollups.record_vote(self.entry, True, when=now - datetime.timedelta(hours=2))
+        rollups.record_vote(self.entry, False, 5, when=now)
+        series = rollups.contestant_series(self.entry.id, hours=4)
+        self.assertEqual([row[1:] for row in series], [(0, 0, 0), (1, 0, 0), (0, 0, 0), (0, 1, 5)])
+        self.assertEqual(series[-1][0], rollups.hour_bucket(now))
+        self.assertEqual([row[1:] for row in rollups.arena_series(self.arena.id, hours=2)], [(0, 0, 0), (0, 1, 5)])
+
+    def test_rebuild_from_raw_votes(self):
+        vote(self.voters[0], self.entry)
+        vote(self.voters[0], self.entry, use_tokens=True)
+        VoteRollup.objects.update(free_votes=9)
+        self.assertEqual(rollups.rebuild(), 1)
+        rollup = VoteRollup.objects.get()
+        self.assertEqual((rollup.free_votes, rollup.paid_votes, rollup.tokens_spent), (1, 1, 5))
+
+    def test_history_endpoint(self):
+        vote(self.voters[0], self.entry)
+        data = self.client.get(f'/api/contestant/{self.entry.id}/votes/', {'hours': 3}).json()
+        self.assertEqual([hour['free_votes'] for hour in data['hours']], [0, 0, 1])
+        self.assertEqual(self.client.get(f'/api/contestant/{self.entry.id}/votes/', {'hours': 'x'}).status_code, 400)
+
+    def test_sparkline_points(self):
+        self.assertEqual(rollups.sparkline_points([0, 2, 1], width=10, height=4), '0.0,4.0 5.0,0.0 10.0,2.0')
+
+
+@unittest.skipIf(batch_stats is None, 'numpy is not installed')
+class BatchStatsTests(TestCase):
+    def setUp(self):
+        arenas = [make_arena('recruit'), make_arena('elite', token_cost=100), make_arena('veteran', token_cost=25)]
+        self.users = [make_user(f'user{i}') for i in range(6)]
+        votes = iter([3, 0, 3, 7, 1, 1, 0, 2, 5, 5, 4])
+        for i, user in enumerate(self.users):
+            for arena in arenas[:i % 3 + 1]:
+                entry = make_entry(user, arena)
+                Contestant.objects.filter(pk=entry.pk).update(votes=next(votes, 0))
+        Contestant.objects.filter(user=self.users[0]).update(is_active=False)
+
+    def test_ranks_match_the_ranking_query(self):
+        entries = batch_stats.load_entries()
+        ranks = dict(zip(entries['id'].tolist(), batch_stats.rank_entries(entries).tolist()))
+        expected = dict(ranking.with_rank(Contestant.objects.filter(is_active=True)).values_list('id', 'rank'))
+        self.assertEqual(ranks, expected)
+
+    def test_stats_match_the_per_user_computation(self):
+        computed, entry_count, arena_count = batch_stats.compute_all_stats(chunk_size=4)
+        self.assertEqual((entry_count, arena_count), (Contestant.objects.filter(is_active=True).count(), 3))
+        for position, user_id in enumerate(computed['user'].tolist()):
+            expected = stats.compute_user_stats(user_id)
+            arena_id = int(computed['highest_tier_arena'][position])
+            self.assertEqual(
+                (int(computed['total_votes'][position]), int(computed['total_competitions'][position]), int(computed['wins'][position]), None if arena_id == batch_stats.NO_ARENA else arena_id),
+                (expected['total_votes'], expected['total_competitions'], expected['wins'], expected['highest_tier_arena'] and expected['highest_tier_arena'].id),
+            )
+
+    def test_command_fixes_drift_and_creates_missing_rows(self):
+        stats.get_user_stats(self.users[1])
+        UserStats.objects.filter(user=self.users[1]).update(wins=9)
+        output = io.StringIO()
+        call_command('recompute_rankings', '--check', stdout=output)
+        self.assertIn('Found 1 with drift, 5 missing', output.getvalue())
+
+        call_command('recompute_rankings', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(UserStats.objects.count(), 6)
+        for user_stats in UserStats.objects.all():
+            self.assertEqual(stats.find_drift(user_stats), {})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = make_user('staff', is_staff=True)
+        self.recruit, self.elite = make_arena('recruit'), make_arena('elite', token_cost=100)
+        self.entries = [make_entry(make_user('owner'), self.recruit), make_entry(make_user('rival'), self.elite)]
+        self.voter = make_user('voter')
+        for entry in self.entries:
+            vote(self.voter, entry)
+        vote(self.voter, self.entries[0], use_tokens=True)
+        self.client.force_login(self.staff)
+
+    def export(self, name, **params):
+        response = self.client.get(f'/staff/export/{name}/', params)
+        return response, b''.join(response.streaming_content).decode() if response.streaming else response.content.decode()
+
+    def test_votes_as_csv_filtered_by_arena(self):
+        response, content = self.export('votes', arena=self.elite.id)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,created_at,user_id,username,contestant_id,arena_id,is_free_vote,tokens_spent')
+        self.assertEqual(len(lines), 2)
+        self.assertIn(f',voter,{self.entries[1].id},{self.elite.id},True,0', lines[1])
+
+    def test_csv_cells_cannot_be_formulas(self):
+        CustomUser.objects.filter(pk=self.voter.pk).update(username='=HYPERLINK("http://x")')
+        _, content = self.export('transactions')
+        self.assertIn(""","'=HYPERLINK(""http://x"")",vote,-5,""", content)
+        # JSONL is not opened by spreadsheets and keeps the value
+        _, content = self.export('transactions', format='jsonl')
+        self.assertEqual(json.loads(content.splitlines()[0])['username'], '=HYPERLINK("http://x")')
+
+    def test_transactions_as_jsonl(self):
+        _, content = self.export('transactions', format='jsonl', arena=self.recruit.id)
+        [row] = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual((row['transaction_type'], row['amount'], row['contestant_id']), ('vote', -5, self.entries[0].id))
+
+    def test_day_filters_are_inclusive(self):
+        today = timezone.localdate().isoformat()
+        _, content = self.export('votes', start=today, end=today)
+        self.assertEqual(len(content.splitlines()), 3)
+        _, content = self.export('votes', end=(timezone.localdate() - datetime.timedelta(days=1)).isoformat())
+        self.assertEqual(len(content.splitlines()), 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.export('votes', start='yesterday')[0].status_code, 400)
+        self.assertEqual(self.export('payments', arena=self.recruit.id)[0].status_code, 400)
+        self.assertEqual(self.export('secrets')[0].status_code, 400)
+        self.assertEqual(self.export('votes', format='xml')[0].status_code, 400)
+        self.client.force_login(self.voter)
+        self.assertEqual(self.export('votes')[0].status_code, 403)
+
+    def test_async_lines_are_sent_in_batches(self):
+        async def collect():
+            return [batch async for batch in exports.aiter_lines((f'{i}\n' for i in range(5)), batch_size=2)]
+
+        self.assertEqual(async_to_sync(collect)(), ['0\n1\n', '2\n3\n', '4\n'])
+
+    async def test_asgi_export_streams_the_same_content(self):
+        client = AsyncClient()
+        await client.aforce_login(self.staff)
+        response = await client.get('/staff/export/votes/')
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(content.splitlines()), 3)
+
+
+class VotingHistoryTests(TestCase):
+    def setUp(self):
+        arena = make_arena()
+        self.entries = [make_entry(make_user(f'owner{i}'), arena) for i in range(4)]
+        self.voter = make_user('voter')
+        for entry in self.entries:
+            vote(self.voter, entry)
+        vote(self.voter, self.entries[0], use_tokens=True)
+        make_user('other').votes.create(contestant=self.entries[1], is_free_vote=True)
+        self.client.force_login(self.voter)
+
+    def test_pages_newest_first(self):
+        votes, cursor = vote_history_page(self.voter, page_size=3)
+        more, last_cursor = vote_history_page(self.voter, cursor, page_size=3)
+        self.assertIsNone(last_cursor)
+        ids = [vote.id for vote in votes + more]
+        self.assertEqual(ids, list(self.voter.votes.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_page_shows_totals(self):
+        response = self.client.get('/voting-history/')
+        self.assertEqual(
+            (response.context['total_votes'], response.context['free_votes'], response.context['paid_votes']),
+            (4, 4, 0),
+        )
+
+    def test_feed(self):
+        _, cursor = vote_history_page(self.voter, page_size=2)
+        data = self.client.get('/api/voting-history/', {'cursor': cursor}).json()
+        self.assertEqual([vote['contestant_id'] for vote in data['votes']], [self.entries[1].id, self.entries[0].id])
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(self.client.get('/api/voting-history/', {'cursor': 'bad'}).status_code, 400)
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test')
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = make_user('buyer', tokens=0)
+
+    async def test_checkout_session_under_asgi(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        session = SimpleNamespace(id='cs_test_1')
+        with mock.patch.object(stripe.checkout.Session, 'create_async', new=mock.AsyncMock(return_value=session)) as create:
+            response = await client.post('/api/create-checkout-session/', {'tokens': 100}, content_type='application/json')
+
+        self.assertEqual(response.json(), {'sessionId': 'cs_test_1'})
+        self.assertEqual(create.call_args.kwargs['metadata']['tokens'], 100)
+        payment = await Payment.objects.aget(user=self.user)
+        self.assertEqual((payment.status, payment.stripe_session_id, payment.tokens), ('pending', 'cs_test_1', 100))
+
+    def test_checkout_session_under_wsgi(self):
+        self.client.force_login(self.user)
+        error = stripe.error.APIConnectionError('Stripe is down')
+        with mock.patch.object(stripe.checkout.Session, 'create_async', new=mock.AsyncMock(side_effect=error)), self.assertLogs('accounts.views', 'ERROR'):
+            response = self.client.post('/api/create-checkout-session/', {'tokens': 100}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Payment.objects.get(user=self.user).status, 'failed')
+
+        response = self.client.post('/api/create-checkout-session/', {'tokens': 7}, content_type='application/json')
+        self.assertEqual(response.json(), {'error': 'Invalid token package.'})
+
+    async def test_paid_session_credits_tokens_once(self):
+        await Payment.objects.acreate(user=self.user, amount=8.99, tokens=100, status='pending', stripe_session_id='cs_test_2')
+        client = AsyncClient()
+        await client.aforce_login(self.user)
+        session = SimpleNamespace(payment_status='paid', payment_intent='pi_test')
+        with mock.patch.object(stripe.checkout.Session, 'retrieve_async', new=mock.AsyncMock(return_value=session)):
+            for _ in range(2):
+                response = await client.get('/payment/success/', {'session_id': 'cs_test_2'})
+                self.assertEqual(response.status_code, 302)
+
+        await self.user.arefresh_from_db()
+        self.assertEqual(self.user.tokens, 100)
+        self.assertEqual(await TokenTransaction.objects.filter(user=self.user, transaction_type='purchase').acount(), 1)
+
+    def test_vote_endpoint(self):
+        entry = make_entry(make_user('owner'), make_arena())
+        self.client.force_login(self.user)
+        response = self.client.post('/api/vote/', {'contestant_id': entry.id}, content_type='application/json')
+        self.assertEqual(response.json()['new_votes'], 1)
+        response = self.client.post('/api/vote/', {'contestant_id': entry.id, 'use_tokens': True}, content_type='application/json')
+        self.assertEqual(response.json(), {'success': False, 'message': 'Insufficient tokens. You need 5 tokens.'})
+
+
+# The broker's own loop never ticks during a test; the tests call tick() themselves
+@override_settings(LIVE_UPDATES_INTERVAL=3600, LIVE_UPDATES_QUEUE_SIZE=2)
+class LiveStandingsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.arena = make_arena()
+        self.entries = [make_entry(make_user(f'owner{i}'), self.arena) for i in range(3)]
+        self.voter = make_user('voter')
+
+    def messages(self, queue):
+        messages = []
+        while not queue.empty():
+            event = queue.get_nowait().split('data: ', 1)[1]
+            messages.append(json.loads(event))
+        return messages
+
+    async def cast(self, entry):
+        await sync_to_async(vote)(self.voter, entry)
+        await sync_to_async(live.publish)(self.arena.id)
+
+    async def test_new_stream_gets_the_full_standings_then_changes(self):
+        broker = live.Broker(live.CacheBackend())
+        queue = broker.subscribe(self.arena.id)
+        self.addCleanup(broker.task.cancel)
+        # Cast after the page was rendered, before the first tick
+        await self.cast(self.entries[0])
+
+        await broker.tick(broker.backend)
+        [message] = self.messages(queue)
+        self.assertTrue(message['full'])
+        self.assertEqual(message['changes'][0], [self.entries[0].id, 1, 1])
+        self.assertEqual(len(message['changes']), 3)
+
+        await broker.tick(broker.backend)
+        self.assertEqual(self.messages(queue), [])
+
+        # A later subscriber gets the full standings; the first one only what moved
+        late = broker.subscribe(self.arena.id)
+        await self.cast(self.entries[1])
+        await broker.tick(broker.backend)
+        self.assertEqual(self.messages(queue), [{'full': False, 'changes': [[self.entries[1].id, 1, 1], [self.entries[0].id, 1, 2], [self.entries[2].id, 0, 3]]}])
+        self.assertTrue(self.messages(late)[0]['full'])
+
+    async def test_entries_leaving_the_standings_are_removed(self):
+        broker = live.Broker(live.CacheBackend())
+        queue = broker.subscribe(self.arena.id)
+        self.addCleanup(broker.task.cancel)
+        await broker.tick(broker.backend)
+        self.messages(queue)
+
+        gone = self.entries[2]
+        gone.is_active = False
+        await sync_to_async(gone.save)()
+        await sync_to_async(live.publish)(self.arena.id)
+        await broker.tick(broker.backend)
+        [message] = self.messages(queue)
+        self.assertIn([gone.id, None, None], message['changes'])
+
+        with override_settings(LIVE_UPDATES_MAX_ROWS=1):
+            # Out of the tracked rows once the other entry gets a vote
+            await self.cast(self.entries[0])
+            await broker.tick(broker.backend)
+        self.assertEqual(self.messages(queue), [{'full': False, 'changes': [[self.entries[0].id, 1, 1], [self.entries[1].id, None, None]]}])
+
+    async def test_slow_client_gets_the_full_standings_instead_of_a_backlog(self):
+        broker = live.Broker(live.CacheBackend())
+        queue = broker.subscribe(self.arena.id)
+        self.addCleanup(broker.task.cancel)
+        await broker.tick(broker.backend)
+        for entry in self.entries:
+            await self.cast(entry)
+            await broker.tick(broker.backend)
+        # The queue holds 2 messages: the second vote's change replaced the backlog, the third followed it
+        self.assertEqual([message['full'] for message in self.messages(queue)], [True, False])
+
+    async def test_unsubscribing_forgets_the_channel(self):
+        broker = live.Broker(live.CacheBackend())
+        queue = broker.subscribe(self.arena.id)
+        self.addCleanup(broker.task.cancel)
+        await broker.tick(broker.backend)
+        broker.unsubscribe(self.arena.id, queue)
+        self.assertEqual((broker.subscribers, broker.versions, broker.standings, broker.joining), ({}, {}, {}, {}))
+
+    def test_backend_versions(self):
+        backend = live.CacheBackend()
+        backend.publish(self.arena.id)
+        backend.publish(self.arena.id)
+        self.assertEqual(backend.versions([self.arena.id, live.ALL, 999]), {self.arena.id: 2, live.ALL: 2})
+
+        backend = live.DatabaseBackend()
+        before = backend.versions([self.arena.id, live.ALL])
+        vote(self.voter, self.entries[0])
+        after = backend.versions([self.arena.id, live.ALL])
+        self.assertEqual(after[self.arena.id], (1, 3))
+        self.assertNotEqual(before[live.ALL], after[live.ALL])
+
+    def test_stream_needs_asgi(self):
+        self.assertEqual(self.client.get(f'/api/live/{self.arena.id}/').status_code, 503)
+        self.assertEqual(self.client.get('/api/live/999/').status_code, 404)
+        self.assertEqual(live.parse_channel('all'), live.ALL)
+        self.assertIsNone(live.parse_channel('x'))
+
+
+class SessionTests(TestCase):
+    def make_sessions(self, count, expire_date):
+        for _ in range(count):
+            session = SessionStore()
+            session.create()
+            Session.objects.filter(session_key=session.session_key).update(expire_date=expire_date)
+
+    def test_delete_in_batches(self):
+        self.make_sessions(5, timezone.now())
+        batches = list(batching.delete_in_batches(Session.objects.all(), batch_size=2))
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertFalse(Session.objects.exists())
+
+    def test_purge_deletes_only_expired_sessions(self):
+        self.make_sessions(3, timezone.now() - datetime.timedelta(days=1))
+        self.make_sessions(2, timezone.now() + datetime.timedelta(days=1))
+        output = io.StringIO()
+        call_command('purge_sessions', '--check', stdout=output)
+        self.assertIn('Found 3 expired sessions', output.getvalue())
+        call_command('purge_sessions', '--batch-size', '2', stdout=output)
+        self.assertIn('Deleted 3 expired sessions', output.getvalue())
+        self.assertEqual(Session.objects.count(), 2)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_store_nothing(self):
+        self.client.force_login(make_user('player'))
+        with self.assertNumQueries(3):
+            # The user, the page of votes and the totals; no session read
+            self.assertEqual(self.client.get('/voting-history/').status_code, 200)
+        self.assertFalse(Session.objects.exists())
+
+
+class EmailTokenTests(TestCase):
+    def setUp(self):
+        self.user = make_user('newcomer', email_confirmed=False)
+        self.user.set_password('old-password-1')
+        self.user.save()
+
+    def test_confirmation_link_works_once(self):
+        uidb64, token = email_tokens.make_link(self.user, email_tokens.email_confirmation_tokens)
+        self.client.get(f'/confirm-email/{uidb64}/{token}/')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.email_confirmed)
+        self.assertIsNone(email_tokens.get_user(uidb64, token, email_tokens.email_confirmation_tokens))
+
+    def test_email_change_invalidates_confirmation_links(self):
+        uidb64, token = email_tokens.make_link(self.user, email_tokens.email_confirmation_tokens)
+        self.user.email = 'moved@example.com'
+        self.user.save()
+        self.assertIsNone(email_tokens.get_user(uidb64, token, email_tokens.email_confirmation_tokens))
+
+    def test_reset_link_stops_working_after_the_password_changes(self):
+        uidb64, token = email_tokens.make_link(self.user, email_tokens.password_reset_tokens)
+        self.assertEqual(email_tokens.get_user(uidb64, token, email_tokens.password_reset_tokens), self.user)
+        # A reset link is not a confirmation link
+        self.assertIsNone(email_tokens.get_user(uidb64, token, email_tokens.email_confirmation_tokens))
+
+        self.user.set_password('new-password-2')
+        self.user.save()
+        self.assertIsNone(email_tokens.get_user(uidb64, token, email_tokens.password_reset_tokens))
+
+    @override_settings(PASSWORD_RESET_TIMEOUT=60)
+    def test_links_expire(self):
+        uidb64, token = email_tokens.make_link(self.user, email_tokens.password_reset_tokens)
+        later = datetime.datetime.now() + datetime.timedelta(minutes=2)
+        with mock.patch.object(email_tokens.password_reset_tokens, '_now', return_value=later):
+            self.assertIsNone(email_tokens.get_user(uidb64, token, email_tokens.password_reset_tokens))
+
+    def test_malformed_links(self):
+        _, token = email_tokens.make_link(self.user, email_tokens.password_reset_tokens)
+        self.assertIsNone(email_tokens.get_user('!!', token, email_tokens.password_reset_tokens))
+        self.assertIsNone(email_tokens.get_user('OTk5OQ', token, email_tokens.password_reset_tokens))
+
+    def test_display_code(self):
+        self.assertEqual(email_tokens.display_code('c5k2ab-0123456789abcdef'), '01234567')
+
+
+class GarbageCollectionTests(TestCase):
+    def setUp(self):
+        self.user = make_user('player')
+        self.long_ago = timezone.now() - datetime.timedelta(days=60)
+
+    def test_email_tokens(self):
+        used = EmailConfirmationToken.objects.create(user=self.user, used=True)
+        expired = EmailConfirmationToken.objects.create(user=self.user)
+        EmailConfirmationToken.objects.filter(pk=expired.pk).update(created_at=self.long_ago)
+        fresh = EmailConfirmationToken.objects.create(user=self.user)
+        self.assertCountEqual(gc.COLLECTORS['email_tokens'].queryset(timezone.now()), [used, expired])
+
+        output = io.StringIO()
+        call_command('purge_email_tokens', '--batch-size', '1', stdout=output)
+        self.assertIn('Deleted 2 used or expired tokens', output.getvalue())
+        self.assertEqual(list(EmailConfirmationToken.objects.all()), [fresh])
+
+    @override_settings(GC_PAYMENT_RETENTION_DAYS=30)
+    def test_payments_past_retention(self):
+        payments = {status: Payment.objects.create(user=self.user, amount=5, tokens=50, status=status)
+                    for status in ('pending', 'failed', 'completed')}
+        Payment.objects.update(created_at=self.long_ago)
+        recent = Payment.objects.create(user=self.user, amount=5, tokens=50, status='failed')
+        self.assertCountEqual(gc.COLLECTORS['payments'].queryset(timezone.now()), [payments['pending'], payments['failed']])
+
+        call_command('gc', '--only', 'payments', stdout=io.StringIO())
+        self.assertCountEqual(Payment.objects.all(), [payments['completed'], recent])
+
+    @override_settings(GC_INACTIVE_MEDIA_DAYS=30)
+    def test_contestant_media_is_queued_for_deletion(self):
+        arena = make_arena()
+        old = make_entry(self.user, arena, is_active=False)
+        recent = make_entry(make_user('rookie'), arena, is_active=False)
+        active = make_entry(make_user('veteran'), arena)
+        Contestant.objects.update(image_file='contestant_images/a.jpg', video_file='contestant_videos/a.mp4')
+        Contestant.objects.filter(pk=old.pk).update(deactivated_at=self.long_ago)
+        ImageFingerprint.objects.create(contestant=old, user=self.user, source_name='contestant_images/a.jpg',
+                                        dhash=0, band0=0, band1=0, band2=0, band3=0)
+
+        output = io.StringIO()
+        call_command('gc', '--only', 'contestant_media', stdout=output)
+        self.assertIn('contestant_media: collected 1', output.getvalue())
+        old.refresh_from_db()
+        self.assertFalse(old.image_file or old.video_file)
+        self.assertFalse(ImageFingerprint.objects.exists())
+        self.assertCountEqual(PendingFileDeletion.objects.values_list('field', 'name'), [
+            ('accounts.Contestant.video_file', 'contestant_videos/a.mp4'),
+            ('accounts.Contestant.image_file', 'contestant_images/a.jpg'),
+        ])
+        # The entry rows stay, and entries that are recent or active keep their files
+        self.assertEqual(Contestant.objects.filter(pk__in=[recent.pk, active.pk]).exclude(image_file='').count(), 2)
+
+    @override_settings(GC_INACTIVE_MEDIA_DAYS=30)
+    def test_entries_without_deactivation_date_keep_their_media(self):
+        entry = make_entry(self.user, make_arena(), is_active=False)
+        # Created long ago, deactivated at an unknown time before deactivated_at existed
+        Contestant.objects.filter(pk=entry.pk).update(image_file='contestant_images/a.jpg', created_at=self.long_ago, deactivated_at=None)
+
+        call_command('gc', '--only', 'contestant_media', stdout=io.StringIO())
+        entry.refresh_from_db()
+        self.assertEqual(entry.image_file.name, 'contestant_images/a.jpg')
+        # Its period starts now
+        self.assertAlmostEqual(entry.deactivated_at, timezone.now(), delta=datetime.timedelta(minutes=1))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_dry_run_changes_nothing(self):
+        EmailConfirmationToken.objects.create(user=self.user, used=True)
+        output = io.StringIO()
+        call_command('gc', '--dry-run', stdout=output)
+        self.assertIn('email_tokens: 1 used or expired email confirmation tokens to collect', output.getvalue())
+        self.assertIn('payments: 0', output.getvalue())
+        self.assertEqual(EmailConfirmationToken.objects.count(), 1)
+
+        call_command('gc', '--only', 'payments', stdout=output)
+        self.assertEqual(EmailConfirmationToken.objects.count(), 1)
+        call_command('gc', stdout=output)
+        self.assertIn('Collected 1 rows', output.getvalue())
+        self.assertFalse(EmailConfirmationToken.objects.exists())
+
+
+class PendingFileDeletionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.entry = make_entry(make_user('player'), make_arena())
+
+    def attach_image(self, entry, name='entry.jpg'):
+        entry.image_file.save(name, ContentFile(b'jpeg'))
+        return entry.image_file.name
+
+    def test_deleting_an_entry_queues_its_files(self):
+        name = self.attach_image(self.entry)
+        self.entry.delete()
+        self.assertEqual(list(PendingFileDeletion.objects.values_list('field', 'name')), [('accounts.Contestant.image_file', name)])
+        # Storage is untouched until the worker runs
+        self.assertTrue(default_storage.exists(name))
+
+        output = io.StringIO()
+        call_command('delete_pending_files', stdout=output)
+        self.assertIn('Deleted 1 files', output.getvalue())
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_rolled_back_delete_keeps_the_files(self):
+        name = self.attach_image(self.entry)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.entry.delete()
+            raise RuntimeError
+        self.assertFalse(PendingFileDeletion.objects.exists())
+        self.assertTrue(default_storage.exists(name))
+
+    def test_file_referenced_again_is_kept(self):
+        name = self.attach_image(self.entry)
+        other = make_entry(make_user('rookie'), self.entry.arena)
+        Contestant.objects.filter(pk=other.pk).update(image_file=name)
+        self.entry.delete()
+        queued = PendingFileDeletion.objects.get()
+
+        self.assertEqual(media.process_batch(), (queued.pk, 0, 1, 0))
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_failed_deletes_are_retried_then_given_up(self):
+        name = self.attach_image(self.entry)
+        self.entry.delete()
+        with mock.patch.object(type(default_storage._wrapped), 'delete', side_effect=OSError('disk gone')), \
+                self.assertLogs('accounts.media', 'ERROR'):
+            media.process_batch(max_attempts=2)
+            media.process_batch(max_attempts=2)
+        pending = PendingFileDeletion.objects.get()
+        self.assertEqual((pending.attempts, pending.last_error), (2, 'disk gone'))
+        # Given up: later runs skip it
+        self.assertEqual(media.process_batch(max_attempts=2), (None, 0, 0, 0))
+        self.assertTrue(default_storage.exists(name))
+
+    def test_unknown_field_is_given_up_at_once(self):
+        PendingFileDeletion.objects.create(field='accounts.Contestant.gone_file', name='x.jpg')
+        last_id, deleted, kept, failed = media.process_batch(max_attempts=3)
+        self.assertEqual((deleted, kept, failed), (0, 0, 1))
+        self.assertEqual(PendingFileDeletion.objects.get().attempts, 3)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root.name,
+            STORAGES={'default': {'BACKEND': 'accounts.storage.ContentAddressedStorage'}},
+        ))
+        arena = make_arena()
+        self.entries = [make_entry(make_user(f'player{i}'), arena) for i in range(2)]
+
+    def attach(self, entry, data=b'same clip'):
+        entry.video_file.save('clip.MP4', ContentFile(data))
+        return entry.video_file.name
+
+    def backdate(self, **delta):
+        StoredBlob.objects.update(referenced_at=timezone.now() - datetime.timedelta(**delta))
+
+    def test_same_bytes_are_stored_once(self):
+        names = [self.attach(entry) for entry in self.entries]
+        self.assertEqual(names[0], names[1])
+        self.assertRegex(names[0], r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.mp4$')
+        self.assertEqual(StoredBlob.objects.get().refcount, 2)
+        self.assertNotEqual(self.attach(self.entries[0], b'another clip'), names[0])
+
+    def test_deleting_releases_one_reference(self):
+        name = [self.attach(entry) for entry in self.entries][0]
+        self.entries[0].delete()
+        call_command('delete_pending_files', stdout=io.StringIO())
+        self.assertEqual(StoredBlob.objects.get().refcount, 1)
+        self.assertTrue(default_storage.exists(name))
+
+        self.entries[1].delete()
+        call_command('delete_pending_files', stdout=io.StringIO())
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_repair_drifted_counts(self):
+        self.attach(self.entries[0])
+        StoredBlob.objects.update(refcount=5)
+        # Just referenced: an upload may still be writing its row
+        self.assertEqual(storage.find_drift(timezone.now() - datetime.timedelta(minutes=60)), [])
+
+        self.backdate(hours=2)
+        output = io.StringIO()
+        call_command('repair_blob_refcounts', '--check', stdout=output)
+        self.assertIn('refcount 5 -> 1', output.getvalue())
+        self.assertEqual(StoredBlob.objects.get().refcount, 5)
+
+        call_command('repair_blob_refcounts', stdout=output)
+        self.assertEqual(StoredBlob.objects.get().refcount, 1)
+
+    def test_repair_removes_unused_blobs(self):
+        name = self.attach(self.entries[0])
+        Contestant.objects.update(video_file='')
+        self.backdate(hours=2)
+        output = io.StringIO()
+        call_command('repair_blob_refcounts', stdout=output)
+        self.assertIn('removed 1 unused', output.getvalue())
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_queued_deletions_still_count(self):
+        self.attach(self.entries[0])
+        self.entries[0].delete()
+        self.backdate(hours=2)
+        self.assertEqual(storage.find_drift(timezone.now()), [])
+
+    def test_orphaned_files_are_deleted_once_old_enough(self):
+        name = storage.blob_name('ab' * 32, '.jpg')
+        FileSystemStorage().save(name, ContentFile(b'left behind'))
+        self.assertEqual(storage.find_orphans(default_storage, timezone.now() - datetime.timedelta(hours=1)), [])
+
+        old = (timezone.now() - datetime.timedelta(hours=2)).timestamp()
+        os.utime(default_storage.path(name), (old, old))
+        output = io.StringIO()
+        call_command('repair_blob_refcounts', stdout=output)
+        self.assertIn('deleted 1 orphaned files', output.getvalue())
+        self.assertFalse(default_storage.exists(name))
+
+
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        media_root, upload_root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(upload_root.cleanup)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root.name,
+            DIRECT_UPLOAD_BACKEND='accounts.uploads.LocalBackend',
+            DIRECT_UPLOAD_ROOT=upload_root.name,
+        ))
+        self.user = make_user('player')
+        self.client.force_login(self.user)
+
+    def start(self, kind='profile_photo', content_type='image/png', size=100):
+        body = {'kind': kind, 'filename': 'Me.PNG', 'content_type': content_type, 'size': size}
+        return self.client.post('/api/uploads/', body, content_type='application/json')
+
+    def upload(self, data, content_type='image/png'):
+        upload = self.start(content_type=content_type, size=len(data)).json()
+        response = self.client.put(upload['url'], data, content_type=content_type)
+        self.assertEqual(response.status_code, 200, response.content)
+        return upload['ticket']
+
+    def settings_form(self, ticket):
+        return UserSettingsForm({'username': 'player', 'bio': '', 'profile_photo_upload': ticket}, instance=self.user, upload_user=self.user)
+
+    def test_upload_is_adopted_into_the_field(self):
+        ticket = self.upload(png_bytes())
+        form = self.settings_form(ticket)
+        self.assertTrue(form.is_valid(), form.errors)
+        user = form.save()
+        self.assertRegex(user.profile_photo.name, r'^profile_photos/[0-9a-f]{32}\.png$')
+        self.assertEqual(user.profile_photo.read(), png_bytes())
+        # The staged copy is gone
+        self.assertEqual(os.listdir(os.path.join(settings.DIRECT_UPLOAD_ROOT, uploads.STAGING_PREFIX)), [])
+
+    def test_start_checks_the_declared_file(self):
+        self.assertEqual(self.start(content_type='video/mp4').json()['message'], 'Expected a image file.')
+        with override_settings(DIRECT_UPLOAD_MAX_IMAGE_SIZE=50):
+            self.assertEqual(self.start(size=100).status_code, 400)
+        self.assertEqual(self.start(kind='banner').status_code, 400)
+        self.assertEqual(self.client.post('/api/uploads/', '[]', content_type='application/json').status_code, 400)
+        with override_settings(DIRECT_UPLOAD_BACKEND=''):
+            self.assertEqual(self.start().status_code, 404)
+
+    def test_put_must_match_the_ticket(self):
+        upload = self.start().json()
+        self.assertEqual(self.client.put(upload['url'], b'x', content_type='image/gif').status_code, 400)
+        self.assertEqual(self.client.put('/uploads/forged/', b'x', content_type='image/png').status_code, 400)
+        with override_settings(DIRECT_UPLOAD_MAX_IMAGE_SIZE=4):
+            self.assertEqual(self.client.put(upload['url'], b'too large', content_type='image/png').status_code, 400)
+
+    def test_ticket_belongs_to_its_user_and_kind(self):
+        ticket = self.upload(png_bytes())
+        with self.assertRaisesMessage(uploads.UploadError, 'Invalid upload.'):
+            uploads.verify(ticket, 'profile_photo', make_user('rookie'))
+        with self.assertRaisesMessage(uploads.UploadError, 'Invalid upload.'):
+            uploads.verify(ticket, 'contestant_image', self.user)
+
+    def test_unfinished_or_invalid_uploads_are_rejected(self):
+        form = self.settings_form(self.start().json()['ticket'])
+        self.assertFalse(form.is_valid())
+        self.assertIn('did not finish', form.errors['profile_photo'][0])
+
+        form = self.settings_form(self.upload(b'not an image'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Upload a valid image', form.errors['profile_photo'][0])
+
+    @override_settings(DIRECT_UPLOAD_TICKET_MAX_AGE=60)
+    def test_expired_ticket(self):
+        ticket = self.upload(png_bytes())
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 120):
+            self.assertIn('expired', self.settings_form(ticket).errors['profile_photo'][0])
+
+
+class NearDuplicateTests(TestCase):
+    def setUp(self):
+        self.arena = make_arena()
+        self.owner = make_user('player')
+
+    def store(self, value, user=None):
+        entry = make_entry(user or make_user(f'copycat{ImageFingerprint.objects.count()}'), self.arena, submission_type='image', image_file='contestant_images/a.png')
+        fingerprints.store(entry, value)
+        return entry.fingerprint
+
+    def test_dhash_survives_reencoding(self):
+        original = pattern_image(1)
+        reencoded = io.BytesIO()
+        original.convert('RGB').resize((300, 266)).save(reencoded, 'JPEG', quality=60)
+        value = fingerprints.dhash(original)
+        self.assertLessEqual(fingerprints.distance(value, fingerprints.image_hash(reencoded)), 2)
+        self.assertGreater(fingerprints.distance(value, fingerprints.dhash(pattern_image(2))), 6)
+        with self.assertLogs('accounts.fingerprints', 'WARNING'):
+            self.assertIsNone(fingerprints.image_hash(io.BytesIO(b'not an image')))
+
+    def test_band_search_finds_hashes_within_the_distance(self):
+        value = 0xF0E1_D2C3_B4A5_9687  # High bit set: stored negative
+
+        def flip(*bits):
+            return value ^ sum(1 << bit for bit in bits)
+
+        exact = self.store(value)
+        spread = self.store(flip(0, 1, 16, 17, 32, 48))  # 6 bits, no band unchanged
+        self.store(flip(0, 1, 16, 17, 32, 33, 48))  # 7 bits
+        self.store(value ^ ((1 << 64) - 1))
+        self.assertLess(exact.dhash, 0)
+
+        matches = fingerprints.find_near_duplicates(value, max_distance=6)
+        self.assertEqual([(d, match.pk) for d, match in matches], [(0, exact.pk), (6, spread.pk)])
+        self.assertEqual(len(fingerprints.find_near_duplicates(value, max_distance=7)), 3)
+        self.assertEqual(fingerprints.find_near_duplicates(value, exclude_user_id=exact.user_id, max_distance=6)[0][1], spread)
+
+    def test_submission_of_another_users_picture_is_rejected(self):
+        self.store(fingerprints.dhash(pattern_image(1)), self.owner)
+        copy = io.BytesIO()
+        pattern_image(1, size=(360, 320)).save(copy, 'PNG')
+
+        def submit(user, image):
+            data = {'submission_type': 'image', 'title': 'Mine', 'description': 'Mine'}
+            files = {'image_file': SimpleUploadedFile('mine.png', image, content_type='image/png')}
+            return ContestantSubmissionForm(data, files, upload_user=user)
+
+        form = submit(make_user('copycat'), copy.getvalue())
+        self.assertFalse(form.is_valid())
+        self.assertIn('looks like a copy', form.errors['image_file'][0])
+        # The owner may enter their picture again, and other pictures pass
+        self.assertTrue(submit(self.owner, copy.getvalue()).is_valid())
+        self.assertTrue(submit(make_user('artist'), png_bytes()).is_valid())
+
+    def test_fingerprint_submissions_reports_copies(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        picture = io.BytesIO()
+        pattern_image(1).save(picture, 'PNG')
+        entries = []
+        for user in (self.owner, make_user('copycat')):
+            entry = make_entry(user, self.arena, submission_type='image')
+            entry.image_file.save('copy.png', ContentFile(picture.getvalue()))
+            entries.append(entry)
+
+        output = io.StringIO()
+        call_command('fingerprint_submissions', '--report', stdout=output)
+        self.assertIn('Fingerprinted 2 entries', output.getvalue())
+        self.assertIn(f'Entries {entries[0].pk} and {entries[1].pk}: 0 bits apart', output.getvalue())
+
+        # Up to date fingerprints are not computed again
+        call_command('fingerprint_submissions', '--check', stdout=output)
+        self.assertIn('0 entries to fingerprint', output.getvalue())
@@ -0,0 +1,70 @@
+"""Trending score: votes weighted by how recent they are.
+
+A vote cast at time t counts 2 ** -((now - t) / half-life) at time `now`, so a
+contestant's heat halves every TRENDING_HALF_LIFE_HOURS without new votes.
+Every heat decays by the same factor over time, so the ordering never changes
+while nobody votes. We store log2 of the sum of 2 ** ((t - EPOCH) / half-life)
+over all votes (Contestant.trending_score). Sorting by that indexed column is
+sorting by current heat, a new vote only updates one row, and the heat at any
+moment is derived on read (heat()). ranking.record_vote() adds the vote to the
+score in the same UPDATE that adds it to the vote count (score_with_vote()).
+
+Changing TRENDING_HALF_LIFE_HOURS changes every score: run
+`manage.py rebuild_trending` afterwards.
+"""
+import datetime
+import math
+
+from django.conf import settings
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Greatest, Least, Log, Power
+from django.utils import timezone
+
+from .models import Contestant, TokenTransaction, Vote
+
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+
+# Same shape as ranking.RANKING_ORDER so keyset pagination works unchanged
+TRENDING_ORDER = ('-trending_score', '-created_at', '-id')
+
+
+def half_lives_since_epoch(when):
+    return (when - EPOCH).total_seconds() / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def log2_add(a, b):
+    """log2(2 ** a + 2 ** b) without overflowing"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def score_with_vote(when=None):
+    """Expression for Contestant.trending_score with a vote cast at `when` added (log2_add() in SQL)"""
+    weight = Value(half_lives_since_epoch(when or timezone.now()), output_field=FloatField())
+    high, low = Greatest(F('trending_score'), weight), Least(F('trending_score'), weight)
+    return Case(
+        When(trending_score=0, then=weight),
+        default=high + Log(Value(2.0), Value(1.0) + Power(Value(2.0), low - high)),
+        output_field=FloatField(),
+    )
+
+
+def heat(score, now=None):
+    """Current decayed vote weight for a stored score (0 for contestants without votes)"""
+    if not score:
+        return 0.0
+    return 2 ** (score - half_lives_since_epoch(now or timezone.now()))
+
+
+def compute_scores():
+    """Return {contestant_id: score} from the full vote history (free votes and token votes)"""
+    scores = {}
+    free_votes = Vote.objects.values_list('contestant_id', 'created_at')
+    # Paid votes are only recorded as token transactions
+    paid_votes = TokenTransaction.objects.filter(transaction_type='vote', related_contestant__isnull=False).values_list('related_contestant_id', 'created_at')
+    for votes in (free_votes, paid_votes):
+        for contestant_id, created_at in votes.iterator(chunk_size=5000):
+            weight = half_lives_since_epoch(created_at)
+            score = scores.get(contestant_id)
+            scores[contestant_id] = log2_add(score, weight) if score is not None else weight
+    return scores
@@ -0,0 +1,246 @@
+"""Direct uploads: the browser sends file bytes to object storage, not to Django.
+
+1. The page asks `api/uploads/` for an upload URL. start() checks the declared
+   type and size, picks a staging key under STAGING_PREFIX and returns a
+   short-lived presigned PUT URL plus a signed ticket naming that key.
+2. The browser PUTs the file to the URL and puts the ticket in the form
+   (`<field>_upload`, see DirectUploadMixin in accounts/forms.py).
+3. When the form is validated, verify() checks the ticket and the stored
+   object (present, within the size limit, of the declared type, a readable
+   image for image fields). save() then adopts the object into the field's
+   storage under the field's upload_to and removes the staged copy.
+
+Staged objects that are never submitted stay under STAGING_PREFIX; expire
+that prefix with a bucket lifecycle rule (or delete DIRECT_UPLOAD_ROOT files).
+
+Backends (DIRECT_UPLOAD_BACKEND, empty to upload through Django as before):
+
+- S3Backend presigns with boto3 against AWS_STORAGE_BUCKET_NAME and
+  AWS_S3_ENDPOINT_URL, so it works with S3 and with MinIO or another
+  S3-compatible server. Adopting is a server-side copy, so it needs
+  MEDIA_STORAGE = 's3' on the same bucket. boto3 is only needed in this mode.
+- LocalBackend is an in-process stand-in for development and tests: the
+  "presigned" URL is the signed `uploads/<ticket>/` endpoint of this app,
+  which streams the body into DIRECT_UPLOAD_ROOT. Adopting saves the file
+  into the default storage, so it works with every MEDIA_STORAGE.
+"""
+import io
+import os
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .models import Contestant, CustomUser
+
+STAGING_PREFIX = 'direct-uploads'
+TICKET_SALT = 'accounts.uploads'
+CHUNK_SIZE = 64 * 1024
+
+UploadKind = namedtuple('UploadKind', ['model', 'field', 'content_type_prefix', 'max_size_setting'])
+
+KINDS = {
+    'contestant_video': UploadKind(Contestant, 'video_file', 'video/', 'DIRECT_UPLOAD_MAX_VIDEO_SIZE'),
+    'contestant_image': UploadKind(Contestant, 'image_file', 'image/', 'DIRECT_UPLOAD_MAX_IMAGE_SIZE'),
+    'profile_photo': UploadKind(CustomUser, 'profile_photo', 'image/', 'DIRECT_UPLOAD_MAX_IMAGE_SIZE'),
+}
+
+
+class UploadError(ValueError):
+    pass
+
+
+def enabled():
+    return bool(settings.DIRECT_UPLOAD_BACKEND)
+
+
+def get_backend():
+    if not enabled():
+        raise ImproperlyConfigured('DIRECT_UPLOAD_BACKEND is not set')
+    return import_string(settings.DIRECT_UPLOAD_BACKEND)()
+
+
+def get_kind(name):
+    try:
+        return KINDS[name]
+    except KeyError:
+        raise UploadError(f'Unknown upload kind "{name}"')
+
+
+def max_size(kind):
+    return getattr(settings, kind.max_size_setting)
+
+
+def final_name(kind, staging_key):
+    """Where an adopted object goes: the field's upload_to plus the staged file name"""
+    upload_to = kind.model._meta.get_field(kind.field).upload_to
+    return f"{upload_to.rstrip('/')}/{os.path.basename(staging_key)}"
+
+
+def make_ticket(user, kind_name, key, content_type):
+    return signing.dumps({'user': user.pk, 'kind': kind_name, 'key': key, 'type': content_type}, salt=TICKET_SALT)
+
+
+def read_ticket(ticket, max_age):
+    try:
+        return signing.loads(ticket, salt=TICKET_SALT, max_age=max_age)
+    except signing.SignatureExpired:
+        raise UploadError('The upload expired, please upload the file again.')
+    except signing.BadSignature:
+        raise UploadError('Invalid upload.')
+
+
+def start(user, kind_name, filename, content_type, size):
+    """Check a planned upload and return {url, method, headers, ticket} for the browser"""
+    kind = get_kind(kind_name)
+    if not content_type or not content_type.startswith(kind.content_type_prefix):
+        raise UploadError(f'Expected a {kind.content_type_prefix.rstrip("/")} file.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size must be the file size in bytes')
+    if size <= 0 or size > max_size(kind):
+        raise UploadError(f'The file must be at most {max_size(kind) // (1024 * 1024)} MB.')
+
+    extension = os.path.splitext(filename or '')[1].lower()[:10]
+    key = f'{STAGING_PREFIX}/{uuid.uuid4().hex}{extension}'
+    ticket = make_ticket(user, kind_name, key, content_type)
+    url = get_backend().presign(key, content_type, ticket)
+    return {'url': url, 'method': 'PUT', 'headers': {'Content-Type': content_type}, 'ticket': ticket}
+
+
+def verify(ticket, kind_name, user, backend=None):
+    """Check a submitted ticket and its uploaded object; returns the ticket data"""
+    data = read_ticket(ticket, settings.DIRECT_UPLOAD_TICKET_MAX_AGE)
+    if data['kind'] != kind_name or user is None or data['user'] != user.pk:
+        raise UploadError('Invalid upload.')
+    kind = KINDS[kind_name]
+    backend = backend or get_backend()
+
+    stat = backend.stat(data['key'])
+    if stat is None:
+        raise UploadError('The upload did not finish, please upload the file again.')
+    size, content_type = stat
+    if size > max_size(kind):
+        raise UploadError(f'The file must be at most {max_size(kind) // (1024 * 1024)} MB.')
+    if content_type != data['type']:
+        raise UploadError(f'Expected a {kind.content_type_prefix.rstrip("/")} file.')
+    if kind.content_type_prefix == 'image/':
+        verify_image(backend, data['key'])
+    return data
+
+
+def verify_image(backend, key):
+    # Same check as forms.ImageField: Pillow must be able to read it
+    from PIL import Image
+
+    with backend.open(key) as f:
+        content = io.BytesIO(f.read())
+    try:
+        Image.open(content).verify()
+    except Exception:
+        raise UploadError('Upload a valid image. The file you uploaded was either not an image or a corrupted image.')
+
+
+def adopt(ticket):
+    """Move a verified upload into its field's storage; returns the name to store in the field"""
+    data = read_ticket(ticket, settings.DIRECT_UPLOAD_TICKET_MAX_AGE)
+    return get_backend().adopt(data['key'], final_name(KINDS[data['kind']], data['key']), data['type'])
+
+
+class LocalBackend:
+    """In-process stand-in for S3: uploads go to this app's `uploads/<ticket>/` endpoint"""
+
+    def __init__(self):
+        self.storage = FileSystemStorage(location=settings.DIRECT_UPLOAD_ROOT)
+
+    def presign(self, key, content_type, ticket):
+        return reverse('direct_upload_put', args=[ticket])
+
+    def receive(self, key, content_type, stream, limit):
+        """Store a PUT body under key; raises UploadError past limit bytes"""
+        path = self.storage.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        with open(path, 'wb') as f:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > limit:
+                    break
+                f.write(chunk)
+        if size > limit:
+            os.remove(path)
+            raise UploadError('File too large.')
+        with open(f'{path}.type', 'w') as f:
+            f.write(content_type)
+        return size
+
+    def stat(self, key):
+        if not self.storage.exists(key):
+            return None
+        with self.storage.open(f'{key}.type', 'r') as f:
+            return self.storage.size(key), f.read()
+
+    def open(self, key):
+        return self.storage.open(key, 'rb')
+
+    def adopt(self, key, name, content_type):
+        with self.storage.open(key, 'rb') as f:
+            name = default_storage.save(name, File(f, name=name))
+        self.storage.delete(key)
+        self.storage.delete(f'{key}.type')
+        return name
+
+
+class S3Backend:
+    """Presigned PUTs to an S3-compatible bucket (S3, MinIO, ...)"""
+
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise ImproperlyConfigured('S3Backend needs boto3: pip install boto3')
+        if settings.MEDIA_STORAGE != 's3':
+            raise ImproperlyConfigured("S3Backend adopts uploads in the media bucket and needs MEDIA_STORAGE = 's3'")
+        self.bucket = settings.AWS_STORAGE_BUCKET_NAME
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+            region_name=settings.AWS_S3_REGION_NAME,
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        )
+
+    def presign(self, key, content_type, ticket):
+        # ContentType is part of the signature, so the browser must send the declared type
+        return self.client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': self.bucket, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=settings.DIRECT_UPLOAD_URL_EXPIRY,
+        )
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head['ContentLength'], head.get('ContentType', '')
+
+    def open(self, key):
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+
+    def adopt(self, key, name, content_type):
+        # Server-side copy: the bytes never pass through this process
+        self.client.copy_object(Bucket=self.bucket, Key=name, CopySource={'Bucket': self.bucket, 'Key': key}, ContentType=content_type, MetadataDirective='REPLACE')
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return name
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
@@ -5,22 +6,35 @@ from django.contrib import messages
 from django.urls import reverse
 from django.core.mail import send_mail
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.views.decorators.http import require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.formats import date_format
 import json
 import smtplib
 import logging
 import stripe
 
+from . import achievements, activity, arena_catalog, capacity, email_tokens, exports, finale, fingerprints, leaderboards, live, metrics, pagination, ranking, rollups, stats, trending, uploads, voted
 from .forms import SignupForm, LoginForm, UserSettingsForm, PasswordChangeForm, DeleteAccountForm, ContestantSubmissionForm, ForgotPasswordForm, ResetPasswordForm, EmailChangeForm
-from .models import CustomUser, Arena, Contestant, Vote, TokenTransaction, EmailConfirmationToken, Payment
+from .models import CustomUser, Arena, Contestant, Vote, TokenTransaction, EmailConfirmationToken, Payment, LeaderboardSnapshot
 from django.template.loader import render_to_string
+from django.core.handlers.asgi import ASGIRequest
 
 logger = logging.getLogger(__name__)
 
+CONTESTANTS_PAGE_SIZE = 20
+
+# Sort modes of the rankings page
+LISTING_ORDERS = {
+    'votes': ranking.RANKING_ORDER,
+    'trending': trending.TRENDING_ORDER,
+}
+
 # Initialize Stripe
 if settings.STRIPE_SECRET_KEY:
     stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -70,12 +84,32 @@ def get_email_error_message(error):
     return f"Email error: {error_str}\n\nSee docs/EMAIL_SETUP.md or docs/GMAIL_SETUP.md for setup instructions."
 
 
+def send_mail_with_metrics(kind, *args, **kwargs):
+    """Send an email with send_mail() and count the outcome in the emails metric"""
+    try:
+        result = send_mail(*args, **kwargs)
+    except Exception:
+        metrics.emails_sent.inc(kind=kind, status='failed')
+        raise
+    metrics.emails_sent.inc(kind=kind, status='sent')
+    return result
+
+async def asend_mail_with_metrics(kind, *args, **kwargs):
+    """send_mail_with_metrics() for async views; the SMTP round trips run in their own thread"""
+    return await sync_to_async(send_mail_with_metrics, thread_sensitive=False)(kind, *args, **kwargs)
+
+async def arender(request, template_name, context=None):
+    """render() for async views. Rendering runs in the sync thread because templates
+    (context processors, request.user, lazy relations) may touch the database."""
+    return await sync_to_async(render)(request, template_name, context)
+
+
 def participation_agreement_view(request):
     """Display the Participation Agreement page"""
     return render(request, "participation_agreement.html")
 
 def home_view(request):
-    arenas = Arena.objects.filter(is_active=True)[:4]
+    arenas = arena_catalog.active_arenas()[:4]
     context = {
         'arenas': arenas,
         'user_tokens': request.user.tokens if request.user.is_authenticated else 0,
@@ -83,11 +117,11 @@ def home_view(request):
     return render(request, "home.html", context)
 
 def arenas_view(request):
-    arenas = Arena.objects.filter(is_active=True)
+    arenas = arena_catalog.active_arenas()
     user_tokens = request.user.tokens if request.user.is_authenticated else 0
     user_arenas = []
     if request.user.is_authenticated:
-        user_arenas = [c.arena.id for c in Contestant.objects.filter(user=request.user, is_active=True)]
+        user_arenas = list(Contestant.objects.filter(user=request.user, is_active=True).values_list('arena_id', flat=True))
     
     context = {
         'arenas': arenas,
@@ -96,100 +130,178 @@ def arenas_view(request):
     }
     return render(request, "arenas.html", context)
 
-def contestants_view(request):
-    # Get active arenas and contestants
-    arena_id = request.GET.get('arena', None)
-    period = request.GET.get('period', 'all')  # all, month, or YYYY-MM format
-    
-    # Base queryset
-    contestants_base = Contestant.objects.filter(is_active=True)
-    
-    # Apply period filter
-    if period and period != 'all' and len(period) == 7 and period[4] == '-':
-        # Specific month in YYYY-MM format
-        try:
-            year, month = map(int, period.split('-'))
-            from datetime import datetime
-            # Create timezone-aware datetime for start of month
-            now = timezone.now()
-            start_date = now.replace(year=year, month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
-            # End of month
-            if month == 12:
-                end_date = now.replace(year=year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            else:
-                end_date = now.replace(year=year, month=month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
-            contestants_base = contestants_base.filter(created_at__gte=start_date, created_at__lt=end_date)
-        except (ValueError, TypeError):
-            pass  # Invalid format, ignore filter
-    # 'all' - no date filter
-    
-    if arena_id:
-        arena = get_object_or_404(Arena, id=arena_id, is_active=True)
-        contestants = contestants_base.filter(arena=arena).order_by('-votes', '-created_at')
-        # Get top 3 contestants for specific arena
-        top_contestants = list(contestants[:3])
-        other_contestants = list(contestants[3:10])  # Next 7 for the list
+def filter_by_period(queryset, period):
+    """Restrict contestants to those created in period ('all' or YYYY-MM)"""
+    month = leaderboards.parse_period(period)
+    if month:
+        start_date, end_date = leaderboards.month_bounds(month)
+        queryset = queryset.filter(created_at__gte=start_date, created_at__lt=end_date)
+    # 'all' or invalid format - no date filter
+    return queryset
+
+def contestant_listing(arena, period, sort='votes'):
+    """Return (top_contestants, others, ordering) for the rankings page.
+    
+    others is the queryset the ranking list pages through with keyset cursors
+    on ordering (see listing_page). Closed months that have been snapshotted
+    are read from LeaderboardSnapshot and always ranked by their frozen votes.
+    
+    Live listings page on the current vote counts, which change between
+    requests: an entry that gains votes after its page was shown can move
+    above the cursor and be skipped, and one that loses votes can be sent
+    again (the page drops repeats). Frozen months page on fixed values.
+    """
+    month = leaderboards.parse_period(period)
+    if month and leaderboards.is_closed(month) and leaderboards.has_snapshot(month):
+        return snapshot_listing(arena, month)
+    
+    ordering = LISTING_ORDERS.get(sort, ranking.RANKING_ORDER)
+    contestants_base = filter_by_period(Contestant.objects.filter(is_active=True), period).select_related('user', 'arena')
+    
+    if arena:
+        # Top 3 contestants for specific arena
+        contestants = contestants_base.filter(arena_id=arena.id)
+        top_contestants = list(contestants.order_by(*ordering)[:3])
     else:
-        # Show all contestants from all arenas
-        arena = None
-        all_arenas = Arena.objects.filter(is_active=True).order_by('token_cost')
-        
-        # Get top contestant from each arena (top 4 arenas)
+        # Top contestant from each arena (top 4 arenas)
+        contestants = contestants_base
         top_contestants = []
-        for a in all_arenas[:4]:
-            top_from_arena = contestants_base.filter(arena=a).order_by('-votes', '-created_at').first()
+        for a in arena_catalog.active_arenas()[:4]:
+            top_from_arena = contestants_base.filter(arena_id=a.id).order_by(*ordering).first()
             if top_from_arena:
                 top_contestants.append(top_from_arena)
-        
-        # Get remaining contestants (excluding the top ones already shown)
-        top_contestant_ids = [c.id for c in top_contestants]
-        other_contestants = contestants_base.exclude(id__in=top_contestant_ids).order_by('-votes', '-created_at')[:20]
+    
+    # Remaining contestants (excluding the top ones already shown)
+    others = contestants.exclude(id__in=[c.id for c in top_contestants])
+    return top_contestants, others, ordering
+
+def snapshot_listing(arena, month):
+    """contestant_listing for a closed month, from its frozen rankings"""
+    snapshots = LeaderboardSnapshot.objects.filter(month=month, contestant__is_active=True).select_related('contestant__user', 'contestant__arena')
+    
+    if arena:
+        snapshots = snapshots.filter(arena_id=arena.id)
+        top_snapshots = list(snapshots.filter(rank__lte=3).order_by('rank'))
+    else:
+        arena_ids = [a.id for a in arena_catalog.active_arenas()[:4]]
+        winners = {s.arena_id: s for s in snapshots.filter(rank=1, arena_id__in=arena_ids)}
+        top_snapshots = [winners[arena_id] for arena_id in arena_ids if arena_id in winners]
+    
+    others = snapshots.exclude(id__in=[s.id for s in top_snapshots])
+    return [leaderboards.frozen_contestant(s) for s in top_snapshots], others, leaderboards.SNAPSHOT_ORDER
+
+def listing_page(others, ordering, cursor=None, page_size=CONTESTANTS_PAGE_SIZE):
+    """Return (contestants, next_cursor) for a page of contestant_listing's others"""
+    if others.model is LeaderboardSnapshot:
+        snapshots, next_cursor = pagination.paginate(others, ordering, cursor, page_size)
+        return [leaderboards.frozen_contestant(s) for s in snapshots], next_cursor
+    return pagination.paginate(others, ordering, cursor, page_size)
+
+def get_listing_arena(arena_id):
+    if not arena_id:
+        return None
+    arena = arena_catalog.get_arena(arena_id)
+    if arena is None:
+        raise Http404('No active arena matches the given query.')
+    return arena
+
+def contestants_view(request):
+    # Get active arenas and contestants
+    arena = get_listing_arena(request.GET.get('arena', None))
+    period = request.GET.get('period', 'all')  # all, month, or YYYY-MM format
+    sort = request.GET.get('sort', 'votes')  # votes (all-time) or trending
+    
+    top_contestants, others, ordering = contestant_listing(arena, period, sort)
+    # Next 7 for the list in an arena, 20 across all arenas; the rest is loaded from /api/contestants/
+    other_contestants, next_cursor = listing_page(others, ordering, page_size=7 if arena else 20)
     
     user_tokens = request.user.tokens if request.user.is_authenticated else 0
-    user_votes = {}
-    if request.user.is_authenticated:
-        user_votes = {v.contestant.id: True for v in Vote.objects.filter(user=request.user)}
-    
-    # Generate month options for current year
-    from datetime import datetime
-    import calendar
-    now = timezone.now()
-    current_year = now.year
-    current_month = now.month
-    
-    month_options = []
-    month_names = [calendar.month_name[i] for i in range(1, 13)]
-    
-    # Add all months up to and including current month
-    for month_num in range(1, current_month + 1):
-        month_str = f"{current_year}-{month_num:02d}"
-        month_label = month_names[month_num - 1]
-        if month_num == current_month:
-            month_label = f"This Month ({month_label})"
-        month_options.append({
-            'value': month_str,
-            'label': month_label,
-            'year': current_year,
-            'month': month_num,
-        })
+    # Only look up votes for the contestants shown on this page
+    user_votes = voted.voted_contestant_ids(request.user, [c.id for c in top_contestants + other_contestants])
+    
+    # Month options: every month of the current year so far, plus any earlier month with a snapshot
+    this_month = leaderboards.current_month()
+    months = [this_month.replace(month=m) for m in range(1, this_month.month + 1)]
+    month_options = leaderboards.month_options(months + leaderboards.snapshot_months())
     
     context = {
         'arena': arena,
-        'arenas': Arena.objects.filter(is_active=True),
         'top_contestants': top_contestants,
         'other_contestants': other_contestants,
+        'next_cursor': next_cursor,
+        'next_rank': len(top_contestants) + len(other_contestants) + 1,
         'user_tokens': user_tokens,
         'user_votes': user_votes,
         'selected_period': period,
+        'selected_sort': sort if sort in LISTING_ORDERS else 'votes',
         'month_options': month_options,
+        # Live vote counts, except for frozen months; ranks only where the list is the plain arena ranking
+        'live_channel': None if others.model is LeaderboardSnapshot else (arena.id if arena else live.ALL),
+        'live_ranks': bool(arena) and sort == 'votes' and period == 'all',
     }
     return render(request, "contestants.html", context)
 
+def contestants_feed(request):
+    """Return the next page of the rankings list as JSON (for "load more")"""
+    try:
+        arena = get_listing_arena(request.GET.get('arena', None))
+        _, others, ordering = contestant_listing(arena, request.GET.get('period', 'all'), request.GET.get('sort', 'votes'))
+        contestants, next_cursor = listing_page(others, ordering, request.GET.get('cursor'))
+    except pagination.InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    user_votes = voted.voted_contestant_ids(request.user, [c.id for c in contestants])
+    return JsonResponse({
+        'success': True,
+        'contestants': [
+            {
+                'id': c.id,
+                'username': c.user.username,
+                'profile_photo': c.user.profile_photo.url if c.user.profile_photo else None,
+                'title': c.title,
+                'arena': f'{c.arena.get_tier_display()} Arena',
+                'votes': c.votes,
+                'trending': round(trending.heat(c.trending_score), 3),
+                'has_voted': c.id in user_votes,
+            }
+            for c in contestants
+        ],
+        'next_cursor': next_cursor,
+    })
+
+async def live_standings(request, channel):
+    """Server-Sent Events stream of vote count and rank changes for an arena (or 'all')"""
+    channel = live.parse_channel(channel)
+    if channel is None or (channel != live.ALL and await sync_to_async(arena_catalog.get_arena)(channel) is None):
+        raise Http404('No such arena')
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be tied up for as long as the page stays open
+        return HttpResponse('Live updates need the ASGI server.', status=503, content_type='text/plain')
+    
+    response = StreamingHttpResponse(live.stream(channel), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
 def howitworks_view(request):
     return render(request, "how-it-works.html")
 
 def finaleroyale_view(request):
-    return render(request, "finale-royale.html")
+    """Display the Finale Royale qualifiers stored by `manage.py compute_finale`"""
+    try:
+        season = int(request.GET['season'])
+    except (KeyError, ValueError):
+        season = finale.latest_season()
+    
+    qualifiers = finale.qualifier_board(season) if season else []
+    context = {
+        'season': season,
+        'qualifiers': qualifiers,
+        'arena_winners': [q for q in qualifiers if q.place == 1],
+        'total_votes': sum(q.votes for q in qualifiers),
+        'computed_at': qualifiers[0].computed_at if qualifiers else None,
+    }
+    return render(request, "finale-royale.html", context)
 
 @login_required(login_url='/login')
 def profile_view(request):
@@ -198,280 +310,37 @@ def profile_view(request):
     delete_form = DeleteAccountForm(request.user)
     email_change_form = EmailChangeForm(request.user)
     
-    # Calculate real stats
-    user_contestants = Contestant.objects.filter(user=request.user, is_active=True)
-    total_votes_received = sum(c.votes for c in user_contestants)
-    total_competitions = user_contestants.count()
+    # Stats header (maintained on write, see accounts/stats.py)
+    user_stats = stats.get_user_stats(request.user)
+    total_votes_received = user_stats.total_votes
+    total_competitions = user_stats.total_competitions
+    wins = user_stats.wins
+    highest_tier_arena = user_stats.highest_tier_arena
     
-    # Calculate wins (top 3 in any arena)
-    wins = 0
-    for contestant in user_contestants:
-        arena_contestants = Contestant.objects.filter(arena=contestant.arena, is_active=True).order_by('-votes')
-        top_3 = list(arena_contestants[:3])
-        if contestant in top_3:
-            wins += 1
+    # Get user's submissions (contestants) with their current ranks in one query
+    user_contestants = Contestant.objects.filter(user=request.user, is_active=True).select_related('arena')
+    user_submissions = [
+        {'contestant': contestant, 'rank': contestant.rank}
+        for contestant in ranking.with_rank(user_contestants.order_by('-created_at'))
+    ]
     
     # Calculate rank (average rank across all arenas)
-    total_rank = 0
-    rank_count = 0
-    for contestant in user_contestants:
-        arena_contestants = Contestant.objects.filter(arena=contestant.arena, is_active=True).order_by('-votes')
-        ranked_list = list(arena_contestants)
-        if contestant in ranked_list:
-            rank = ranked_list.index(contestant) + 1
-            total_rank += rank
-            rank_count += 1
-    
-    avg_rank = int(total_rank / rank_count) if rank_count > 0 else 0
-    
-    # Get user's highest tier arena
-    highest_tier_arena = None
-    tier_order = {'elite': 4, 'champion': 3, 'veteran': 2, 'recruit': 1}
-    for contestant in user_contestants:
-        if highest_tier_arena is None or tier_order.get(contestant.arena.tier, 0) > tier_order.get(highest_tier_arena.tier, 0):
-            highest_tier_arena = contestant.arena
-    
-    # Get user's submissions (contestants) with ranks
-    user_submissions = []
-    for contestant in user_contestants.order_by('-created_at'):
-        arena_contestants = list(Contestant.objects.filter(arena=contestant.arena, is_active=True).order_by('-votes'))
-        rank = arena_contestants.index(contestant) + 1 if contestant in arena_contestants else 0
-        user_submissions.append({
-            'contestant': contestant,
-            'rank': rank
-        })
+    avg_rank = int(sum(s['rank'] for s in user_submissions) / len(user_submissions)) if user_submissions else 0
     
-    # Build recent activity list from real data
-    recent_activities = []
-    
-    # 1. Contestant submissions
-    for contestant in user_contestants.order_by('-created_at')[:5]:
-        submission_type = 'video' if contestant.video_url or contestant.video_file else 'image'
-        recent_activities.append({
-            'type': 'submission',
-            'date': contestant.created_at,
-            'icon': '📹' if submission_type == 'video' else '🖼️',
-            'message': f'Submitted {submission_type} to {contestant.arena.name}',
-            'contestant': contestant
-        })
+    # Recent activity (written as events happen, see accounts/activity.py)
+    recent_activities, activity_cursor = activity.activity_page(request.user)
     
-    # 2. Votes received (get votes on user's contestants)
-    user_contestant_ids = [c.id for c in user_contestants]
-    votes_received = Vote.objects.filter(contestant_id__in=user_contestant_ids).order_by('-created_at')[:5]
-    for vote in votes_received:
-        recent_activities.append({
-            'type': 'vote',
-            'date': vote.created_at,
-            'icon': '👍',
-            'message': f'Received a vote on "{vote.contestant.title}"',
-            'contestant': vote.contestant
-        })
+    # Achievements (awarded as events happen, see accounts/achievements.py)
+    user_achievements = achievements.achievements_for(request.user)
     
-    # 3. Token purchases
-    completed_payments = Payment.objects.filter(user=request.user, status='completed').order_by('-completed_at')[:5]
-    for payment in completed_payments:
-        recent_activities.append({
-            'type': 'purchase',
-            'date': payment.completed_at or payment.created_at,
-            'icon': '🪙',
-            'message': f'Purchased {payment.tokens} tokens',
-            'amount': payment.amount
-        })
+    # Finale Royale eligibility (if in top 3 of any arena)
+    finale_eligible = wins > 0
     
-    # 4. Wins/Top placements (check current rankings for top 3 placements)
-    # Only add wins if they're currently in top 3
-    for contestant in user_contestants:
-        arena_contestants = list(Contestant.objects.filter(arena=contestant.arena, is_active=True).order_by('-votes'))
-        if contestant in arena_contestants:
-            rank = arena_contestants.index(contestant) + 1
-            if rank <= 3:
-                # Use the most recent vote date if available, otherwise use submission date
-                latest_vote = Vote.objects.filter(contestant=contestant).order_by('-created_at').first()
-                win_date = latest_vote.created_at if latest_vote else contestant.created_at
-                
-                if rank == 1:
-                    recent_activities.append({
-                        'type': 'win',
-                        'date': win_date,
-                        'icon': '🏆',
-                        'message': f'Won {contestant.arena.name} (1st place)',
-                        'contestant': contestant
-                    })
-                elif rank == 2:
-                    recent_activities.append({
-                        'type': 'win',
-                        'date': win_date,
-                        'icon': '🥈',
-                        'message': f'Placed 2nd in {contestant.arena.name}',
-                        'contestant': contestant
-                    })
-                elif rank == 3:
-                    recent_activities.append({
-                        'type': 'win',
-                        'date': win_date,
-                        'icon': '🥉',
-                        'message': f'Placed 3rd in {contestant.arena.name}',
-                        'contestant': contestant
-                    })
-    
-    # 5. Tier achievements (when they first reached each tier)
-    tier_achievements = {}
-    for contestant in user_contestants.order_by('created_at'):
-        tier = contestant.arena.tier
-        if tier not in tier_achievements:
-            tier_names = {
-                'recruit': 'Recruit',
-                'veteran': 'Veteran',
-                'champion': 'Champion',
-                'elite': 'Elite'
-            }
-            tier_icons = {
-                'recruit': '🎖️',
-                'veteran': '🥈',
-                'champion': '🥇',
-                'elite': '🏆'
-            }
-            recent_activities.append({
-                'type': 'tier',
-                'date': contestant.created_at,
-                'icon': tier_icons.get(tier, '⭐'),
-                'message': f'Reached {tier_names.get(tier, tier)} tier',
-                'tier': tier
-            })
-            tier_achievements[tier] = True
-    
-    # Sort activities by date (most recent first) and limit to 10
-    recent_activities.sort(key=lambda x: x['date'], reverse=True)
-    recent_activities = recent_activities[:10]
-    
-    # Calculate achievements
-    achievements = []
+    # Calculate next goal and progress (rank in the Elite arena comes from the submissions above)
+    elite_rank = 0
     if highest_tier_arena and highest_tier_arena.tier == 'elite':
-        achievements.append({'name': 'Elite Competitor', 'description': 'Reached Elite tier', 'earned': True, 'icon': '🏆'})
-    elif highest_tier_arena and highest_tier_arena.tier == 'champion':
-        achievements.append({'name': 'Champion Competitor', 'description': 'Reached Champion tier', 'earned': True, 'icon': '🥇'})
-    elif highest_tier_arena and highest_tier_arena.tier == 'veteran':
-        achievements.append({'name': 'Veteran Competitor', 'description': 'Reached Veteran tier', 'earned': True, 'icon': '🥈'})
-    elif highest_tier_arena and highest_tier_arena.tier == 'recruit':
-        achievements.append({'name': 'Recruit Competitor', 'description': 'Reached Recruit tier', 'earned': True, 'icon': '🎖️'})
-    
-    if avg_rank > 0 and avg_rank <= 10:
-        achievements.append({'name': 'Top Performer', 'description': f'Placed in top 10 (Rank #{avg_rank})', 'earned': True, 'icon': '⭐'})
-    
-    if wins > 0:
-        achievements.append({'name': 'Winner', 'description': f'Won {wins} competition(s)', 'earned': True, 'icon': '👑'})
-    
-    # Finale Royale achievement (if in top 3)
-    finale_eligible = False
-    for contestant in user_contestants:
-        arena_contestants = Contestant.objects.filter(arena=contestant.arena, is_active=True).order_by('-votes')
-        top_3 = list(arena_contestants[:3])
-        if contestant in top_3:
-            finale_eligible = True
-            break
-    
-    if finale_eligible:
-        achievements.append({'name': 'Finale Royale', 'description': 'Eligible for year-end tournament', 'earned': True, 'icon': '👑'})
-    else:
-        achievements.append({'name': 'Finale Royale', 'description': 'Enter year-end tournament', 'earned': False, 'icon': '👑'})
-    
-    # Calculate next goal and progress
-    next_goal = None
-    goal_progress = 0
-    
-    if total_competitions == 0:
-        # First goal: Make first submission
-        next_goal = {
-            'title': 'Make Your First Submission',
-            'description': 'Join an arena and submit your talent',
-            'progress': 0,
-            'target': 1,
-            'current': 0
-        }
-    elif not highest_tier_arena:
-        # Goal: Join any arena
-        next_goal = {
-            'title': 'Join Your First Arena',
-            'description': 'Enter a competition to start competing',
-            'progress': 0,
-            'target': 1,
-            'current': 0
-        }
-    elif highest_tier_arena.tier == 'recruit':
-        # Goal: Reach Veteran tier
-        next_goal = {
-            'title': 'Reach Veteran Tier',
-            'description': 'Join a Veteran tier arena to advance',
-            'progress': 25,
-            'target': 1,
-            'current': 0
-        }
-    elif highest_tier_arena.tier == 'veteran':
-        # Goal: Reach Champion tier
-        next_goal = {
-            'title': 'Reach Champion Tier',
-            'description': 'Join a Champion tier arena to advance',
-            'progress': 50,
-            'target': 1,
-            'current': 0
-        }
-    elif highest_tier_arena.tier == 'champion':
-        # Goal: Reach Elite tier
-        next_goal = {
-            'title': 'Reach Elite Tier',
-            'description': 'Join an Elite tier arena to unlock Finale Royale',
-            'progress': 75,
-            'target': 1,
-            'current': 0
-        }
-    elif highest_tier_arena.tier == 'elite':
-        # Goal: Reach Finale Royale (top 3 in Elite)
-        if finale_eligible:
-            next_goal = {
-                'title': 'Finale Royale Qualified!',
-                'description': 'You\'ve qualified for the year-end tournament',
-                'progress': 100,
-                'target': 1,
-                'current': 1
-            }
-        else:
-            # Calculate progress based on rank in Elite arena
-            elite_contestants = Contestant.objects.filter(arena=highest_tier_arena, is_active=True).order_by('-votes')
-            elite_ranked = list(elite_contestants)
-            user_elite_contestant = None
-            for contestant in user_contestants:
-                if contestant.arena == highest_tier_arena:
-                    user_elite_contestant = contestant
-                    break
-            
-            if user_elite_contestant and user_elite_contestant in elite_ranked:
-                current_rank = elite_ranked.index(user_elite_contestant) + 1
-                # Progress: closer to top 3 = higher percentage
-                # If rank 4-10, show progress based on how close to top 3
-                if current_rank <= 3:
-                    progress = 100
-                elif current_rank <= 10:
-                    # Progress from 50% (rank 10) to 99% (rank 4)
-                    progress = 100 - ((current_rank - 3) * 7)
-                else:
-                    # Progress from 0% to 50% for ranks 11+
-                    progress = max(0, 50 - ((current_rank - 10) * 5))
-                
-                next_goal = {
-                    'title': 'Reach Finale Royale',
-                    'description': f'Place in top 3 (Currently rank #{current_rank})',
-                    'progress': progress,
-                    'target': 3,
-                    'current': current_rank
-                }
-            else:
-                next_goal = {
-                    'title': 'Reach Finale Royale',
-                    'description': 'Place in top 3 in Elite tier to qualify',
-                    'progress': 0,
-                    'target': 3,
-                    'current': 0
-                }
+        elite_rank = next((s['rank'] for s in user_submissions if s['contestant'].arena_id == highest_tier_arena.id), 0)
+    next_goal = achievements.next_goal(highest_tier_arena, total_competitions, finale_eligible, elite_rank)
     
     if request.method == 'POST':
         if 'change_email' in request.POST:
@@ -488,18 +357,10 @@ def profile_view(request):
                 user.email_confirmed = False
                 user.save()
                 
-                # Invalidate all old tokens
-                EmailConfirmationToken.objects.filter(user=user, used=False).update(used=True)
-                
-                # Create new confirmation token
-                confirmation_token = EmailConfirmationToken.objects.create(
-                    user=user,
-                    token_type='email_change'
-                )
-                
-                # Build confirmation URL and code
-                confirmation_url = request.build_absolute_uri(f'/confirm-email/{confirmation_token.token}/')
-                confirmation_code = str(confirmation_token.token).replace('-', '').upper()[:8]
+                # Build confirmation URL and code (links sent to the old address stop working now the email changed)
+                uidb64, token = email_tokens.make_link(user, email_tokens.email_confirmation_tokens)
+                confirmation_url = request.build_absolute_uri(reverse('confirm_email', args=[uidb64, token]))
+                confirmation_code = email_tokens.display_code(token)
                 
                 # Send confirmation email to NEW email address
                 try:
@@ -511,7 +372,8 @@ def profile_view(request):
                         'new_email': new_email,
                     })
                     
-                    send_mail(
+                    send_mail_with_metrics(
+                        'email_change',
                         'Confirm Your New Email - Talents Royale',
                         f'Hello {user.username},\n\nYour email has been changed to {new_email}.\n\nPlease confirm this new email address by visiting: {confirmation_url}\n\nOr use this code: {confirmation_code}\n\nYou must confirm this email before you can log in again.',
                         settings.DEFAULT_FROM_EMAIL,
@@ -539,7 +401,7 @@ def profile_view(request):
                 messages.error(request, 'Please correct the errors below.')
         
         elif 'update_settings' in request.POST:
-            settings_form = UserSettingsForm(request.POST, request.FILES, instance=request.user)
+            settings_form = UserSettingsForm(request.POST, request.FILES, instance=request.user, upload_user=request.user)
             if settings_form.is_valid():
                 # Just save profile fields (username, bio, photo) - no email handling
                 user = settings_form.save()
@@ -564,7 +426,8 @@ def profile_view(request):
             if delete_form.is_valid():
                 # Send goodbye email before deletion
                 try:
-                    send_mail(
+                    send_mail_with_metrics(
+                        'account_deleted',
                         'Account Deleted - Talents Royale',
                         f'Hello {request.user.username},\n\nYour Talents Royale account has been successfully deleted.\n\nWe\'re sorry to see you go! If you change your mind, you\'re always welcome to create a new account.\n\nBest regards,\nThe Talents Royale Team',
                         settings.DEFAULT_FROM_EMAIL,
@@ -593,9 +456,10 @@ def profile_view(request):
         'avg_rank': avg_rank,
         'highest_tier_arena': highest_tier_arena,
         'user_submissions': user_submissions,
-        'achievements': achievements,
+        'achievements': user_achievements,
         'next_goal': next_goal,
         'recent_activities': recent_activities,
+        'activity_cursor': activity_cursor,
     }
     
     return render(request, "profile.html", context)
@@ -615,17 +479,9 @@ def signin_view(request):
                 user = CustomUser.objects.get(username=username)
                 if not user.email_confirmed:
                     try:
-                        # Invalidate old tokens
-                        EmailConfirmationToken.objects.filter(user=user, token_type='registration', used=False).update(used=True)
-                        
-                        # Create new confirmation token
-                        confirmation_token = EmailConfirmationToken.objects.create(
-                            user=user,
-                            token_type='registration'
-                        )
-                        
-                        confirmation_code = str(confirmation_token.token).replace('-', '').upper()[:8]
-                        confirmation_url = request.build_absolute_uri(f'/confirm-email/{confirmation_token.token}/')
+                        uidb64, token = email_tokens.make_link(user, email_tokens.email_confirmation_tokens)
+                        confirmation_code = email_tokens.display_code(token)
+                        confirmation_url = request.build_absolute_uri(reverse('confirm_email', args=[uidb64, token]))
                         
                         email_html = render_to_string('emails/email_confirmation.html', {
                             'username': user.username,
@@ -634,7 +490,8 @@ def signin_view(request):
                             'token_type': 'registration',
                         })
                         
-                        send_mail(
+                        send_mail_with_metrics(
+                            'registration',
                             'Confirm Your Email - Talents Royale',
                             f'Hello {user.username},\n\nPlease confirm your email by visiting: {confirmation_url}\n\nOr use this code: {confirmation_code}',
                             settings.DEFAULT_FROM_EMAIL,
@@ -666,17 +523,9 @@ def signin_view(request):
                 messages.warning(request, 'Please confirm your email address before logging in. A confirmation email has been sent to your inbox.')
                 # Automatically resend confirmation email
                 try:
-                    # Invalidate old tokens
-                    EmailConfirmationToken.objects.filter(user=user, token_type='registration', used=False).update(used=True)
-                    
-                    # Create new confirmation token
-                    confirmation_token = EmailConfirmationToken.objects.create(
-                        user=user,
-                        token_type='registration'
-                    )
-                    
-                    confirmation_code = str(confirmation_token.token).replace('-', '').upper()[:8]
-                    confirmation_url = request.build_absolute_uri(f'/confirm-email/{confirmation_token.token}/')
+                    uidb64, token = email_tokens.make_link(user, email_tokens.email_confirmation_tokens)
+                    confirmation_code = email_tokens.display_code(token)
+                    confirmation_url = request.build_absolute_uri(reverse('confirm_email', args=[uidb64, token]))
                     
                     email_html = render_to_string('emails/email_confirmation.html', {
                         'username': user.username,
@@ -685,7 +534,8 @@ def signin_view(request):
                         'token_type': 'registration',
                     })
                     
-                    send_mail(
+                    send_mail_with_metrics(
+                        'registration',
                         'Confirm Your Email - Talents Royale',
                         f'Hello {user.username},\n\nPlease confirm your email by visiting: {confirmation_url}\n\nOr use this code: {confirmation_code}',
                         settings.DEFAULT_FROM_EMAIL,
@@ -724,17 +574,14 @@ def signup_view(request):
             user.save()
             
             # Create confirmation token
-            confirmation_token = EmailConfirmationToken.objects.create(
-                user=user,
-                token_type='registration'
-            )
+            uidb64, token = email_tokens.make_link(user, email_tokens.email_confirmation_tokens)
             
-            # Generate confirmation code (first 8 characters of UUID)
-            confirmation_code = str(confirmation_token.token).replace('-', '').upper()[:8]
+            # Generate confirmation code (first 8 characters of the signature)
+            confirmation_code = email_tokens.display_code(token)
             
             # Build confirmation URL
             confirmation_url = request.build_absolute_uri(
-                f'/confirm-email/{confirmation_token.token}/'
+                reverse('confirm_email', args=[uidb64, token])
             )
             
             # Send confirmation email
@@ -747,7 +594,8 @@ def signup_view(request):
                     'token_type': 'registration',
                 })
                 
-                send_mail(
+                send_mail_with_metrics(
+                    'registration',
                     email_subject,
                     f'Hello {user.username},\n\nPlease confirm your email by visiting: {confirmation_url}\n\nOr use this code: {confirmation_code}\n\nThis link expires in 24 hours.',
                     settings.DEFAULT_FROM_EMAIL,
@@ -773,8 +621,22 @@ def signup_view(request):
     
     return render(request, "signup.html", {'form': form})
 
-def confirm_email(request, token):
-    """Handle email confirmation via token"""
+def confirm_email(request, uidb64, token):
+    """Handle email confirmation via signed link"""
+    user = email_tokens.get_user(uidb64, token, email_tokens.email_confirmation_tokens)
+    if user is None:
+        messages.error(request, 'Invalid or expired confirmation link. Please request a new one.')
+        return redirect('login')
+    
+    # Confirming changes the signed state, so the link can't be used twice
+    user.email_confirmed = True
+    user.save(update_fields=['email_confirmed'])
+    
+    messages.success(request, 'Email confirmed successfully! You can now log in.')
+    return redirect('login')
+
+def confirm_email_legacy(request, token):
+    """Handle email confirmation via a token row issued before signed links"""
     try:
         confirmation_token = get_object_or_404(EmailConfirmationToken, token=token, used=False)
         
@@ -812,26 +674,18 @@ def confirm_email(request, token):
     return redirect('home')
 
 @login_required
-def resend_confirmation(request):
+async def resend_confirmation(request):
     """Resend email confirmation"""
-    user = request.user
+    user = await request.auser()
     
     if user.email_confirmed:
         messages.info(request, 'Your email is already confirmed.')
         return redirect('profile')
     
     try:
-        # Invalidate old tokens
-        EmailConfirmationToken.objects.filter(user=user, token_type='registration', used=False).update(used=True)
-        
-        # Create new confirmation token
-        confirmation_token = EmailConfirmationToken.objects.create(
-            user=user,
-            token_type='registration'
-        )
-        
-        confirmation_code = str(confirmation_token.token).replace('-', '').upper()[:8]
-        confirmation_url = request.build_absolute_uri(f'/confirm-email/{confirmation_token.token}/')
+        uidb64, token = email_tokens.make_link(user, email_tokens.email_confirmation_tokens)
+        confirmation_code = email_tokens.display_code(token)
+        confirmation_url = request.build_absolute_uri(reverse('confirm_email', args=[uidb64, token]))
         
         email_html = render_to_string('emails/email_confirmation.html', {
             'username': user.username,
@@ -840,7 +694,8 @@ def resend_confirmation(request):
             'token_type': 'registration',
         })
         
-        send_mail(
+        await asend_mail_with_metrics(
+            'registration',
             'Confirm Your Email - Talents Royale',
             f'Hello {user.username},\n\nPlease confirm your email by visiting: {confirmation_url}\n\nOr use this code: {confirmation_code}',
             settings.DEFAULT_FROM_EMAIL,
@@ -862,34 +717,25 @@ def logout_view(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('home')
 
-def forgot_password_view(request):
+async def forgot_password_view(request):
     """Handle forgot password requests"""
-    if request.user.is_authenticated:
+    if (await request.auser()).is_authenticated:
         return redirect('profile')
     
     if request.method == 'POST':
         form = ForgotPasswordForm(request.POST)
-        if form.is_valid():
+        # Form validation queries the database
+        if await sync_to_async(form.is_valid)():
             email = form.cleaned_data.get('email')
             try:
                 # Find user by email (case-insensitive)
-                user = CustomUser.objects.get(email__iexact=email)
-                
-                # Invalidate any existing password reset tokens
-                EmailConfirmationToken.objects.filter(
-                    user=user,
-                    token_type='password_reset',
-                    used=False
-                ).update(used=True)
+                user = await CustomUser.objects.aget(email__iexact=email)
                 
-                # Create new password reset token
-                reset_token = EmailConfirmationToken.objects.create(
-                    user=user,
-                    token_type='password_reset'
-                )
+                # Create password reset token (earlier ones stay valid until the password changes)
+                uidb64, token = email_tokens.make_link(user, email_tokens.password_reset_tokens)
                 
-                reset_url = request.build_absolute_uri(f'/reset-password/{reset_token.token}/')
-                reset_code = str(reset_token.token).replace('-', '').upper()[:8]
+                reset_url = request.build_absolute_uri(reverse('reset_password', args=[uidb64, token]))
+                reset_code = email_tokens.display_code(token)
                 
                 # Send password reset email
                 try:
@@ -899,7 +745,8 @@ def forgot_password_view(request):
                         'reset_code': reset_code,
                     })
                     
-                    send_mail(
+                    await asend_mail_with_metrics(
+                        'password_reset',
                         'Reset Your Password - Talents Royale',
                         f'Hello {user.username},\n\nYou requested to reset your password. Click the link below to reset it:\n\n{reset_url}\n\nOr use this code: {reset_code}\n\nThis link will expire in 24 hours. If you didn\'t request this, please ignore this email.',
                         settings.DEFAULT_FROM_EMAIL,
@@ -922,10 +769,34 @@ def forgot_password_view(request):
     else:
         form = ForgotPasswordForm()
     
-    return render(request, 'forgot_password.html', {'form': form})
+    return await arender(request, 'forgot_password.html', {'form': form})
 
-def reset_password_view(request, token):
-    """Handle password reset with token"""
+def reset_password_view(request, uidb64, token):
+    """Handle password reset with a signed link"""
+    if request.user.is_authenticated:
+        return redirect('profile')
+    
+    user = email_tokens.get_user(uidb64, token, email_tokens.password_reset_tokens)
+    if user is None:
+        messages.error(request, 'Invalid or expired password reset link. Please request a new one.')
+        return redirect('forgot_password')
+    
+    if request.method == 'POST':
+        form = ResetPasswordForm(request.POST)
+        if form.is_valid():
+            # Changing the password hash invalidates every reset link sent so far
+            user.set_password(form.cleaned_data.get('new_password1'))
+            user.save()
+            
+            messages.success(request, 'Your password has been reset successfully. You can now log in with your new password.')
+            return redirect('login')
+    else:
+        form = ResetPasswordForm()
+    
+    return render(request, 'reset_password.html', {'form': form, 'token': token})
+
+def reset_password_legacy_view(request, token):
+    """Handle password reset with a token row issued before signed links"""
     if request.user.is_authenticated:
         return redirect('profile')
     
@@ -966,6 +837,57 @@ def reset_password_view(request, token):
         messages.error(request, 'Invalid or expired password reset link. Please request a new one.')
         return redirect('forgot_password')
 
+def cast_vote(user, contestant, use_tokens):
+    """Record a vote (free, or a paid extra vote) and return the JSON response data"""
+    # Check if user already voted
+    existing_vote = Vote.objects.filter(user=user, contestant=contestant).first()
+    
+    if existing_vote:
+        if not use_tokens:
+            return {'success': False, 'message': 'You have already voted for this contestant. Use tokens to vote again.'}
+        # User wants to vote again with tokens
+        token_cost = 5  # Cost for additional vote
+        if user.tokens < token_cost:
+            return {'success': False, 'message': f'Insufficient tokens. You need {token_cost} tokens.'}
+        
+        # Deduct tokens and add vote
+        with transaction.atomic():
+            user.tokens -= token_cost
+            user.save()
+            ranking.record_vote(contestant, user, is_free_vote=False, tokens_spent=token_cost)
+            TokenTransaction.objects.create(
+                user=user,
+                transaction_type='vote',
+                amount=-token_cost,
+                description=f'Additional vote for {contestant.user.username}',
+                related_contestant=contestant
+            )
+        metrics.votes_cast.inc(kind='paid')
+        return {
+            'success': True, 
+            'message': 'Vote cast successfully!',
+            'new_votes': contestant.votes,
+            'remaining_tokens': user.tokens
+        }
+    
+    # First vote is free
+    with transaction.atomic():
+        vote = Vote.objects.create(
+            user=user,
+            contestant=contestant,
+            is_free_vote=True,
+            tokens_spent=0
+        )
+        ranking.record_vote(contestant, user, is_free_vote=True)
+    metrics.votes_cast.inc(kind='free')
+    
+    return {
+        'success': True, 
+        'message': 'Free vote cast successfully!',
+        'new_votes': contestant.votes,
+        'remaining_tokens': user.tokens
+    }
+
 @login_required
 @require_POST
 def vote_contestant(request):
@@ -975,57 +897,8 @@ def vote_contestant(request):
         contestant_id = data.get('contestant_id')
         use_tokens = data.get('use_tokens', False)  # If True, spend tokens for extra vote
         
-        contestant = get_object_or_404(Contestant, id=contestant_id, is_active=True)
-        user = request.user
-        
-        # Check if user already voted
-        existing_vote = Vote.objects.filter(user=user, contestant=contestant).first()
-        
-        if existing_vote:
-            if not use_tokens:
-                return JsonResponse({'success': False, 'message': 'You have already voted for this contestant. Use tokens to vote again.'})
-            # User wants to vote again with tokens
-            token_cost = 5  # Cost for additional vote
-            if user.tokens < token_cost:
-                return JsonResponse({'success': False, 'message': f'Insufficient tokens. You need {token_cost} tokens.'})
-            
-            # Deduct tokens and add vote
-            with transaction.atomic():
-                user.tokens -= token_cost
-                user.save()
-                contestant.votes += 1
-                contestant.save()
-                TokenTransaction.objects.create(
-                    user=user,
-                    transaction_type='vote',
-                    amount=-token_cost,
-                    description=f'Additional vote for {contestant.user.username}',
-                    related_contestant=contestant
-                )
-            return JsonResponse({
-                'success': True, 
-                'message': 'Vote cast successfully!',
-                'new_votes': contestant.votes,
-                'remaining_tokens': user.tokens
-            })
-        else:
-            # First vote is free
-            with transaction.atomic():
-                vote = Vote.objects.create(
-                    user=user,
-                    contestant=contestant,
-                    is_free_vote=True,
-                    tokens_spent=0
-                )
-                contestant.votes += 1
-                contestant.save()
-            
-            return JsonResponse({
-                'success': True, 
-                'message': 'Free vote cast successfully!',
-                'new_votes': contestant.votes,
-                'remaining_tokens': user.tokens
-            })
+        contestant = get_object_or_404(Contestant.objects.select_related('user'), id=contestant_id, is_active=True)
+        return JsonResponse(cast_vote(request.user, contestant, use_tokens))
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)})
 
@@ -1047,33 +920,41 @@ def submit_entry(request, arena_id):
         return redirect('arenas')
     
     # Check if arena is full
-    current_participants = Contestant.objects.filter(arena=arena, is_active=True).count()
-    if current_participants >= arena.max_participants:
+    if not capacity.has_free_seat(arena):
         messages.error(request, 'This arena is full.')
         return redirect('arenas')
     
     if request.method == 'POST':
-        form = ContestantSubmissionForm(request.POST, request.FILES)
+        form = ContestantSubmissionForm(request.POST, request.FILES, upload_user=user)
         if form.is_valid():
-            # Deduct tokens and create contestant entry
-            with transaction.atomic():
-                user.tokens -= arena.token_cost
-                user.save()
-                
-                contestant = form.save(commit=False)
-                contestant.user = user
-                contestant.arena = arena
-                contestant.votes = 0
-                contestant.save()
-                
-                TokenTransaction.objects.create(
-                    user=user,
-                    transaction_type='arena_entry',
-                    amount=-arena.token_cost,
-                    description=f'Joined {arena.name}',
-                    related_arena=arena,
-                    related_contestant=contestant
-                )
+            # Deduct tokens and create contestant entry (saving it takes a seat in the arena)
+            try:
+                with transaction.atomic():
+                    user.tokens -= arena.token_cost
+                    user.save()
+                    
+                    contestant = form.save(commit=False)
+                    contestant.user = user
+                    contestant.arena = arena
+                    contestant.votes = 0
+                    contestant.save()
+                    if form.fingerprint is not None:
+                        fingerprints.store(contestant, form.fingerprint)
+                    
+                    TokenTransaction.objects.create(
+                        user=user,
+                        transaction_type='arena_entry',
+                        amount=-arena.token_cost,
+                        description=f'Joined {arena.name}',
+                        related_arena=arena,
+                        related_contestant=contestant
+                    )
+            except capacity.ArenaFull:
+                # Someone else took the last seat after the check above
+                user.refresh_from_db(fields=['tokens'])
+                messages.error(request, 'This arena is full.')
+                return redirect('arenas')
+            metrics.arena_entries.inc(tier=arena.tier)
             
             messages.success(request, f'Successfully submitted your entry to {arena.name}!')
             return redirect('contestants')
@@ -1112,8 +993,7 @@ def join_arena(request):
             })
         
         # Check if arena is full
-        current_participants = Contestant.objects.filter(arena=arena, is_active=True).count()
-        if current_participants >= arena.max_participants:
+        if not capacity.has_free_seat(arena):
             return JsonResponse({'success': False, 'message': 'This arena is full.'})
         
         # Redirect to submission page
@@ -1126,33 +1006,116 @@ def join_arena(request):
 
 def contestant_detail(request, contestant_id):
     """Display detailed view of a contestant's submission"""
-    contestant = get_object_or_404(Contestant, id=contestant_id, is_active=True)
+    contestant = get_object_or_404(Contestant.objects.select_related('user', 'arena'), id=contestant_id, is_active=True)
     
     user_tokens = request.user.tokens if request.user.is_authenticated else 0
     has_voted = False
     if request.user.is_authenticated:
         has_voted = Vote.objects.filter(user=request.user, contestant=contestant).exists()
     
+    # Votes per hour over the last two days (from the hourly rollups)
+    series = rollups.contestant_series(contestant.id)
+    
     context = {
         'contestant': contestant,
         'user_tokens': user_tokens,
         'has_voted': has_voted,
+        'recent_votes': sum(free + paid for _, free, paid, _ in series),
+        'sparkline_hours': rollups.SPARKLINE_HOURS,
+        'sparkline_points': rollups.sparkline_points([free + paid for _, free, paid, _ in series]),
     }
     return render(request, 'contestant_detail.html', context)
 
+def contestant_vote_history(request, contestant_id):
+    """Return a contestant's votes per hour as JSON (for charts)"""
+    contestant = get_object_or_404(Contestant, id=contestant_id, is_active=True)
+    try:
+        hours = min(max(int(request.GET.get('hours', rollups.SPARKLINE_HOURS)), 1), 24 * 90)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'hours must be a number.'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'contestant_id': contestant.id,
+        'hours': [
+            {'hour': hour.isoformat(), 'free_votes': free, 'paid_votes': paid, 'tokens_spent': tokens}
+            for hour, free, paid, tokens in rollups.contestant_series(contestant.id, hours)
+        ],
+    })
+
+VOTE_HISTORY_ORDERING = ('-created_at', '-id')
+VOTE_HISTORY_PAGE_SIZE = 20
+
+def vote_history_page(user, cursor=None, page_size=VOTE_HISTORY_PAGE_SIZE):
+    """Return (votes, next_cursor) for a page of the user's votes, newest first"""
+    votes = Vote.objects.filter(user=user).select_related('contestant__user', 'contestant__arena').only(
+        'id', 'created_at', 'is_free_vote', 'tokens_spent',
+        'contestant__id', 'contestant__title',
+        'contestant__user__username', 'contestant__user__profile_photo',
+        'contestant__arena__tier',
+    )
+    return pagination.paginate(votes, VOTE_HISTORY_ORDERING, cursor, page_size)
+
 @login_required
 def voting_history(request):
     """Display user's voting history"""
-    votes = Vote.objects.filter(user=request.user).select_related('contestant', 'contestant__user', 'contestant__arena').order_by('-created_at')
+    votes, next_cursor = vote_history_page(request.user)
+    
+    # All three totals in one pass over the user's votes
+    totals = Vote.objects.filter(user=request.user).aggregate(
+        total_votes=Count('id'),
+        free_votes=Count('id', filter=Q(is_free_vote=True)),
+        paid_votes=Count('id', filter=Q(is_free_vote=False)),
+    )
     
     context = {
         'votes': votes,
-        'total_votes': votes.count(),
-        'free_votes': votes.filter(is_free_vote=True).count(),
-        'paid_votes': votes.filter(is_free_vote=False).count(),
+        'next_cursor': next_cursor,
+        **totals,
     }
     return render(request, 'voting_history.html', context)
 
+@login_required
+def voting_history_feed(request):
+    """Return the next page of the user's voting history as JSON (for infinite scroll)"""
+    try:
+        votes, next_cursor = vote_history_page(request.user, request.GET.get('cursor'))
+    except pagination.InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'votes': [
+            {
+                'contestant_id': vote.contestant.id,
+                'username': vote.contestant.user.username,
+                'profile_photo': vote.contestant.user.profile_photo.url if vote.contestant.user.profile_photo else None,
+                'title': vote.contestant.title,
+                'arena': f'{vote.contestant.arena.get_tier_display()} Arena',
+                'is_free_vote': vote.is_free_vote,
+                'tokens_spent': vote.tokens_spent,
+                'date': date_format(timezone.localtime(vote.created_at), 'M d, Y'),
+                'time': date_format(timezone.localtime(vote.created_at), 'g:i A'),
+            }
+            for vote in votes
+        ],
+        'next_cursor': next_cursor,
+    })
+
+@login_required
+def activity_feed(request):
+    """Return the next page of the user's recent activity as JSON (for "load more")"""
+    try:
+        events, next_cursor = activity.activity_page(request.user, request.GET.get('cursor'))
+    except pagination.InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'activities': [activity.serialize_event(event) for event in events],
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 def purchase_tokens(request):
     """Display token packages for purchase"""
@@ -1168,7 +1131,7 @@ def purchase_tokens(request):
 
 @login_required
 @require_POST
-def create_checkout_session(request):
+async def create_checkout_session(request):
     """Create Stripe Checkout session for token purchase"""
     if not settings.STRIPE_SECRET_KEY:
         return JsonResponse({'error': 'Stripe is not configured. Please contact support.'}, status=400)
@@ -1185,11 +1148,14 @@ def create_checkout_session(request):
                 break
         
         if not package:
+            metrics.checkout_sessions.inc(status='invalid')
             return JsonResponse({'error': 'Invalid token package.'}, status=400)
         
+        user = await request.auser()
+        
         # Create payment record
-        payment = Payment.objects.create(
-            user=request.user,
+        payment = await Payment.objects.acreate(
+            user=user,
             amount=package['price'],
             tokens=tokens,
             status='pending'
@@ -1197,7 +1163,7 @@ def create_checkout_session(request):
         
         # Create Stripe Checkout session
         try:
-            checkout_session = stripe.checkout.Session.create(
+            checkout_session = await stripe.checkout.Session.create_async(
                 payment_method_types=['card'],
                 line_items=[{
                     'price_data': {
@@ -1215,30 +1181,55 @@ def create_checkout_session(request):
                 cancel_url=request.build_absolute_uri(reverse('payment_cancel')),
                 metadata={
                     'payment_id': payment.id,
-                    'user_id': request.user.id,
+                    'user_id': user.id,
                     'tokens': tokens,
                 },
-                customer_email=request.user.email,
+                customer_email=user.email,
             )
             
             # Update payment with session ID
             payment.stripe_session_id = checkout_session.id
-            payment.save()
+            await payment.asave()
+            metrics.checkout_sessions.inc(status='created')
             
             return JsonResponse({'sessionId': checkout_session.id})
             
         except stripe.error.StripeError as e:
             logger.error(f"Stripe error: {str(e)}")
             payment.status = 'failed'
-            payment.save()
+            await payment.asave()
+            metrics.checkout_sessions.inc(status='failed')
             return JsonResponse({'error': f'Payment processing error: {str(e)}'}, status=400)
             
     except Exception as e:
         logger.error(f"Error creating checkout session: {str(e)}", exc_info=True)
+        metrics.checkout_sessions.inc(status='error')
         return JsonResponse({'error': 'An error occurred. Please try again.'}, status=500)
 
+def complete_payment(payment, payment_intent_id):
+    """Mark a checkout payment completed and credit its tokens, in one transaction"""
+    with transaction.atomic():
+        payment.status = 'completed'
+        payment.completed_at = timezone.now()
+        payment.stripe_payment_intent_id = payment_intent_id
+        payment.save()
+        
+        # Add tokens to user
+        payment.user.tokens += payment.tokens
+        payment.user.save()
+        
+        # Create transaction record
+        TokenTransaction.objects.create(
+            user=payment.user,
+            transaction_type='purchase',
+            amount=payment.tokens,
+            description=f'Purchased {payment.tokens} tokens for ${payment.amount}',
+            related_payment=payment
+        )
+        activity.record_purchase(payment)
+
 @login_required
-def payment_success(request):
+async def payment_success(request):
     """Handle successful payment"""
     session_id = request.GET.get('session_id')
     
@@ -1248,10 +1239,10 @@ def payment_success(request):
     
     try:
         # Retrieve the session from Stripe
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = await stripe.checkout.Session.retrieve_async(session_id)
         
         # Find the payment
-        payment = Payment.objects.filter(stripe_session_id=session_id).first()
+        payment = await Payment.objects.select_related('user').filter(stripe_session_id=session_id).afirst()
         
         if not payment:
             messages.error(request, 'Payment record not found.')
@@ -1265,24 +1256,8 @@ def payment_success(request):
         # Verify the session is paid
         if session.payment_status == 'paid':
             # Process the payment
-            with transaction.atomic():
-                payment.status = 'completed'
-                payment.completed_at = timezone.now()
-                payment.stripe_payment_intent_id = session.payment_intent
-                payment.save()
-                
-                # Add tokens to user
-                payment.user.tokens += payment.tokens
-                payment.user.save()
-                
-                # Create transaction record
-                TokenTransaction.objects.create(
-                    user=payment.user,
-                    transaction_type='purchase',
-                    amount=payment.tokens,
-                    description=f'Purchased {payment.tokens} tokens for ${payment.amount}',
-                    related_payment=payment
-                )
+            await sync_to_async(complete_payment)(payment, session.payment_intent)
+            metrics.payments_completed.inc(source='redirect')
             
             messages.success(request, f'Payment successful! {payment.tokens} tokens have been added to your account.')
             return redirect('profile')
@@ -1310,6 +1285,7 @@ def stripe_webhook(request):
     """Handle Stripe webhook events"""
     if not settings.STRIPE_WEBHOOK_SECRET:
         logger.warning("Stripe webhook secret not configured")
+        metrics.stripe_webhook_events.inc(type='unknown', status='not_configured')
         return HttpResponse(status=400)
     
     payload = request.body
@@ -1321,18 +1297,24 @@ def stripe_webhook(request):
         )
     except ValueError:
         logger.error("Invalid payload")
+        metrics.stripe_webhook_events.inc(type='unknown', status='invalid_payload')
         return HttpResponse(status=400)
     except stripe.error.SignatureVerificationError:
         logger.error("Invalid signature")
+        metrics.stripe_webhook_events.inc(type='unknown', status='invalid_signature')
         return HttpResponse(status=400)
     
     # Handle the event
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
         handle_checkout_session(session)
+        metrics.stripe_webhook_events.inc(type=event['type'], status='handled')
     elif event['type'] == 'payment_intent.succeeded':
         payment_intent = event['data']['object']
         handle_payment_intent(payment_intent)
+        metrics.stripe_webhook_events.inc(type=event['type'], status='handled')
+    else:
+        metrics.stripe_webhook_events.inc(type='other', status='ignored')
     
     return HttpResponse(status=200)
 
@@ -1350,25 +1332,9 @@ def handle_checkout_session(session):
             return
         
         # Process the payment
-        with transaction.atomic():
-            payment.status = 'completed'
-            payment.completed_at = timezone.now()
-            payment.stripe_payment_intent_id = session.get('payment_intent')
-            payment.save()
-            
-            # Add tokens to user
-            payment.user.tokens += payment.tokens
-            payment.user.save()
-            
-            # Create transaction record
-            TokenTransaction.objects.create(
-                user=payment.user,
-                transaction_type='purchase',
-                amount=payment.tokens,
-                description=f'Purchased {payment.tokens} tokens for ${payment.amount}',
-                related_payment=payment
-            )
+        complete_payment(payment, session.get('payment_intent'))
         
+        metrics.payments_completed.inc(source='webhook')
         logger.info(f"Payment {payment.id} processed successfully via webhook")
         
     except Exception as e:
@@ -1378,3 +1344,67 @@ def handle_payment_intent(payment_intent):
     """Handle successful payment intent"""
     # This can be used for additional verification if needed
     logger.info(f"Payment intent succeeded: {payment_intent['id']}")
+
+def metrics_view(request):
+    """Expose application metrics in the Prometheus text format"""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    token_ok = bool(settings.METRICS_TOKEN) and constant_time_compare(auth_header, f'Bearer {settings.METRICS_TOKEN}')
+    if not (token_ok or request.user.is_staff or settings.DEBUG):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+def export_view(request, name):
+    """Stream votes, token transactions or payments as CSV or JSONL for staff"""
+    if not request.user.is_staff:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+
+    output_format = request.GET.get('format', 'csv')
+    try:
+        export = exports.get_export(name)
+        filters = exports.parse_filters(request.GET.get('start'), request.GET.get('end'), request.GET.get('arena'))
+        lines = exports.render(export, export.rows(**filters), output_format)
+    except exports.ExportError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+
+    logger.info(f"{request.user.username} exported {name} as {output_format} with filters {request.GET.urlencode()}")
+    if isinstance(request, ASGIRequest):
+        # Django would read a plain generator into memory before sending it under ASGI
+        lines = exports.aiter_lines(lines)
+    response = StreamingHttpResponse(lines, content_type=exports.FORMATS[output_format])
+    response['Content-Disposition'] = f'attachment; filename="{exports.filename(export, output_format, filters)}"'
+    return response
+
+
+@login_required
+@require_POST
+def direct_upload_start(request):
+    """Return a presigned URL the browser uploads a file to, and the ticket for the form"""
+    if not uploads.enabled():
+        raise Http404('Direct uploads are disabled.')
+    try:
+        data = json.loads(request.body)
+        upload = uploads.start(request.user, data.get('kind'), data.get('filename'), data.get('content_type'), data.get('size'))
+    except (ValueError, AttributeError) as e:
+        # UploadError, or a body that isn't a JSON object
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({'success': True, **upload})
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def direct_upload_put(request, ticket):
+    """Receive a direct upload for the in-process LocalBackend (S3 receives them itself)"""
+    if not uploads.enabled() or not isinstance(backend := uploads.get_backend(), uploads.LocalBackend):
+        raise Http404('Direct uploads are not handled by this server.')
+    try:
+        # The ticket is the signature: like a presigned URL, it only allows this one key and type
+        data = uploads.read_ticket(ticket, settings.DIRECT_UPLOAD_URL_EXPIRY)
+        if request.content_type != data['type']:
+            raise uploads.UploadError('Content-Type does not match the upload.')
+        backend.receive(data['key'], data['type'], request, uploads.max_size(uploads.KINDS[data['kind']]))
+    except uploads.UploadError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    return HttpResponse(status=200)
@@ -0,0 +1,121 @@
+"""Which contestants a user has voted for, for the vote buttons on listing pages.
+
+Pages only ask about the contestants they show. Users with many votes also get
+their voted contestant ids cached as a sorted array (8 bytes per vote), so their
+pages don't query Vote at all.
+
+The array is never updated in place. It is stored under the user's generation
+number, and a committed vote only bumps that number (one atomic cache.incr, no
+query), so concurrent votes can't lose each other's ids. The next page view
+rebuilds the array under the new number; an array built from a query that ran
+before a vote committed is stored under the old number and never read. Whether
+a user votes often enough (VOTED_SET_MIN_VOTES) is checked when a page finds
+no generation, and a "no" is remembered for VOTED_SET_TIMEOUT.
+
+Every worker must see the same numbers, so this needs a shared CACHES backend;
+with the per-process default (locmem) pages always query Vote.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Vote
+
+
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def enabled():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def generation_key(user_id):
+    return f'voted_set:{user_id}:generation'
+
+
+def few_votes_key(user_id):
+    return f'voted_set:{user_id}:few'
+
+
+def voted_set_key(user_id, generation):
+    return f'voted_set:{user_id}:{generation}'
+
+
+class VotedSet:
+    """Sorted contestant ids packed in an array"""
+
+    def __init__(self, ids=()):
+        self.ids = array('q', sorted(ids))
+
+    @classmethod
+    def frombytes(cls, packed):
+        voted = cls()
+        voted.ids.frombytes(packed)
+        return voted
+
+    def tobytes(self):
+        return self.ids.tobytes()
+
+    def __contains__(self, contestant_id):
+        i = bisect_left(self.ids, contestant_id)
+        return i < len(self.ids) and self.ids[i] == contestant_id
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, contestant_id):
+        i = bisect_left(self.ids, contestant_id)
+        if i == len(self.ids) or self.ids[i] != contestant_id:
+            self.ids.insert(i, contestant_id)
+
+
+def voted_contestant_ids(user, contestant_ids):
+    """Return the subset of contestant_ids the user has voted for"""
+    contestant_ids = set(contestant_ids)
+    if not user.is_authenticated or not contestant_ids:
+        return set()
+
+    voted = cached_voted_set(user.pk) if enabled() else None
+    if voted is not None:
+        return {contestant_id for contestant_id in contestant_ids if contestant_id in voted}
+
+    return set(Vote.objects.filter(user=user, contestant_id__in=contestant_ids).values_list('contestant_id', flat=True))
+
+
+def cached_voted_set(user_id):
+    """The user's VotedSet, building it if needed, or None for users with few votes"""
+    cached = cache.get_many([generation_key(user_id), few_votes_key(user_id)])
+    if few_votes_key(user_id) in cached:
+        return None
+    generation = cached.get(generation_key(user_id))
+    if generation is None:
+        if not Vote.objects.filter(user_id=user_id)[settings.VOTED_SET_MIN_VOTES - 1:].exists():
+            cache.set(few_votes_key(user_id), True, settings.VOTED_SET_TIMEOUT)
+            return None
+        # Never expires, so a number is never reused for an array still in the cache
+        cache.add(generation_key(user_id), 1, timeout=None)
+        generation = cache.get(generation_key(user_id), 1)
+
+    packed = cache.get(voted_set_key(user_id, generation))
+    if packed is not None:
+        return VotedSet.frombytes(packed)
+    return build_voted_set(user_id, generation)
+
+
+def build_voted_set(user_id, generation):
+    voted = VotedSet(Vote.objects.filter(user_id=user_id).values_list('contestant_id', flat=True))
+    cache.set(voted_set_key(user_id, generation), voted.tobytes(), settings.VOTED_SET_TIMEOUT)
+    return voted
+
+
+def forget_votes(user_id):
+    """Make the next page view rebuild the user's voted set. Call once a vote is committed."""
+    if not enabled():
+        return
+    try:
+        cache.incr(generation_key(user_id))
+    except ValueError:
+        # No cached set for this user
+        pass
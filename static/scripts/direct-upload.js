@@ -0,0 +1,63 @@
+// Upload files straight to storage (see accounts/uploads.py).
+// File inputs marked data-direct-upload="<kind>" are uploaded as soon as a file is
+// picked; the form then only sends the ticket in the hidden <field>_upload input.
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[type="file"][data-direct-upload]').forEach(function(input) {
+        const form = input.form;
+        const ticketInput = form.querySelector(`input[name="${input.name}_upload"]`);
+        const submitButton = form.querySelector('button[type="submit"]');
+        const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+        const status = document.createElement('small');
+        status.className = 'direct-upload-status';
+        status.style.cssText = 'color: #FFA200; display: block; margin-top: 0.5rem;';
+        input.insertAdjacentElement('afterend', status);
+
+        function put(url, headers, file) {
+            // XMLHttpRequest rather than fetch() for upload progress
+            return new Promise(function(resolve, reject) {
+                const xhr = new XMLHttpRequest();
+                xhr.open('PUT', url);
+                Object.entries(headers).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+                xhr.upload.onprogress = function(e) {
+                    if (e.lengthComputable) {
+                        status.textContent = `Uploading... ${Math.round(e.loaded / e.total * 100)}%`;
+                    }
+                };
+                xhr.onload = () => (xhr.status >= 200 && xhr.status < 300 ? resolve() : reject(new Error(xhr.responseText || 'Upload failed.')));
+                xhr.onerror = () => reject(new Error('Upload failed.'));
+                xhr.send(file);
+            });
+        }
+
+        input.addEventListener('change', async function() {
+            const file = input.files[0];
+            ticketInput.value = '';
+            if (!file) {
+                status.textContent = '';
+                return;
+            }
+            submitButton.disabled = true;
+            status.textContent = 'Uploading...';
+            try {
+                const response = await fetch('/api/uploads/', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken},
+                    body: JSON.stringify({kind: input.dataset.directUpload, filename: file.name, content_type: file.type, size: file.size}),
+                });
+                const upload = await response.json();
+                if (!upload.success) {
+                    throw new Error(upload.message);
+                }
+                await put(upload.url, upload.headers, file);
+                ticketInput.value = upload.ticket;
+                // The bytes are in storage already; don't send them with the form
+                input.value = '';
+                status.textContent = `${file.name} uploaded`;
+            } catch (error) {
+                status.textContent = error.message;
+            } finally {
+                submitButton.disabled = false;
+            }
+        });
+    });
+});
@@ -1,6 +1,6 @@
 from pathlib import Path
 import os
-from decouple import config, Csv
+from decouple import config, Choices, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -37,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'accounts.middleware.RequestProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'talentsroyale.urls'
@@ -51,6 +53,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'accounts.context_processors.arenas',
             ],
         },
     },
@@ -94,6 +97,48 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# 'content_addressed' stores each uploaded file once under its SHA-256 and counts
+# the rows that use it (see accounts/storage.py); 'filesystem' keeps upload-time names
+MEDIA_STORAGES = {
+    'filesystem': 'django.core.files.storage.FileSystemStorage',
+    'content_addressed': 'accounts.storage.ContentAddressedStorage',
+    's3': 'storages.backends.s3.S3Storage',  # pip install django-storages boto3
+}
+MEDIA_STORAGE = config('MEDIA_STORAGE', default='filesystem', cast=Choices(list(MEDIA_STORAGES)))
+STORAGES = {
+    'default': {'BACKEND': MEDIA_STORAGES[MEDIA_STORAGE]},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+# S3-compatible bucket for MEDIA_STORAGE = 's3' and S3 direct uploads (for MinIO, point the endpoint at it)
+AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME', default='')
+AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default=None)
+AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME', default=None)
+AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID', default=None)
+AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY', default=None)
+
+# Browsers upload entry media and profile photos straight to storage with
+# presigned URLs (see accounts/uploads.py). Empty uploads through Django;
+# 'accounts.uploads.S3Backend' needs MEDIA_STORAGE = 's3'; 'accounts.uploads.LocalBackend'
+# is an in-process stand-in that stages uploads in DIRECT_UPLOAD_ROOT.
+DIRECT_UPLOAD_BACKEND = config('DIRECT_UPLOAD_BACKEND', default='')
+DIRECT_UPLOAD_ROOT = config('DIRECT_UPLOAD_ROOT', default=str(BASE_DIR / 'direct-uploads'))
+DIRECT_UPLOAD_URL_EXPIRY = 60 * 10  # Seconds to start the upload
+DIRECT_UPLOAD_TICKET_MAX_AGE = 60 * 60 * 2  # Seconds to submit the form afterwards
+DIRECT_UPLOAD_MAX_IMAGE_SIZE = config('DIRECT_UPLOAD_MAX_IMAGE_SIZE', default=10 * 1024 * 1024, cast=int)  # Bytes
+DIRECT_UPLOAD_MAX_VIDEO_SIZE = config('DIRECT_UPLOAD_MAX_VIDEO_SIZE', default=100 * 1024 * 1024, cast=int)  # Bytes
+
+# Submissions whose image (or video poster frame) is within this many of 64 dHash bits of another
+# user's entry are rejected as copies (see accounts/fingerprints.py); videos need the ffmpeg binary
+NEAR_DUPLICATE_MAX_DISTANCE = config('NEAR_DUPLICATE_MAX_DISTANCE', default=6, cast=int)
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+
+if MEDIA_STORAGE == 'content_addressed':
+    # Hash uploads as they arrive instead of reading them again to save them
+    FILE_UPLOAD_HANDLERS = [
+        'accounts.storage.HashingMemoryFileUploadHandler',
+        'accounts.storage.HashingTemporaryFileUploadHandler',
+    ]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "accounts.CustomUser"
@@ -130,3 +175,64 @@ TOKEN_PACKAGES = [
     {'tokens': 500, 'price': 34.99, 'name': 'Elite Pack', 'popular': False},
     {'tokens': 1000, 'price': 59.99, 'name': 'Royal Pack', 'popular': False},
 ]
+
+# On-demand request profiling (staff only, see `python manage.py profile_token`)
+REQUEST_PROFILING_ENABLED = config('REQUEST_PROFILING_ENABLED', default=True, cast=bool)
+REQUEST_PROFILE_ROOT = config('REQUEST_PROFILE_ROOT', default=str(BASE_DIR / 'profiles'))
+REQUEST_PROFILE_TOKEN_MAX_AGE = config('REQUEST_PROFILE_TOKEN_MAX_AGE', default=60 * 60, cast=int)  # Seconds
+REQUEST_PROFILE_SUMMARY_LINES = 40
+
+# Metrics exposed at /metrics in the Prometheus text format
+# Set METRICS_DIR to a directory shared by all worker processes (e.g. gunicorn workers)
+# so their counters are summed; leave empty when running a single process.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)  # Seconds
+METRICS_TOKEN = config('METRICS_TOKEN', default='')  # Bearer token for scrapers; staff users can always read
+
+# Cache shared by the worker processes (used to invalidate the arena catalog, see accounts/arena_catalog.py)
+# The default local-memory cache is per process; use e.g. django.core.cache.backends.redis.RedisCache
+# or memcached with several workers so arena edits show up everywhere immediately.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+ARENA_CATALOG_MAX_AGE = config('ARENA_CATALOG_MAX_AGE', default=300, cast=int)  # Seconds before a process reloads arenas anyway
+
+# Where sessions live. 'db' reads django_session on every authenticated request;
+# 'cached_db' reads from CACHES and only falls back to the database on a miss
+# (needs a shared cache with several workers); 'signed_cookies' keeps the session
+# in a signed cookie and stores nothing server-side. Purge expired rows with
+# `manage.py purge_sessions`.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_MODE = config('SESSION_MODE', default='db', cast=Choices(list(SESSION_ENGINES)))
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+
+# Email confirmation and password reset links are signed and stored nowhere (see accounts/email_tokens.py);
+# they expire after this many seconds
+PASSWORD_RESET_TIMEOUT = 60 * 60 * 24
+
+# How long `manage.py gc` keeps obsolete records (see accounts/gc.py)
+GC_PAYMENT_RETENTION_DAYS = config('GC_PAYMENT_RETENTION_DAYS', default=30, cast=int)  # Failed and never-completed payments
+GC_INACTIVE_MEDIA_DAYS = config('GC_INACTIVE_MEDIA_DAYS', default=30, cast=int)  # Files of deactivated entries
+
+# Users with at least this many votes get their voted contestant ids cached (see accounts/voted.py);
+# only with a shared CACHES backend
+VOTED_SET_MIN_VOTES = config('VOTED_SET_MIN_VOTES', default=200, cast=int)
+VOTED_SET_TIMEOUT = 60 * 60 * 24  # Seconds
+
+# Trending sort on /contestants: a vote's weight halves every this many hours (run rebuild_trending after changing it)
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=24, cast=float)
+
+# Live vote counts over Server-Sent Events (see accounts/live.py; needs the ASGI server)
+LIVE_UPDATES_BACKEND = config('LIVE_UPDATES_BACKEND', default='accounts.live.CacheBackend')
+LIVE_UPDATES_INTERVAL = config('LIVE_UPDATES_INTERVAL', default=0.5, cast=float)  # Seconds between pushes
+LIVE_UPDATES_MAX_ROWS = 1000  # Entries per channel whose votes and rank are tracked
+LIVE_UPDATES_QUEUE_SIZE = 16  # Pending messages per client before it gets the full standings instead
+LIVE_UPDATES_KEEPALIVE = 15  # Seconds
+LIVE_UPDATES_RETRY_MS = 3000